@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Compare payload size and serialization time of the /api/history response shapes"""
+
+import argparse
+import datetime
+import json
+import random
+import time
+
+from http_compression import compress
+import wind_webserver
+
+def fill_log_entries(minutes):
+    """Load N minutes of synthetic 1 Hz rows into the web server's in-memory history"""
+    entries = []
+    start = datetime.datetime(2025, 6, 1, 12, 0, 0)
+    speed = 5.0
+    for second in range(minutes * 60):
+        speed = max(0.0, speed + random.uniform(-0.5, 0.5))
+        entry = {'time': (start + datetime.timedelta(seconds=second)).strftime("%Y-%m-%d %H:%M:%S")}
+        for window in wind_webserver.TIME_WINDOWS:
+            entry[f"{window}s"] = round(speed, 2) if second >= window else None
+        for field in wind_webserver.STATS_FIELDS:
+            entry[field] = None
+        entries.append(entry)
+    wind_webserver.publish_entries(entries)
+
+def measure(build, minutes, repeats):
+    """Time building plus JSON encoding of one response shape, and its encoded sizes"""
+    elapsed = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        body = json.dumps(build(minutes), separators=(',', ':')).encode('utf-8')
+        elapsed.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    gzipped = compress(body, 'gzip')
+    gzip_seconds = time.perf_counter() - started
+
+    return {
+        'serialize_ms': round(min(elapsed) * 1000, 2),
+        'bytes': len(body),
+        'gzip_bytes': len(gzipped),
+        'deflate_bytes': len(compress(body, 'deflate')),
+        'gzip_ms': round(gzip_seconds * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs columnar /api/history payloads.")
+    parser.add_argument('--minutes', type=int, nargs='+', default=[60, 4320], help="History windows to request")
+    parser.add_argument('--repeats', type=int, default=5, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    random.seed(1135)
+    fill_log_entries(max(args.minutes))
+
+    results = {}
+    for minutes in args.minutes:
+        results[str(minutes)] = {
+            'legacy': measure(wind_webserver.get_history_data_for_minutes, minutes, args.repeats),
+            'columnar': measure(wind_webserver.get_columnar_history_for_minutes, minutes, args.repeats),
+        }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
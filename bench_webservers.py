@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""Load-test both dashboards against synthetic logs and report latency percentiles as JSON"""
+
+import argparse
+import concurrent.futures
+import csv
+import datetime
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+from laundry_config import AMPLITUDE_FREQUENCY, AMPLITUDE_THRESHOLD, RATIO_FREQUENCY, RATIO_THRESHOLD
+from laundry_config import DEVICES, device_file
+import laundry_webserver
+import wind_logger
+import wind_webserver
+
+def write_history_log(path, readings, interval=10):
+    """history.log paragraphs `interval` seconds apart, with a ~45 minute wash cycle every 8 hours"""
+    # Same layout as receive_audio_analysis.format_history_record, without needing the radio libraries
+    start = datetime.datetime(2025, 1, 1)
+    with open(path, 'w') as f:
+        for i in range(readings):
+            timestamp = start + datetime.timedelta(seconds=i * interval)
+            running = (i * interval) % (8 * 3600) < 45 * 60
+            energy = round(random.gauss(16.2 if running else 15.0, 0.15), 4)
+            harmonic = round(energy * random.uniform(0.15, 0.3), 4)
+            ratio = harmonic / energy
+            amplitude = f"ON ({AMPLITUDE_FREQUENCY}Hz energy: {energy:.4f} > {AMPLITUDE_THRESHOLD})" if energy > AMPLITUDE_THRESHOLD \
+                else f"OFF ({AMPLITUDE_FREQUENCY}Hz energy: {energy:.4f} <= {AMPLITUDE_THRESHOLD})"
+            ratio_line = f"{'ON' if ratio > RATIO_THRESHOLD else 'OFF'} ({RATIO_FREQUENCY}Hz/{AMPLITUDE_FREQUENCY}Hz ratio: " \
+                f"{ratio:.6f} {'>' if ratio > RATIO_THRESHOLD else '<='} {RATIO_THRESHOLD:.2f})"
+            f.write(f"{timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n"
+                    f"FREQUENCY VALUES:\n"
+                    f"energy at {AMPLITUDE_FREQUENCY}Hz: {energy:.4f}\n"
+                    f"energy at {RATIO_FREQUENCY}Hz: {harmonic:.4f}\n"
+                    f"ALGORITHM EVALUATIONS:\n"
+                    f"AMPLITUDE_ALGORITHM={amplitude}\n"
+                    f"RATIO_ALGORITHM={ratio_line}\n"
+                    f"\n")
+
+def write_wind_log(path, hours):
+    """wind_log.csv with one row per second, in wind_logger.py's column layout"""
+    start = datetime.datetime(2025, 1, 1)
+    speed = 5.0
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=wind_logger.csv_headers(), restval='')
+        writer.writeheader()
+        for second in range(hours * 3600):
+            speed = max(0.0, speed + random.uniform(-0.5, 0.5))
+            row = {'time': (start + datetime.timedelta(seconds=second)).strftime("%Y-%m-%d %H:%M:%S"),
+                   'inst': round(speed, 2)}
+            for window in wind_logger.TIME_WINDOWS:
+                if second >= window:
+                    row[str(window)] = round(speed, 2)
+            if second >= 600:
+                # Rolling statistics only exist once their window has filled
+                for column in wind_logger.STATS_COLUMNS:
+                    row[column] = 0.3 if column == 'turbulence' else round(speed * random.uniform(1.0, 1.5), 2)
+            writer.writerow(row)
+
+def prepare(tmpdir, readings, wind_hours):
+    """Point both apps at fresh synthetic logs and load the wind history"""
+    history_path = os.path.join(tmpdir, device_file(DEVICES[0], 'history_log'))
+    wind_path = os.path.join(tmpdir, 'wind_log.csv')
+    write_history_log(history_path, readings)
+    write_wind_log(wind_path, wind_hours)
+
+    # No background watchers: every request is measured against a settled state
+    laundry_webserver._threads_started = True
+    wind_webserver._threads_started = True
+
+    # The default device, with all of its files in the temp dir
+    device = laundry_webserver.LaundryDevice(DEVICES[0], tmpdir)
+    device.offset = device.catch_up()
+    laundry_webserver.devices = {device.id: device}
+
+    wind_webserver.LOG_FILE = wind_path
+    wind_webserver.SHARED_HISTORY_PATH = None
+    wind_webserver.publish_entries(wind_webserver.read_csv_file())
+
+    # A delta poll from a client that is one reading behind
+    return {'laundry_delta_cursor': last_paragraph_offset(history_path)}
+
+def last_paragraph_offset(path):
+    """Byte offset where the last history.log paragraph starts, the cursor a client one reading behind holds"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(0, size - 4096)
+        f.seek(start)
+        tail = f.read()
+    # The log ends with the blank line closing the last paragraph; the one before it closes the previous
+    boundary = tail.rstrip(b'\n').rfind(b'\n\n')
+    return start + boundary + 2 if boundary >= 0 else 0
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+def peak_rss_mb():
+    """Highest RSS of the whole process so far; it never goes down, so it covers every level run before"""
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def current_rss_mb():
+    """Resident memory right now (Linux), or None where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+def test_client_requester(app):
+    """One Flask test client per thread; returns (status, body bytes)"""
+    local = threading.local()
+
+    def request(path):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.get(path, headers={'Accept-Encoding': 'gzip'})
+        return response.status_code, len(response.data)
+
+    return request, lambda: None
+
+def server_requester(app):
+    """A real threaded WSGI server on a free local port, with keep-alive connections per thread"""
+    # One access-log line per request would dominate the timings
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    local = threading.local()
+
+    def request(path):
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection('127.0.0.1', server.server_port, timeout=60)
+        local.connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+        response = local.connection.getresponse()
+        body = response.read()
+        return response.status, len(body)
+
+    return request, server.shutdown
+
+def run_level(request, path, concurrency, total_requests):
+    """Send total_requests GETs from `concurrency` threads; latency stats in milliseconds"""
+    latencies = []
+    errors = 0
+    response_bytes = 0
+    lock = threading.Lock()
+
+    def worker(count):
+        nonlocal errors, response_bytes
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                status, size = request(path)
+            except Exception:
+                status, size = None, 0
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                response_bytes = max(response_bytes, size)
+                if status != 200:
+                    errors += 1
+
+    per_worker = [total_requests // concurrency + (1 if i < total_requests % concurrency else 0) for i in range(concurrency)]
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, per_worker))
+    wall = time.perf_counter() - started
+    rss_after = current_rss_mb()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else None,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'response_bytes': response_bytes,
+        # What this level added to the process's resident memory (may be 0 once buffers are warm)
+        'rss_growth_mb': round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the laundry and wind dashboards under concurrent load.")
+    parser.add_argument('--readings', type=int, default=100000, help="history.log readings to generate (10 s apart)")
+    parser.add_argument('--wind-hours', type=int, default=72, help="Hours of 1 Hz wind_log.csv rows to generate")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help="Concurrent clients per level")
+    parser.add_argument('--requests', type=int, default=100, help="Requests per endpoint per concurrency level")
+    parser.add_argument('--mode', choices=['test-client', 'server'], default='test-client',
+                        help="Flask test client in-process, or real HTTP against a local threaded server")
+    parser.add_argument('--output', default=None, help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    random.seed(1135)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        started = time.perf_counter()
+        state = prepare(tmpdir, args.readings, args.wind_hours)
+        setup_seconds = round(time.perf_counter() - started, 2)
+
+        endpoints = {
+            'laundry': (laundry_webserver.app, [
+                '/get_log',
+                f"/get_log?cursor={state['laundry_delta_cursor']}",
+                '/get_log?points=500',
+                '/api/session',
+            ]),
+            'wind': (wind_webserver.app, [
+                '/api/current',
+                '/api/history?minutes=60',
+                '/api/history?minutes=60&format=columnar',
+                '/api/history?minutes=4320&format=columnar',
+            ]),
+        }
+
+        results = {}
+        process_peak_rss_mb = {}
+        for name, (app, paths) in endpoints.items():
+            request, stop = (server_requester if args.mode == 'server' else test_client_requester)(app)
+            try:
+                results[name] = {}
+                for path in paths:
+                    results[name][path] = {str(level): run_level(request, path, level, args.requests)
+                                           for level in args.concurrency}
+            finally:
+                stop()
+            # Process-wide and cumulative: includes setup and every app benchmarked before this one
+            process_peak_rss_mb[name] = peak_rss_mb()
+
+        report = {
+            'config': {
+                'readings': args.readings,
+                'history_log_bytes': os.path.getsize(laundry_webserver.devices[laundry_webserver.DEFAULT_DEVICE].log_file),
+                'wind_hours': args.wind_hours,
+                'wind_log_bytes': os.path.getsize(wind_webserver.LOG_FILE),
+                'requests_per_level': args.requests,
+                'mode': args.mode,
+                'setup_seconds': setup_seconds,
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+            },
+            'process_peak_rss_mb_after': process_peak_rss_mb,
+            'results': results,
+        }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import csv
+import io
+import os
+import socket
+import time
+from metrics import STAGE_SECONDS
+
+# Buffered CSV writing for logs on the Pi's SD card. Rows are collected in
+# memory and written in one write()/flush() per batch instead of one per row.
+# An optional journal on tmpfs (e.g. /dev/shm) receives each row as it
+# arrives, so a crashed or killed logger can replay rows that never reached
+# the CSV; only a power cut can lose the unflushed batch.
+
+class BatchedCsvWriter:
+    """CSV writer that flushes every `flush_interval` seconds or `batch_size` rows"""
+
+    def __init__(self, f, flush_interval=10.0, batch_size=None, journal_path=None, fsync=False, on_flush=(), name='csv'):
+        self._file = f
+        self.name = name
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.on_flush = list(on_flush)
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._journal = open(journal_path, 'a', newline='') if journal_path else None
+
+        # Syscall-level counters, for comparing flush policies
+        self.stats = {'rows': 0, 'file_writes': 0, 'fsyncs': 0, 'journal_writes': 0}
+
+    def writerow(self, row):
+        line = format_row(row)
+        self._rows.append(line)
+        self.stats['rows'] += 1
+
+        if self._journal:
+            self._journal.write(line)
+            self._journal.flush()
+            self.stats['journal_writes'] += 1
+
+        if self.batch_size and len(self._rows) >= self.batch_size:
+            self.flush()
+        elif time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the pending batch to the CSV, then clear the journal and notify readers"""
+        self._last_flush = time.monotonic()
+        if not self._rows:
+            return
+
+        count = len(self._rows)
+        with STAGE_SECONDS.time(process=self.name, stage='csv_flush'):
+            self._file.write(''.join(self._rows))
+            self._file.flush()
+            self.stats['file_writes'] += 1
+            if self.fsync:
+                os.fsync(self._file.fileno())
+                self.stats['fsyncs'] += 1
+        self._rows = []
+
+        if self._journal:
+            self._journal.truncate(0)
+
+        for hook in self.on_flush:
+            try:
+                hook(count)
+            except Exception as e:
+                print(f"Error in flush hook: {e}")
+
+    def close(self):
+        self.flush()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+def format_row(row):
+    """One CSV line exactly as csv.writer would write it"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+def recover_journal(log_path, journal_path):
+    """Append journalled rows that never made it into the log; returns how many were replayed.
+
+    Rows are matched on their first column (the timestamp), so rows that did
+    reach the CSV before the crash are not duplicated.
+    """
+    if not journal_path or not os.path.exists(journal_path):
+        return 0
+
+    with open(journal_path, 'r', newline='') as f:
+        journal_rows = [row for row in csv.reader(f) if row]
+    if not journal_rows:
+        return 0
+
+    last_time = last_csv_row_time(log_path)
+    missing = [row for row in journal_rows if row[0] > last_time]
+    if missing:
+        with open(log_path, 'a', newline='') as f:
+            csv.writer(f).writerows(missing)
+
+    os.truncate(journal_path, 0)
+    return len(missing)
+
+def last_csv_row_time(log_path):
+    """First column of the last row of a CSV, read from the end of the file"""
+    if not os.path.exists(log_path):
+        return ''
+    with open(log_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        lines = f.read().decode('utf-8', errors='replace').strip().splitlines()
+    return lines[-1].split(',')[0] if lines else ''
+
+def datagram_notifier(socket_path):
+    """Flush hook that pings a reader listening on a Unix datagram socket"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def notify(count):
+        try:
+            sock.sendto(str(count).encode('ascii'), socket_path)
+        except OSError:
+            # Nobody listening (web server not running yet) is fine
+            pass
+
+    return notify
+
+def bind_notify_socket(socket_path):
+    """Listening side of datagram_notifier, or None if it can't be bound"""
+    try:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(socket_path)
+        return sock
+    except OSError as e:
+        print(f"Can't listen for CSV flush notifications on {socket_path}: {e}")
+        return None
+
+def wait_for_notification(sock, timeout):
+    """Block until a flush notification arrives or timeout passes; True if notified"""
+    sock.settimeout(timeout)
+    try:
+        sock.recv(64)
+    except socket.timeout:
+        return False
+
+    # Collapse any backlog into this one wake-up
+    sock.setblocking(False)
+    try:
+        while True:
+            sock.recv(64)
+    except BlockingIOError:
+        pass
+    return True
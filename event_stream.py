@@ -0,0 +1,81 @@
+import json
+import queue
+import threading
+
+# Seconds between keepalive comments on an idle stream (keeps proxies from closing it)
+KEEPALIVE_SECONDS = 15
+
+# How long a browser should wait before reconnecting after the stream drops
+RETRY_MILLISECONDS = 5000
+
+# Events buffered per subscriber before it is considered too slow and dropped
+MAX_PENDING_EVENTS = 100
+
+def format_event(event, data):
+    """Encode one Server-Sent Event frame"""
+    payload = json.dumps(data, separators=(',', ':'))
+    return f"event: {event}\ndata: {payload}\n\n"
+
+class EventBroadcaster:
+    """Fan out events from a single producer thread to every connected SSE client.
+
+    Each event is encoded once in publish() and the same string is handed to
+    every subscriber queue, so the cost of a new reading does not grow with
+    the number of open dashboards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Send an event to all subscribers, dropping any that have fallen behind"""
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # The client stopped reading; end its stream so the browser reconnects
+                with self._lock:
+                    self._subscribers.discard(subscriber)
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def stream(self, initial_events=()):
+        """Generator yielding SSE frames for one client until it disconnects"""
+        subscriber = queue.Queue(maxsize=MAX_PENDING_EVENTS)
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+        try:
+            yield f"retry: {RETRY_MILLISECONDS}\n\n"
+            for event, data in initial_events:
+                yield format_event(event, data)
+
+            while True:
+                try:
+                    message = subscriber.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # Stop nginx from buffering the stream
+}
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import zlib
+from flask import Response
+
+# Bodies smaller than this are not worth the CPU to compress
+MIN_COMPRESS_BYTES = 1024
+
+# Preferred order when the client accepts several encodings equally
+SUPPORTED_ENCODINGS = ['gzip', 'deflate']
+
+def choose_encoding(accept_encoding):
+    """Pick gzip or deflate from an Accept-Encoding header, or None for identity"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        parts = item.strip().split(';')
+        coding = parts[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+
+    best, best_quality = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def compress(body, encoding, level=6):
+    """Compress bytes with the given content coding"""
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=level)
+    if encoding == 'deflate':
+        # HTTP "deflate" is the zlib-wrapped format
+        return zlib.compress(body, level)
+    return body
+
+def compressed_response(body, mimetype, accept_encoding, headers=None):
+    """Build a Flask response, compressing the body if the client allows it"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    response_headers = {'Vary': 'Accept-Encoding'}
+    response_headers.update(headers or {})
+
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+        response_headers['Content-Encoding'] = encoding
+
+    return Response(body, mimetype=mimetype, headers=response_headers)
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks on the fly, flushing after each so the client sees progress"""
+    # wbits 31 writes a gzip header and trailer, 15 the zlib wrapper HTTP calls deflate
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31 if encoding == 'gzip' else 15)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def streamed_response(chunks, mimetype, accept_encoding, headers=None):
+    """A response sent as `chunks` is iterated (chunked, no Content-Length), compressed if allowed"""
+    response_headers = {'Vary': 'Accept-Encoding'}
+    response_headers.update(headers or {})
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding:
+        chunks = compress_stream(chunks, encoding)
+        response_headers['Content-Encoding'] = encoding
+
+    return Response(chunks, mimetype=mimetype, headers=response_headers)
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header names this (weak) entity tag"""
+    for candidate in (if_none_match or '').split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == f'"{etag}"':
+            return True
+    return False
+
+class PrecompressedBody:
+    """A fixed response body compressed once up front, instead of on every request.
+
+    Served with a weak ETag (the variants differ only in content coding), so a
+    client that already has it gets an empty 304.
+    """
+
+    def __init__(self, body, mimetype, cache_control='no-cache'):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {None: body}
+        if len(body) >= MIN_COMPRESS_BYTES:
+            for encoding in SUPPORTED_ENCODINGS:
+                # Paid once, so use the smallest output
+                compressed = compress(body, encoding, level=9)
+                # Already-compressed formats (PNG, GIF) don't shrink; send those as they are
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+    def response(self, accept_encoding, if_none_match=None, cache_control=None):
+        headers = {
+            'Vary': 'Accept-Encoding',
+            'ETag': f'W/"{self.etag}"',
+            'Cache-Control': cache_control or self.cache_control,
+        }
+        if etag_matches(if_none_match, self.etag):
+            return Response(status=304, headers=headers)
+
+        encoding = choose_encoding(accept_encoding)
+        if encoding not in self.variants:
+            encoding = None
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(self.variants[encoding], mimetype=self.mimetype, headers=headers)
@@ -0,0 +1,70 @@
+# Thresholds shared by the receiver (which writes the ALGORITHM EVALUATIONS in
+# history.log) and the laundry web server (which draws the IN USE banner), so
+# both always agree on when the machine is running.
+
+# Amplitude algorithm: the machine is in use while the 60Hz energy is above this
+AMPLITUDE_FREQUENCY = 60
+AMPLITUDE_THRESHOLD = 15.25
+
+# Typical 60Hz energy with the machine idle (see the README sample) and
+# running. The transmitter's adaptive schedule starts from these and then
+# follows the levels it measures; only readings within NEAR_THRESHOLD_FRACTION
+# of the gap between a level and the threshold count as close to a transition.
+IDLE_ENERGY = 15.04
+RUNNING_ENERGY = 16.2
+NEAR_THRESHOLD_FRACTION = 0.25
+
+# Ratio algorithm: the machine is in use while 180Hz/60Hz energy is above this
+RATIO_FREQUENCY = 180
+RATIO_THRESHOLD = 0.20
+
+# Transmitters the receiver listens for, one NRF24 reading pipe each, in pipe
+# order (P0, P1, ... P5). The radio allows at most six, and the addresses on
+# pipes 2-5 may only differ from pipe 1's in their first character. A device
+# may set its own 'threshold'; file names default to e.g. history_dryer.log.
+# The first device is the one the web server shows by default.
+DEVICES = [
+    {'id': 'washer', 'name': 'Laundry Machine', 'address': '1SNSR',
+     'now_log': 'now.log', 'history_log': 'history.log',
+     'sessions': 'sessions.csv', 'session_state': 'sessions_state.json', 'usage': 'usage.json'},
+    # {'id': 'dryer', 'name': 'Dryer', 'address': '2SNSR'},
+]
+
+MAX_DEVICES = 6
+
+# File each device keeps, and the name it gets when the device doesn't set one
+DEVICE_FILES = {
+    'now_log': 'now.log',
+    'history_log': 'history.log',
+    'sessions': 'sessions.csv',
+    'session_state': 'sessions_state.json',
+    'usage': 'usage.json',
+}
+
+def device_file(device, kind):
+    """The device's own name for one of DEVICE_FILES, or the default with _<id> before the extension"""
+    if device.get(kind):
+        return device[kind]
+    stem, extension = DEVICE_FILES[kind].rsplit('.', 1)
+    return f"{stem}_{device['id']}.{extension}"
+
+def device_threshold(device):
+    return device.get('threshold', AMPLITUDE_THRESHOLD)
+
+def check_devices(devices):
+    """Problems with a DEVICES list for the radio (empty if it is usable)"""
+    problems = []
+    if not 0 < len(devices) <= MAX_DEVICES:
+        problems.append(f"{len(devices)} devices configured, the radio has 1 to {MAX_DEVICES} pipes")
+    ids = [device['id'] for device in devices]
+    if len(set(ids)) != len(ids):
+        problems.append(f"Device ids must be unique: {ids}")
+    addresses = [device['address'] for device in devices]
+    if len(set(addresses)) != len(addresses):
+        problems.append(f"Device addresses must be unique: {addresses}")
+    if any(len(address) != len(addresses[0]) or not 2 < len(address) < 6 for address in addresses):
+        problems.append(f"Addresses must all have the same length of 3 to 5 characters: {addresses}")
+    for address in addresses[2:]:
+        if address[1:] != addresses[1][1:]:
+            problems.append(f"Address {address} on pipes 2-5 must match {addresses[1]} apart from the first character")
+    return problems
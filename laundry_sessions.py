@@ -0,0 +1,202 @@
+import bisect
+import calendar
+import fcntl
+import json
+import os
+import threading
+import time
+
+# Wash-cycle index maintained from readings as they arrive, so "how long has
+# it been running" and "when will it be free" never rescan history.log.
+#
+# Finished cycles are appended to a small CSV of "start,end" epoch seconds
+# (wall-clock time encoded as UTC, like the rest of the web servers). The
+# in-progress state and the history.log offset it has consumed go to a JSON
+# file, so a restart only replays readings logged while it was down.
+
+# The machine must read above the threshold this long before a cycle starts
+START_DEBOUNCE_SECONDS = 60
+# ...and below it this long before the cycle ends (covers fill/soak pauses)
+END_DEBOUNCE_SECONDS = 300
+# Shorter "cycles" are noise
+MIN_SESSION_SECONDS = 300
+# No reading for this long while running ends the cycle at the last reading
+MAX_READING_GAP_SECONDS = 900
+
+def timestamp_to_seconds(timestamp):
+    """'YYYY-MM-DD HH:MM:SS' wall-clock time as epoch seconds (as if UTC)"""
+    return calendar.timegm(time.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+
+def seconds_to_timestamp(seconds):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+def wall_clock_now():
+    """Local time now, encoded like timestamp_to_seconds"""
+    return calendar.timegm(time.localtime())
+
+class SessionTracker:
+    """Debounced running/idle state machine plus the sorted durations of past cycles.
+
+    Several WSGI workers may each run a tracker over the same log; only the
+    one holding the lock file writes the sessions and state files, the
+    others keep identical state in memory.
+    """
+
+    def __init__(self, threshold, sessions_path=None, state_path=None):
+        self.threshold = threshold
+        self.sessions_path = sessions_path
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._sessions = []    # (start, end) in order
+        self._durations = []   # sorted, for the remaining-time estimate
+        self.offset = None     # history.log offset consumed, None until first checkpoint
+        self._state = {'running': False, 'started': None, 'candidate': None, 'last_reading': None}
+        self._load()
+
+    def _load(self):
+        if self.sessions_path and os.path.exists(self.sessions_path):
+            with open(self.sessions_path, 'r') as f:
+                for line in f:
+                    try:
+                        start, end = (int(value) for value in line.split(','))
+                    except ValueError:
+                        continue
+                    self._add_session(start, end)
+
+        if self.state_path and os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r') as f:
+                    saved = json.load(f)
+                self.offset = saved['offset']
+                self._state.update(saved['state'])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading session state, rebuilding: {e}")
+
+    def _add_session(self, start, end):
+        self._sessions.append((start, end))
+        bisect.insort(self._durations, end - start)
+
+    def _is_writer(self):
+        """Take the writer lock if nobody holds it; True while this process has it"""
+        if not self.sessions_path:
+            return False
+        if self._lock_file is None:
+            try:
+                lock_file = open(self.sessions_path + '.lock', 'a')
+            except OSError as e:
+                print(f"Can't open session lock file: {e}")
+                return False
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    def _end_session(self, start, end):
+        """Record a finished cycle; False if it was too short to count"""
+        if end - start < MIN_SESSION_SECONDS:
+            return False
+        self._add_session(start, end)
+        if self._is_writer():
+            try:
+                with open(self.sessions_path, 'a') as f:
+                    f.write(f"{start},{end}\n")
+            except OSError as e:
+                print(f"Error recording wash session: {e}")
+        return True
+
+    def add_reading(self, timestamp, energy):
+        """Feed one reading; returns 'started', 'ended' or 'discarded' (ended too short to record) on a transition, else None"""
+        if not timestamp or energy is None:
+            return None
+        seconds = timestamp_to_seconds(timestamp)
+
+        with self._lock:
+            state = self._state
+            last = state['last_reading']
+            if last is not None and seconds <= last:
+                # Already seen (e.g. replayed after a restart)
+                return None
+            event = None
+
+            if state['running'] and last is not None and seconds - last > MAX_READING_GAP_SECONDS:
+                # The receiver went quiet mid-cycle; don't count the outage as washing
+                recorded = self._end_session(state['started'], last)
+                state.update(running=False, started=None, candidate=None)
+                event = 'ended' if recorded else 'discarded'
+
+            above = energy > self.threshold
+            if not state['running']:
+                if not above:
+                    state['candidate'] = None
+                elif state['candidate'] is None:
+                    state['candidate'] = seconds
+                if state['candidate'] is not None and seconds - state['candidate'] >= START_DEBOUNCE_SECONDS:
+                    state.update(running=True, started=state['candidate'], candidate=None)
+                    event = 'started'
+            else:
+                if above:
+                    state['candidate'] = None
+                elif state['candidate'] is None:
+                    state['candidate'] = seconds
+                if state['candidate'] is not None and seconds - state['candidate'] >= END_DEBOUNCE_SECONDS:
+                    # The cycle ended when the energy first dropped, not when the debounce expired
+                    recorded = self._end_session(state['started'], state['candidate'])
+                    state.update(running=False, started=None, candidate=None)
+                    event = 'ended' if recorded else 'discarded'
+
+            state['last_reading'] = seconds
+            return event
+
+    def checkpoint(self, offset):
+        """Record that history.log has been consumed up to offset"""
+        with self._lock:
+            self.offset = offset
+            if not self.state_path or not self._is_writer():
+                return
+            temp_path = self.state_path + '.tmp'
+            try:
+                with open(temp_path, 'w') as f:
+                    json.dump({'offset': offset, 'state': self._state}, f)
+                os.replace(temp_path, self.state_path)
+            except OSError as e:
+                print(f"Error saving session state: {e}")
+
+    def estimate_remaining(self, elapsed):
+        """Median remaining time of past cycles that lasted longer than `elapsed` (None if none did)"""
+        durations = self._durations
+        longer = bisect.bisect_right(durations, elapsed)
+        if longer == len(durations):
+            return None
+        median = durations[(longer + len(durations) - 1) // 2]
+        return median - elapsed
+
+    def status(self, now=None):
+        """Current cycle and estimate; O(log n) in the number of recorded cycles"""
+        now = wall_clock_now() if now is None else now
+        with self._lock:
+            state = self._state
+            durations = self._durations
+            last_session = self._sessions[-1] if self._sessions else None
+            # Readings stopped mid-cycle: don't keep counting up an elapsed time nobody can confirm
+            stale = state['last_reading'] is None or now - state['last_reading'] > MAX_READING_GAP_SECONDS
+            running = state['running'] and not stale
+            result = {
+                'running': running,
+                'stale': stale,
+                'started': seconds_to_timestamp(state['started']) if running else None,
+                'elapsed_seconds': None,
+                'estimated_remaining_seconds': None,
+                'typical_duration_seconds': durations[(len(durations) - 1) // 2] if durations else None,
+                'sessions_recorded': len(durations),
+                'last_finished': seconds_to_timestamp(last_session[1]) if last_session else None,
+                'last_reading': seconds_to_timestamp(state['last_reading']) if state['last_reading'] else None,
+            }
+            if running:
+                elapsed = max(0, now - state['started'])
+                result['elapsed_seconds'] = elapsed
+                result['estimated_remaining_seconds'] = self.estimate_remaining(elapsed)
+        return result
@@ -0,0 +1,152 @@
+import fcntl
+import json
+import os
+import threading
+
+from laundry_sessions import MAX_READING_GAP_SECONDS, timestamp_to_seconds
+
+# Weekday x time-of-day occupancy, kept up to date one reading at a time so
+# "when is the machine usually free" never rescans history.log.
+#
+# Each reading's state (energy above the threshold or not) holds until the
+# next reading, and that interval is added to the bucket(s) it falls in: once
+# to the observed seconds and, if the machine was running, to the in-use
+# seconds. Occupancy is in-use / observed, so days the receiver was down
+# don't count as free. Timestamps are wall-clock time encoded as UTC, as in
+# laundry_sessions.py, so buckets follow local time.
+#
+# The totals and the history.log offset they cover are saved to a small JSON
+# file; the first run (or a changed bucket size) backfills from the whole log.
+
+# Bucket width; 60 gives the 7 x 24 grid, 30 gives 7 x 48
+BUCKET_MINUTES = 60
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+# Buckets seen for less than this are reported as unknown rather than as a probability
+MIN_OBSERVED_SECONDS = 600
+
+class UsageHeatmap:
+    """Time-weighted in-use seconds per weekday and time-of-day bucket"""
+
+    def __init__(self, threshold, state_path=None, bucket_minutes=BUCKET_MINUTES):
+        self.threshold = threshold
+        self.state_path = state_path
+        self.bucket_seconds = bucket_minutes * 60
+        self.buckets_per_day = 86400 // self.bucket_seconds
+        self._lock = threading.Lock()
+        self._lock_file = None
+        self._observed = [0.0] * (7 * self.buckets_per_day)
+        self._in_use = [0.0] * (7 * self.buckets_per_day)
+        self._last_reading = None    # epoch seconds of the previous reading
+        self._last_in_use = False    # ...and whether it was above the threshold
+        self.offset = None           # history.log offset consumed, None until first checkpoint
+        self._load()
+
+    def _load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                saved = json.load(f)
+            if saved['bucket_seconds'] != self.bucket_seconds:
+                print(f"Usage buckets changed from {saved['bucket_seconds']} s, rebuilding from the log")
+                return
+            observed, in_use = saved['observed'], saved['in_use']
+            if len(observed) != len(self._observed) or len(in_use) != len(self._in_use):
+                raise ValueError("wrong number of buckets")
+            self._observed, self._in_use = observed, in_use
+            self._last_reading = saved['last_reading']
+            self._last_in_use = saved['last_in_use']
+            self.offset = saved['offset']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading usage state, rebuilding: {e}")
+
+    def _bucket(self, seconds):
+        weekday = (int(seconds) // 86400 + EPOCH_WEEKDAY) % 7
+        return weekday * self.buckets_per_day + int(seconds) % 86400 // self.bucket_seconds
+
+    def _add_interval(self, start, end, in_use):
+        # At most MAX_READING_GAP_SECONDS long, so this crosses a boundary or two at most
+        while start < end:
+            bucket_end = min(end, (start // self.bucket_seconds + 1) * self.bucket_seconds)
+            bucket = self._bucket(start)
+            self._observed[bucket] += bucket_end - start
+            if in_use:
+                self._in_use[bucket] += bucket_end - start
+            start = bucket_end
+
+    def add_reading(self, timestamp, energy):
+        """Credit the time since the previous reading to that reading's state"""
+        if not timestamp or energy is None:
+            return
+        seconds = timestamp_to_seconds(timestamp)
+
+        with self._lock:
+            last = self._last_reading
+            if last is not None and seconds <= last:
+                # Already counted (e.g. replayed after a restart)
+                return
+            # A longer silence is the receiver being down, not the machine being free
+            if last is not None and seconds - last <= MAX_READING_GAP_SECONDS:
+                self._add_interval(last, seconds, self._last_in_use)
+            self._last_reading = seconds
+            self._last_in_use = energy > self.threshold
+
+    def _is_writer(self):
+        """Same single-writer rule as SessionTracker: whoever holds the lock file saves"""
+        if not self.state_path:
+            return False
+        if self._lock_file is None:
+            try:
+                lock_file = open(self.state_path + '.lock', 'a')
+            except OSError as e:
+                print(f"Can't open usage lock file: {e}")
+                return False
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._lock_file = lock_file
+        return True
+
+    def checkpoint(self, offset):
+        """Record that history.log has been counted up to offset"""
+        with self._lock:
+            self.offset = offset
+            if not self._is_writer():
+                return
+            temp_path = self.state_path + '.tmp'
+            try:
+                with open(temp_path, 'w') as f:
+                    json.dump({'offset': offset, 'bucket_seconds': self.bucket_seconds,
+                               'last_reading': self._last_reading, 'last_in_use': self._last_in_use,
+                               'observed': self._observed, 'in_use': self._in_use}, f)
+                os.replace(temp_path, self.state_path)
+            except OSError as e:
+                print(f"Error saving usage state: {e}")
+
+    def summary(self):
+        """Occupancy per weekday (rows, Monday first) and bucket (columns); the same size whatever the history"""
+        with self._lock:
+            observed = list(self._observed)
+            in_use = list(self._in_use)
+        rows = []
+        hours = []
+        for day in range(7):
+            cells = range(day * self.buckets_per_day, (day + 1) * self.buckets_per_day)
+            rows.append([round(in_use[i] / observed[i], 3) if observed[i] >= MIN_OBSERVED_SECONDS else None
+                         for i in cells])
+            hours.append([round(observed[i] / 3600, 1) for i in cells])
+        return {
+            'bucket_minutes': self.bucket_seconds // 60,
+            'weekdays': WEEKDAYS,
+            'buckets': [f"{start // 60:02d}:{start % 60:02d}"
+                        for start in range(0, 1440, self.bucket_seconds // 60)],
+            'occupancy': rows,
+            'observed_hours': hours,
+        }
@@ -1,97 +1,371 @@
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, render_template_string, jsonify, Response, request
+import ipaddress
 import os
 import time
 import re
-from collections import deque
+import threading
 from datetime import datetime, timedelta
-
-# Configurable threshold for determining if the machine is in use
-ENERGY_THRESHOLD = 15.25
+from event_stream import EventBroadcaster, SSE_HEADERS
+from laundry_config import AMPLITUDE_FREQUENCY, RATIO_FREQUENCY, DEVICES, device_file, device_threshold
+from metrics import STAGE_SECONDS, instrument_app
+from downsample import downsample_indices, parse_points
+from laundry_sessions import SessionTracker
+from laundry_usage import UsageHeatmap
+from notifications import Notifier, SubscriptionStore, SUBSCRIPTION_KINDS
+from http_compression import PrecompressedBody, streamed_response
+from log_export import EXPORT_FORMATS, chunked, csv_line, iter_records, ndjson_line, parse_time_bound
+from static_assets import StaticAssets, CHART_JS
 
 app = Flask(__name__)
+# Per-endpoint request timing and the /metrics endpoint
+instrument_app(app, 'laundry_webserver')
+# Favicon and Chart.js from the static folder, under content-hashed immutable URLs
+assets = StaticAssets(app, app.static_folder)
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html>
 <head>
-    <title>1135 Laundry Monitor</title>
-    <link rel="icon" type="image/png" sizes="32x32" href="/static/favicon-32x32.png">
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/Chart.js/3.7.0/chart.min.js"></script>
+    <title>1135 Laundry Monitor - {{ device.name }}</title>
+    {% if assets.has('favicon-32x32.png') %}
+    <link rel="icon" type="image/png" sizes="32x32" href="{{ assets.url('favicon-32x32.png') }}">
+    {% endif %}
     <script>
+        // Chart.js (served from static/) loads without blocking the page, so the
+        // status and log still show if it fails; the chart is drawn once it arrives
+        let chartState = 'loading';
+        function chartScriptDone(loaded) {
+            chartState = loaded ? 'ready' : 'failed';
+            if (window.onChartScript) onChartScript();
+        }
+    </script>
+    <script async src="{{ assets.url(chart_js) }}" onload="chartScriptDone(true)" onerror="chartScriptDone(false)"></script>
+    <script>
+        // Which machine this page shows; every request and the stream are for this device
+        const DEVICE = '{{ device.id }}';
         let chart;
+        let threshold;
+        let latestEnergy;
+        let logParagraphs = [];
+        let pollTimer = null;
+        // Byte offset into history.log just past the last reading this page has
+        let cursor = null;
+        let lastTimestamp = '';
+        
+        function setStatus(isStale, latestEnergy) {
+            // Update status banner based on logging status and energy level
+            let statusText, statusClass;
+            if (isStale) {
+                statusText = 'NOT LOGGING';
+                statusClass = 'status-not-logging';
+            } else {
+                // Compare the latest energy value with threshold
+                statusText = (latestEnergy > threshold) ? 'IN USE' : 'NOT IN USE';
+                statusClass = (latestEnergy > threshold) ? 'status-in-use' : 'status-not-in-use';
+            }
+            document.getElementById('status-banner').textContent = statusText;
+            document.getElementById('status-banner').className = statusClass;
+        }
+        
+        function applyFullLog(data) {
+            threshold = data.threshold;
+            cursor = (data.cursor === undefined) ? null : data.cursor;
+            lastTimestamp = data.latest_timestamp;
+            
+            // Get the most recent energy value
+            latestEnergy = data.energy_values[data.energy_values.length - 1];
+            setStatus(data.is_stale, latestEnergy);
+            
+            // Update timestamp
+            document.getElementById('last-updated').textContent = `as of ${data.latest_timestamp}`;
+            
+            // Update log content
+            logParagraphs = data.log_text ? data.log_text.split('\\n\\n') : [];
+            document.getElementById('log-content').innerHTML = data.log_text;
+            
+            // Update chart (onChartScript draws it if Chart.js is still loading)
+            if (chartState !== 'ready') return;
+            if (!chart) {
+                const ctx = document.getElementById('energyChart').getContext('2d');
+                chart = new Chart(ctx, {
+                    type: 'line',
+                    data: {
+                        labels: data.timestamps,
+                        datasets: [{
+                            label: 'Energy at 60Hz',
+                            data: data.energy_values,
+                            borderColor: 'rgb(75, 192, 192)',
+                            tension: 0.1
+                        },
+                        {
+                            label: 'Threshold',
+                            data: Array(data.timestamps.length).fill(data.threshold),
+                            borderColor: 'rgba(255, 0, 0, 0.5)',
+                            borderDash: [5, 5],
+                            pointRadius: 0,
+                            fill: false
+                        }]
+                    },
+                    options: {
+                        responsive: true,
+                        scales: {
+                            y: {
+                                min: 15,
+                                max: 17.5
+                            }
+                        }
+                    }
+                });
+            } else {
+                chart.data.labels = data.timestamps;
+                chart.data.datasets[0].data = data.energy_values;
+                chart.data.datasets[1].data = Array(data.timestamps.length).fill(data.threshold);
+                chart.update();
+            }
+        }
+        
+        function loadFullLog() {
+            fetch(`/get_log?device=${DEVICE}`)
+                .then(response => response.json())
+                .then(applyFullLog);
+        }
+        
+        function onChartScript() {
+            const canvas = document.getElementById('energyChart');
+            if (chartState === 'failed') {
+                // Not parsed yet, or already replaced
+                if (canvas) canvas.outerHTML =
+                    '<p class="chart-unavailable">Chart unavailable: Chart.js could not be loaded. The status and log still update.</p>';
+            } else if (chartState === 'ready' && threshold !== undefined) {
+                // The log arrived first; fetch it again to draw the chart
+                cursor = null;
+                loadFullLog();
+            }
+        }
+        
+        function applyReadings(readings) {
+            // Wait for the initial full load before applying incremental updates
+            if (threshold === undefined) return;
+            
+            // Skip anything already shown, e.g. a reading seen both on the stream and in a catch-up poll
+            readings = readings.filter(r => !r.timestamp || r.timestamp > lastTimestamp);
+            if (!readings.length) return;
+            
+            let plotted = false;
+            readings.forEach(reading => {
+                logParagraphs.push(reading.paragraph);
+                if (reading.timestamp) lastTimestamp = reading.timestamp;
+                
+                if (reading.plot) {
+                    latestEnergy = reading.energy;
+                    if (chart) {
+                        chart.data.labels.push(reading.timestamp);
+                        chart.data.datasets[0].data.push(reading.energy);
+                        chart.data.datasets[1].data.push(threshold);
+                        plotted = true;
+                    }
+                }
+            });
+            
+            logParagraphs = logParagraphs.slice(-400);
+            document.getElementById('log-content').innerHTML = logParagraphs.join('\\n\\n');
+            document.getElementById('last-updated').textContent = `as of ${lastTimestamp}`;
+            
+            if (plotted) {
+                const excess = chart.data.labels.length - 400;
+                if (excess > 0) {
+                    chart.data.labels.splice(0, excess);
+                    chart.data.datasets.forEach(dataset => dataset.data.splice(0, excess));
+                }
+                chart.update();
+            }
+            
+            setStatus(false, latestEnergy);
+        }
         
         function updateLog() {
-            fetch('/get_log')
+            if (cursor === null) {
+                loadFullLog();
+                return;
+            }
+            
+            // Ask only for readings appended since our cursor
+            fetch(`/get_log?device=${DEVICE}&cursor=${cursor}`)
                 .then(response => response.json())
                 .then(data => {
-                    // Get the most recent energy value
-                    const latestEnergy = data.energy_values[data.energy_values.length - 1];
-                    
-                    // Update status banner based on logging status and energy level
-                    let statusText, statusClass;
-                    if (data.is_stale) {
-                        statusText = 'NOT LOGGING';
-                        statusClass = 'status-not-logging';
-                    } else {
-                        // Compare the latest energy value with threshold
-                        statusText = (latestEnergy > data.threshold) ? 'IN USE' : 'NOT IN USE';
-                        statusClass = (latestEnergy > data.threshold) ? 'status-in-use' : 'status-not-in-use';
+                    if (data.reset) {
+                        cursor = null;
+                        loadFullLog();
+                        return;
                     }
-                    document.getElementById('status-banner').textContent = statusText;
-                    document.getElementById('status-banner').className = statusClass;
-                    
-                    // Update timestamp
-                    document.getElementById('last-updated').textContent = `as of ${data.latest_timestamp}`;
-                    
-                    // Update log content
-                    document.getElementById('log-content').innerHTML = data.log_text;
-                    
-                    // Update chart
-                    if (!chart) {
-                        const ctx = document.getElementById('energyChart').getContext('2d');
-                        chart = new Chart(ctx, {
-                            type: 'line',
-                            data: {
-                                labels: data.timestamps,
-                                datasets: [{
-                                    label: 'Energy at 60Hz',
-                                    data: data.energy_values,
-                                    borderColor: 'rgb(75, 192, 192)',
-                                    tension: 0.1
-                                },
-                                {
-                                    label: 'Threshold',
-                                    data: Array(data.timestamps.length).fill(data.threshold),
-                                    borderColor: 'rgba(255, 0, 0, 0.5)',
-                                    borderDash: [5, 5],
-                                    pointRadius: 0,
-                                    fill: false
-                                }]
-                            },
-                            options: {
-                                responsive: true,
-                                scales: {
-                                    y: {
-                                        min: 15,
-                                        max: 17.5
-                                    }
-                                }
-                            }
-                        });
+                    if (!data.readings) {
+                        applyFullLog(data);
+                        return;
+                    }
+                    threshold = data.threshold;
+                    applyReadings(data.readings);
+                    cursor = data.cursor;
+                    if (data.is_stale) setStatus(true);
+                });
+        }
+        
+        function startPolling() {
+            if (pollTimer) return;
+            updateLog();
+            // Update every 5 seconds
+            pollTimer = setInterval(updateLog, 5000);
+        }
+        
+        function stopPolling() {
+            if (!pollTimer) return;
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+        
+        function startStream() {
+            // Fall back to polling on browsers without Server-Sent Events
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            
+            const source = new EventSource(`/stream?device=${DEVICE}`);
+            source.addEventListener('reading', e => applyReadings([JSON.parse(e.data)]));
+            source.addEventListener('cursor', e => {
+                cursor = JSON.parse(e.data).cursor;
+            });
+            source.addEventListener('reset', () => {
+                cursor = null;
+                loadFullLog();
+            });
+            source.addEventListener('session', e => renderSession(JSON.parse(e.data)));
+            source.addEventListener('status', e => {
+                if (JSON.parse(e.data).is_stale) setStatus(true);
+            });
+            source.onopen = () => {
+                // (Re)connected: catch up from our cursor once, then rely on pushed readings
+                stopPolling();
+                updateLog();
+            };
+            source.onerror = () => {
+                // Poll while the stream is down; EventSource keeps retrying in the background
+                startPolling();
+            };
+        }
+        
+        function formatMinutes(seconds) {
+            const minutes = Math.round(seconds / 60);
+            return minutes < 60 ? `${minutes} min` : `${Math.floor(minutes / 60)} h ${minutes % 60} min`;
+        }
+        
+        function renderSession(session) {
+            let text = '';
+            // While stale the banner already says NOT LOGGING
+            if (session.stale) {
+                text = '';
+            } else if (session.running) {
+                text = `Running for ${formatMinutes(session.elapsed_seconds)}`;
+                if (session.estimated_remaining_seconds !== null) {
+                    text += `, about ${formatMinutes(session.estimated_remaining_seconds)} left`;
+                } else if (session.typical_duration_seconds !== null) {
+                    text += ', longer than usual';
+                }
+            } else if (session.last_finished) {
+                text = `Last cycle finished ${session.last_finished}`;
+            }
+            document.getElementById('session-info').textContent = text;
+        }
+        
+        function updateSession() {
+            fetch(`/api/session?device=${DEVICE}`)
+                .then(response => response.json())
+                .then(renderSession)
+                .catch(console.error);
+        }
+        
+        function renderUsage(usage) {
+            // One row per weekday, one cell per bucket, darker the more often it was in use
+            const table = document.getElementById('usage-table');
+            const everyNth = Math.max(1, Math.round(180 / usage.bucket_minutes));
+            let html = '<tr><th></th>' + usage.buckets.map((label, i) =>
+                `<th>${i % everyNth === 0 ? label.slice(0, 2) : ''}</th>`).join('') + '</tr>';
+            usage.weekdays.forEach((day, row) => {
+                html += `<tr><th>${day}</th>`;
+                usage.occupancy[row].forEach((share, column) => {
+                    const when = `${day} ${usage.buckets[column]}`;
+                    if (share === null) {
+                        html += `<td class="usage-unknown" title="${when}: not enough data"></td>`;
                     } else {
-                        chart.data.labels = data.timestamps;
-                        chart.data.datasets[0].data = data.energy_values;
-                        chart.data.datasets[1].data = Array(data.timestamps.length).fill(data.threshold);
-                        chart.update();
+                        html += `<td style="background-color: rgba(139, 0, 0, ${share.toFixed(3)})" ` +
+                                `title="${when}: in use ${Math.round(share * 100)}% of ${usage.observed_hours[row][column]} h"></td>`;
                     }
                 });
+                html += '</tr>';
+            });
+            table.innerHTML = html;
         }
         
-        // Update every 5 seconds
-        setInterval(updateLog, 5000);
+        function updateUsage() {
+            fetch(`/api/usage?device=${DEVICE}`)
+                .then(response => response.json())
+                .then(renderUsage)
+                .catch(console.error);
+        }
+        
+        // Subscription id for this device, kept so the same browser can unsubscribe
+        const SUBSCRIPTION_KEY = `subscription-${DEVICE}`;
+        
+        function renderSubscription() {
+            const subscribed = localStorage.getItem(SUBSCRIPTION_KEY) !== null;
+            document.getElementById('subscribe-form').style.display = subscribed ? 'none' : '';
+            document.getElementById('unsubscribe-form').style.display = subscribed ? '' : 'none';
+        }
+        
+        function subscribe(event) {
+            event.preventDefault();
+            const topic = document.getElementById('ntfy-topic').value.trim();
+            if (!topic) return;
+            fetch('/api/subscriptions', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({device: DEVICE, kind: 'ntfy', target: topic})
+            })
+                .then(response => response.json().then(data => ({ok: response.ok, data})))
+                .then(({ok, data}) => {
+                    if (!ok) {
+                        document.getElementById('subscribe-message').textContent = data.error;
+                        return;
+                    }
+                    localStorage.setItem(SUBSCRIPTION_KEY, data.id);
+                    document.getElementById('subscribe-message').textContent = '';
+                    renderSubscription();
+                })
+                .catch(console.error);
+        }
+        
+        function unsubscribe(event) {
+            event.preventDefault();
+            fetch(`/api/subscriptions/${localStorage.getItem(SUBSCRIPTION_KEY)}`, {method: 'DELETE'})
+                .then(() => {
+                    localStorage.removeItem(SUBSCRIPTION_KEY);
+                    renderSubscription();
+                })
+                .catch(console.error);
+        }
         
         // Initial load
-        window.onload = updateLog;
+        document.addEventListener('DOMContentLoaded', () => {
+            // Chart.js may already have failed before this script was parsed
+            onChartScript();
+            renderSubscription();
+            startStream();
+            updateSession();
+            updateUsage();
+            // Elapsed time moves on between transitions; the lookup is cheap
+            setInterval(updateSession, 60000);
+            // A few readings barely move a week of averages
+            setInterval(updateUsage, 600000);
+        });
     </script>
     <style>
         body {
@@ -152,6 +426,55 @@ HTML_TEMPLATE = """
             box-shadow: 0 2px 5px rgba(0,0,0,0.1);
             margin-bottom: 20px;
         }
+        .chart-unavailable {
+            text-align: center;
+            color: #7f8c8d;
+        }
+        .usage-title {
+            text-align: center;
+            font-size: 18px;
+            margin-bottom: 10px;
+        }
+        #usage-table {
+            margin: 0 auto;
+            border-collapse: collapse;
+            font-size: 12px;
+        }
+        #usage-table td {
+            width: 18px;
+            height: 18px;
+            border: 1px solid #f0f0f0;
+        }
+        #usage-table th {
+            font-weight: normal;
+            padding: 0 4px;
+            text-align: left;
+        }
+        #usage-table td.usage-unknown {
+            background-color: #ddd;
+        }
+        .notify {
+            text-align: center;
+            font-size: 16px;
+            margin-bottom: 20px;
+        }
+        .notify input {
+            font-family: monospace;
+        }
+        .device-links {
+            text-align: center;
+            font-size: 18px;
+            margin-bottom: 10px;
+        }
+        .device-links a {
+            margin: 0 10px;
+            color: #0066cc;
+            text-decoration: none;
+        }
+        .device-links a.current {
+            font-weight: bold;
+            color: #000;
+        }
         .footer {
             text-align: center;
             font-size: 14px;
@@ -169,9 +492,27 @@ HTML_TEMPLATE = """
     </style>
 </head>
 <body>
-    <div class="title">The Laundry Machine at 1135 Masonic is:</div>
+    {% if devices|length > 1 %}
+    <div class="device-links">
+        {% for other in devices %}<a href="/?device={{ other.id }}"{% if other.id == device.id %} class="current"{% endif %}>{{ other.name }}</a>{% endfor %}
+    </div>
+    {% endif %}
+    <div class="title">The {{ device.name }} at 1135 Masonic is:</div>
     <div id="status-banner">Loading...</div>
+    <div id="session-info"></div>
     <div id="last-updated"></div>
+    <div class="notify">
+        <form id="subscribe-form" onsubmit="subscribe(event)">
+            Get a phone notification when it's free (<a href="https://ntfy.sh" target="_blank">ntfy</a> topic):
+            <input id="ntfy-topic" type="text" size="20">
+            <button type="submit">Notify me</button>
+            <span id="subscribe-message"></span>
+        </form>
+        <form id="unsubscribe-form" onsubmit="unsubscribe(event)" style="display: none">
+            You'll get a notification when it's free.
+            <button type="submit">Stop notifications</button>
+        </form>
+    </div>
     <div class="description">
         <br> 
         This Laundry Monitor monitors the amount of power going into the washing machine. It will only indicate IN USE when the machine is running. It will not tell you if there are clothes in the machine.
@@ -183,30 +524,321 @@ HTML_TEMPLATE = """
     <div class="chart-container">
         <canvas id="energyChart"></canvas>
     </div>
+    <div class="chart-container">
+        <div class="usage-title">How often it is in use, by day and hour (darker = busier)</div>
+        <table id="usage-table"></table>
+    </div>
     <div id="log-content"></div>
 </body>
 </html>
 """
 
-LOG_FILE = '/home/garges/LaundryMonitor/history.log'
+LOG_DIR = '/home/garges/LaundryMonitor'
+
+# The page and APIs show this device unless ?device=<id> asks for another
+DEFAULT_DEVICE = DEVICES[0]['id']
+
+# "Notify me when it's free" subscriptions, shared by every worker
+SUBSCRIPTIONS_FILE = os.path.join(LOG_DIR, 'subscriptions.json')
+
+# Proxies whose X-Forwarded-For entries are trusted: the Pi's nginx, and the
+# cloud VM's nginx, whose connections arrive through the SSH tunnel on localhost
+TRUSTED_PROXY_NETWORKS = [ipaddress.ip_network('127.0.0.0/8'), ipaddress.ip_network('::1/128')]
+
+# Columns of /api/export, one row per history.log paragraph
+EXPORT_COLUMNS = ['time', f"energy_{AMPLITUDE_FREQUENCY}hz", f"energy_{RATIO_FREQUENCY}hz",
+                  'amplitude_algorithm', 'ratio_algorithm']
+ENERGY_LINE = re.compile(r'^energy at (\d+)Hz: ([-\d.]+)', re.M)
+ALGORITHM_LINE = re.compile(r'^(AMPLITUDE|RATIO)_ALGORITHM=(ON|OFF)', re.M)
+
+_threads_started = False
+_threads_lock = threading.Lock()
+
+def parse_reading(paragraph):
+    """Return (timestamp, 60Hz energy) from a history.log paragraph, None where missing"""
+    timestamp_match = re.search(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', paragraph)
+    energy_match = re.search(r'energy at 60Hz: (\d+\.\d+)', paragraph)
+    timestamp = timestamp_match.group(1) if timestamp_match else None
+    energy = float(energy_match.group(1)) if energy_match else None
+    return timestamp, energy
+
+def is_stale_timestamp(timestamp):
+    """Check if a reading is stale (more than 2 minutes old)"""
+    last_time = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
+    return (datetime.now() - last_time) > timedelta(minutes=2)
+
+def reading_record(paragraph):
+    """Compact per-reading record shared by the delta API and the event stream"""
+    timestamp, energy = parse_reading(paragraph)
+    return {
+        'timestamp': timestamp,
+        'energy': energy,
+        'plot': energy is not None and 15 <= energy <= 17.5,
+        'paragraph': paragraph,
+    }
+
+def export_row(timestamp, paragraph):
+    """The values of one raw history.log paragraph, by EXPORT_COLUMNS name"""
+    text = paragraph.decode('utf-8', errors='replace')
+    energies = {int(frequency): float(value) for frequency, value in ENERGY_LINE.findall(text)}
+    algorithms = dict(ALGORITHM_LINE.findall(text))
+    return {
+        'time': timestamp,
+        EXPORT_COLUMNS[1]: energies.get(AMPLITUDE_FREQUENCY),
+        EXPORT_COLUMNS[2]: energies.get(RATIO_FREQUENCY),
+        'amplitude_algorithm': algorithms.get('AMPLITUDE'),
+        'ratio_algorithm': algorithms.get('RATIO'),
+    }
+
+def read_paragraphs_since(log_file, offset):
+    """Return (complete paragraphs after byte offset, offset just past the last complete one).
+
+    The receiver terminates each record with a blank line, so a trailing
+    paragraph without one is still being written and is left for next time.
+    """
+    with STAGE_SECONDS.time(process='laundry_webserver', stage='read_log'):
+        with open(log_file, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        
+        end = data.rfind(b'\n\n')
+        if end < 0:
+            return [], offset
+        
+        text = data[:end].decode('utf-8', errors='replace')
+        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+        return paragraphs, offset + end + 2
+
+def last_paragraph_before(log_file, offset):
+    """The paragraph ending at offset, found by reading only the file tail"""
+    with open(log_file, 'rb') as f:
+        f.seek(max(0, offset - 1024))
+        tail = f.read(min(offset, 1024)).decode('utf-8', errors='replace')
+    paragraphs = [p.strip() for p in tail.split('\n\n') if p.strip()]
+    return paragraphs[-1] if paragraphs else ''
+
+def latest_timestamp_before(log_file, offset):
+    """Timestamp of the paragraph ending at offset"""
+    return parse_reading(last_paragraph_before(log_file, offset))[0] or ''
+
+class LaundryDevice:
+    """One monitored machine: its history log, event stream, wash-cycle index and latest reading.
+
+    Everything a request needs is kept here and found by id, so serving one
+    device costs the same however many are configured.
+    """
+
+    def __init__(self, config, log_dir=LOG_DIR, notifier=None):
+        self.id = config['id']
+        self.name = config['name']
+        self.threshold = device_threshold(config)
+        self.log_file = os.path.join(log_dir, device_file(config, 'history_log'))
+        # Pushes each new paragraph of this device's log to its open dashboards
+        self.events = EventBroadcaster()
+        # Wash cycles detected from the readings, for the elapsed/remaining time display
+        self.sessions = SessionTracker(self.threshold, os.path.join(log_dir, device_file(config, 'sessions')),
+                                       os.path.join(log_dir, device_file(config, 'session_state')))
+        # Occupancy by weekday and hour, for "when is it usually free"
+        self.usage = UsageHeatmap(self.threshold, os.path.join(log_dir, device_file(config, 'usage')))
+        # Tells subscribers when a cycle ends (None: no notifications)
+        self.notifier = notifier
+        # Log offset the watcher has published up to, and the newest reading there
+        self.offset = 0
+        self.latest_timestamp = None
+        self.latest_energy = None
+        self._stale_published = False
+    
+    def catch_up(self):
+        """Feed the session and usage indexes the readings logged since their checkpoints; returns the log offset reached.
+
+        The first run (or a log trimmed below a checkpoint) replays the whole
+        file once; readings an index has already seen are skipped by timestamp.
+        """
+        if not os.path.exists(self.log_file):
+            return 0
+        size = os.path.getsize(self.log_file)
+        offsets = [self.sessions.offset, self.usage.offset]
+        start = 0 if any(offset is None or offset > size for offset in offsets) else min(offsets)
+        paragraphs, offset = read_paragraphs_since(self.log_file, start)
+        for paragraph in paragraphs:
+            timestamp, energy = parse_reading(paragraph)
+            self.sessions.add_reading(timestamp, energy)
+            self.usage.add_reading(timestamp, energy)
+        self.sessions.checkpoint(offset)
+        self.usage.checkpoint(offset)
+        self.latest_timestamp, self.latest_energy = parse_reading(last_paragraph_before(self.log_file, offset))
+        return offset
+    
+    def update_indexes(self, records, offset):
+        """Advance the session and usage indexes; push a 'session' event on each start/end"""
+        for record in records:
+            transition = self.sessions.add_reading(record['timestamp'], record['energy'])
+            # A 'discarded' blip was never a cycle; the page's minute refresh clears it
+            if transition in ('started', 'ended'):
+                status = self.sessions.status()
+                self.events.publish('session', status)
+                # Only for a cycle that was recorded (so last_finished is this one's end), and
+                # not after a receiver outage with the machine still running
+                if transition == 'ended' and record['energy'] <= self.threshold:
+                    self.notify_available(status)
+            self.usage.add_reading(record['timestamp'], record['energy'])
+        self.sessions.checkpoint(offset)
+        self.usage.checkpoint(offset)
+    
+    def notify_available(self, status):
+        """Hand a finished cycle to the notifier; delivery happens on its own thread"""
+        if self.notifier is None:
+            return
+        finished = status['last_finished']
+        message = f"{self.name} is free" + (f" (cycle finished at {finished[11:16]})" if finished else '')
+        self.notifier.notify(self.id, self.name, message, finished=finished)
+    
+    def poll(self):
+        """Publish paragraphs appended since the last poll as 'reading' events"""
+        size = os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+        if size < self.offset:
+            # File was truncated or replaced; cursors held by clients are now meaningless
+            self.offset = read_paragraphs_since(self.log_file, 0)[1] if size else 0
+            self.events.publish('reset', {'cursor': self.offset})
+        elif size > self.offset:
+            paragraphs, next_offset = read_paragraphs_since(self.log_file, self.offset)
+            records = [reading_record(paragraph) for paragraph in paragraphs]
+            for record in records:
+                if record['timestamp']:
+                    self.latest_timestamp = record['timestamp']
+                    self.latest_energy = record['energy']
+                    self._stale_published = False
+                self.events.publish('reading', record)
+            self.update_indexes(records, next_offset)
+            
+            # Clients resume delta polling from here if the stream drops
+            if next_offset != self.offset:
+                self.events.publish('cursor', {'cursor': next_offset})
+            self.offset = next_offset
+        
+        # One producer reports staleness, so idle viewers never need to poll for it
+        if self.latest_timestamp and not self._stale_published and is_stale_timestamp(self.latest_timestamp):
+            self.events.publish('status', {'is_stale': True})
+            self._stale_published = True
+    
+    def summary(self):
+        """Status for the device list, from memory"""
+        is_stale = not self.latest_timestamp or is_stale_timestamp(self.latest_timestamp)
+        return {
+            'id': self.id,
+            'name': self.name,
+            'latest_timestamp': self.latest_timestamp,
+            'energy': self.latest_energy,
+            'threshold': self.threshold,
+            'is_stale': is_stale,
+            'in_use': not is_stale and self.latest_energy is not None and self.latest_energy > self.threshold,
+            'session': self.sessions.status(),
+        }
+
+# Delivers availability notifications from its own asyncio thread
+notifier = Notifier(SubscriptionStore(SUBSCRIPTIONS_FILE))
+
+# Every configured machine, by id
+devices = {config['id']: LaundryDevice(config, notifier=notifier) for config in DEVICES}
+
+def render_pages():
+    """Each device's dashboard, rendered and compressed once; the page itself never changes"""
+    with app.test_request_context():
+        return {device.id: PrecompressedBody(render_template_string(
+                    HTML_TEMPLATE, device=device, devices=list(devices.values()), assets=assets,
+                    chart_js=CHART_JS), 'text/html')
+                for device in devices.values()}
+
+pages = render_pages()
+
+def watch_log_files():
+    """Tail every device's history log from one thread"""
+    for device in devices.values():
+        try:
+            device.offset = device.catch_up()
+        except Exception as e:
+            print(f"Error catching up {device.log_file}: {e}")
+    
+    while True:
+        for device in devices.values():
+            try:
+                device.poll()
+            except Exception as e:
+                print(f"Error watching log file {device.log_file}: {e}")
+        
+        time.sleep(1)
+
+def start_background_threads():
+    """Start the log watcher once per process (also under a WSGI server, on first request)"""
+    global _threads_started
+    with _threads_lock:
+        if _threads_started:
+            return
+        _threads_started = True
+    
+    notifier.start()
+    
+    # Single producer for the event streams, shared by all connected clients
+    watcher_thread = threading.Thread(target=watch_log_files, daemon=True)
+    watcher_thread.start()
+
+@app.before_request
+def ensure_background_threads():
+    if not _threads_started:
+        start_background_threads()
 
-# Keep track of last 400 energy readings
-energy_history = deque(maxlen=400)
-timestamp_history = deque(maxlen=400)
+def requested_device():
+    """The device named by ?device=, the default device without one, or None if unknown"""
+    return devices.get(request.args.get('device', DEFAULT_DEVICE))
+
+def unknown_device():
+    return jsonify({'error': f"Unknown device {request.args.get('device')}", 'devices': list(devices)}), 404
 
 @app.route('/')
 def home():
-    return render_template_string(HTML_TEMPLATE)
+    device = requested_device()
+    if device is None:
+        return unknown_device()
+    # Readings arrive through the APIs, so the HTML is the same on every visit: revalidate by ETag (a 304)
+    return pages[device.id].response(request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
+
+@app.route('/favicon.ico')
+def favicon():
+    return assets.response('favicon-32x32.png', cache_control='public, max-age=86400')
+
+def get_log_delta(device, cursor):
+    """Readings appended after the client's cursor, O(new data) instead of O(history)"""
+    size = os.path.getsize(device.log_file)
+    if cursor > size:
+        # The log was truncated or replaced under the client; it must reload in full
+        return jsonify({'reset': True, 'threshold': device.threshold})
+    
+    paragraphs, next_cursor = read_paragraphs_since(device.log_file, cursor)
+    readings = [reading_record(p) for p in paragraphs[-400:]]
+    
+    timestamps = [r['timestamp'] for r in readings if r['timestamp']]
+    latest_timestamp = timestamps[-1] if timestamps else latest_timestamp_before(device.log_file, next_cursor)
+    
+    return jsonify({
+        'cursor': next_cursor,
+        'readings': readings,
+        'latest_timestamp': latest_timestamp,
+        'is_stale': is_stale_timestamp(latest_timestamp) if latest_timestamp else True,
+        'threshold': device.threshold
+    })
 
 @app.route('/get_log')
 def get_log():
+    device = requested_device()
+    if device is None:
+        return unknown_device()
     try:
-        # Read the last 100 lines of the log file
-        with open(LOG_FILE, 'r') as f:
-            content = f.read()
-            
-        # Split into paragraphs
-        paragraphs = content.strip().split('\n\n')
+        cursor = request.args.get('cursor', type=int)
+        if cursor is not None and cursor >= 0:
+            return get_log_delta(device, cursor)
+        
+        # Read every complete paragraph of the log file
+        paragraphs, cursor = read_paragraphs_since(device.log_file, 0)
         # Take last 400 paragraphs
         recent_paragraphs = paragraphs[-400:]
         
@@ -219,32 +851,37 @@ def get_log():
             timestamp_match = re.search(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', recent_paragraphs[-1])
             if timestamp_match:
                 latest_timestamp = timestamp_match.group(1)
-                # Check if log is stale (more than 2 minutes old)
-                last_time = datetime.strptime(latest_timestamp, '%Y-%m-%d %H:%M:%S')
-                is_stale = (datetime.now() - last_time) > timedelta(minutes=2)
+                is_stale = is_stale_timestamp(latest_timestamp)
         
-        # Update energy history
-        energy_history.clear()
-        timestamp_history.clear()
+        # With ?points=N the chart covers the whole log, reduced to N points by LTTB
+        points = parse_points(request.args.get('points'), default=None)
+        chart_paragraphs = paragraphs if points else recent_paragraphs
+        energy_values = []
+        timestamps = []
         
-        for paragraph in recent_paragraphs:
-            energy_match = re.search(r'energy at 60Hz: (\d+\.\d+)', paragraph)
-            timestamp_match = re.search(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', paragraph)
-            
-            if energy_match and timestamp_match:
-                energy_value = float(energy_match.group(1))
-                # Only add to history if energy is between 15 and 17.5
-                if 15 <= energy_value <= 17.5:
-                    energy_history.append(energy_value)
-                    timestamp_history.append(timestamp_match.group(1))
+        with STAGE_SECONDS.time(process='laundry_webserver', stage='parse_log'):
+            for paragraph in chart_paragraphs:
+                timestamp, energy_value = parse_reading(paragraph)
+                
+                if energy_value is not None and timestamp:
+                    # Only add to history if energy is between 15 and 17.5
+                    if 15 <= energy_value <= 17.5:
+                        energy_values.append(energy_value)
+                        timestamps.append(timestamp)
+        
+        if points:
+            keep = downsample_indices(timestamps, energy_values, points)
+            energy_values = [energy_values[i] for i in keep]
+            timestamps = [timestamps[i] for i in keep]
         
         return jsonify({
             'log_text': '\n\n'.join(recent_paragraphs),
             'latest_timestamp': latest_timestamp,
             'is_stale': is_stale,
-            'energy_values': list(energy_history),
-            'timestamps': list(timestamp_history),
-            'threshold': ENERGY_THRESHOLD  # Use the configurable threshold
+            'energy_values': energy_values,
+            'timestamps': timestamps,
+            'threshold': device.threshold,
+            'cursor': cursor
         })
     except Exception as e:
         return jsonify({
@@ -253,8 +890,122 @@ def get_log():
             'is_stale': True,
             'energy_values': [],
             'timestamps': [],
-            'threshold': ENERGY_THRESHOLD  # Use the configurable threshold
+            'threshold': device.threshold
         })
 
+@app.route('/api/session')
+def get_session():
+    """Current wash cycle: elapsed time and estimated time remaining"""
+    device = requested_device()
+    if device is None:
+        return unknown_device()
+    return jsonify(device.sessions.status())
+
+@app.route('/api/usage')
+def get_usage():
+    """Share of observed time the machine was in use, by weekday and hour"""
+    device = requested_device()
+    if device is None:
+        return unknown_device()
+    return jsonify(device.usage.summary())
+
+@app.route('/api/export')
+def export():
+    """Readings from ?start= up to ?end= as CSV or NDJSON (?format=), streamed from history.log.
+
+    Rows are read and sent a chunk at a time, so memory use doesn't depend on
+    the range, and a slow download only holds up its own worker thread.
+    """
+    device = requested_device()
+    if device is None:
+        return unknown_device()
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format {export_format}", 'formats': list(EXPORT_FORMATS)}), 400
+    try:
+        start = parse_time_bound(request.args.get('start'))
+        end = parse_time_bound(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not os.path.exists(device.log_file):
+        return jsonify({'error': f"No history for {device.id}"}), 404
+    
+    def rows():
+        if export_format == 'csv':
+            yield csv_line(EXPORT_COLUMNS)
+        for timestamp, paragraph in iter_records(device.log_file, start, end, terminator=b'\n\n'):
+            row = export_row(timestamp, paragraph)
+            yield csv_line(row.values()) if export_format == 'csv' else ndjson_line(row)
+    
+    return streamed_response(chunked(rows()), EXPORT_FORMATS[export_format], request.headers.get('Accept-Encoding'),
+                             {'Content-Disposition': f'attachment; filename="{device.id}_history.{export_format}"'})
+
+def is_trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXY_NETWORKS)
+
+def client_address():
+    """The visitor's address for the per-client subscription cap.
+
+    nginx appends to whatever X-Forwarded-For the visitor sent, so only the
+    entries added by our own proxies count: walking back from the connection
+    itself, the first address that isn't a trusted proxy is the one the
+    outermost trusted proxy saw.
+    """
+    forwarded = [entry.strip() for entry in request.headers.get('X-Forwarded-For', '').split(',') if entry.strip()]
+    hops = forwarded + [request.remote_addr]
+    for address in reversed(hops):
+        if not is_trusted_proxy(address):
+            return address
+    # Every hop is local, e.g. a request made on the Pi itself
+    return request.remote_addr
+
+def public_subscription(subscription):
+    return {key: value for key, value in subscription.items() if key != 'client'}
+
+@app.route('/api/subscriptions', methods=['POST'])
+def subscribe():
+    """Register {"device": id, "kind": "webhook"|"ntfy", "target": URL or ntfy topic}; keep the returned id to unsubscribe"""
+    data = request.get_json(silent=True) or {}
+    device = devices.get(data.get('device', DEFAULT_DEVICE))
+    if device is None:
+        return jsonify({'error': f"Unknown device {data.get('device')}", 'devices': list(devices)}), 404
+    try:
+        subscription = notifier.store.add(device.id, data.get('kind', 'ntfy'), data.get('target'), client_address())
+    except ValueError as e:
+        return jsonify({'error': str(e), 'kinds': SUBSCRIPTION_KINDS}), 400
+    except OSError as e:
+        return jsonify({'error': f"Error saving subscription: {e}"}), 500
+    return jsonify(public_subscription(subscription)), 201
+
+@app.route('/api/subscriptions/<subscription_id>', methods=['GET', 'DELETE'])
+def subscription(subscription_id):
+    if request.method == 'GET':
+        found = notifier.store.get(subscription_id)
+        return jsonify(public_subscription(found)) if found else (jsonify({'error': 'No such subscription'}), 404)
+    try:
+        removed = notifier.store.remove(subscription_id)
+    except OSError as e:
+        return jsonify({'error': f"Error saving subscriptions: {e}"}), 500
+    return ('', 204) if removed else (jsonify({'error': 'No such subscription'}), 404)
+
+@app.route('/api/devices')
+def get_devices():
+    """Every machine's latest reading and cycle, in configuration order"""
+    return jsonify([device.summary() for device in devices.values()])
+
+@app.route('/stream')
+def stream():
+    """Server-Sent Events feed of new readings, replacing the 5 second poll"""
+    device = requested_device()
+    if device is None:
+        return unknown_device()
+    return Response(device.events.stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    start_background_threads()
+    
+    app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,128 @@
+import json
+import os
+import re
+
+# Time-range export straight from the append-only logs. Both wind_log.csv (one
+# row per line) and history.log (one paragraph per reading) start each record
+# with a 'YYYY-MM-DD HH:MM:SS' timestamp and are written in time order, so the
+# first record of a range is found by binary search over byte offsets and the
+# rest is read sequentially. Nothing but the current chunk is held in memory,
+# whatever the range.
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Output is sent in pieces of about this size rather than per row
+EXPORT_CHUNK_BYTES = 65536
+
+# The binary search stops once the range is this narrow and scans the rest
+SEEK_SCAN_BYTES = 65536
+
+RECORD_START = re.compile(rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})[,\r\n]')
+TIME_BOUND = re.compile(r'\d{4}-\d{2}-\d{2}( \d{2}:\d{2}(:\d{2})?)?')
+
+def parse_time_bound(value):
+    """A ?start=/?end= value as a comparable timestamp prefix, None if absent; ValueError if malformed.
+
+    Accepts 'YYYY-MM-DD', 'YYYY-MM-DD HH:MM' or 'YYYY-MM-DD HH:MM:SS' (a 'T'
+    separator too). Ranges are half-open, so end=2025-06-02 stops before that day.
+    """
+    if not value:
+        return None
+    value = value.strip().replace('T', ' ')
+    if not TIME_BOUND.fullmatch(value):
+        raise ValueError(f"Expected YYYY-MM-DD[ HH:MM[:SS]], got {value!r}")
+    return value
+
+def record_time(line):
+    """Timestamp of a line that starts a record, else None"""
+    match = RECORD_START.match(line)
+    return match.group(1).decode() if match else None
+
+def next_record(f, position):
+    """(offset, timestamp) of the first record starting at or after position, or (None, None)"""
+    if position > 0:
+        # Finish the line that position falls in
+        f.seek(position - 1)
+        f.readline()
+    else:
+        f.seek(0)
+    while True:
+        offset = f.tell()
+        line = f.readline()
+        if not line:
+            return None, None
+        timestamp = record_time(line)
+        if timestamp is not None:
+            return offset, timestamp
+
+def find_start_offset(f, start, size):
+    """Offset to scan from for the first record at or after `start`; O(log size) reads"""
+    low, high = 0, size
+    while high - low > SEEK_SCAN_BYTES:
+        middle = (low + high) // 2
+        _, timestamp = next_record(f, middle)
+        if timestamp is None or timestamp >= start:
+            high = middle
+        else:
+            # Every record before this one is earlier still
+            low = middle
+    return low
+
+def iter_records(path, start=None, end=None, terminator=b'\n'):
+    """(timestamp, raw bytes) of each record with start <= timestamp < end.
+
+    A record runs from its timestamp line to the next one. Only the file as it
+    was when the export began is read, and a last record that doesn't end with
+    `terminator` yet is still being written and is left out.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        f.seek(find_start_offset(f, start, size) if start else 0)
+        position = f.tell()
+        lines, timestamp = [], None
+
+        while True:
+            line = f.readline()
+            position += len(line)
+            if not line or position > size:
+                break
+            line_timestamp = record_time(line)
+            if line_timestamp is None:
+                if timestamp is not None:
+                    lines.append(line)
+                continue
+            if timestamp is not None and (start is None or timestamp >= start):
+                yield timestamp, b''.join(lines)
+            if end is not None and line_timestamp >= end:
+                return
+            lines, timestamp = [line], line_timestamp
+
+        if timestamp is not None and (start is None or timestamp >= start):
+            record = b''.join(lines)
+            if record.endswith(terminator):
+                yield timestamp, record
+
+def csv_line(values):
+    """One CSV line; exported values are numbers, timestamps and ON/OFF, so nothing needs quoting"""
+    return ','.join('' if value is None else str(value) for value in values) + '\n'
+
+def ndjson_line(row):
+    return json.dumps(row, separators=(',', ':')) + '\n'
+
+def chunked(pieces, size=EXPORT_CHUNK_BYTES):
+    """Join str/bytes pieces into byte chunks of about `size`"""
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        if isinstance(piece, str):
+            piece = piece.encode('utf-8')
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield b''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b''.join(buffer)
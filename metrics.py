@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""Lightweight per-stage timers and counters, exported as Prometheus text.
+
+Each process records into its own in-memory registry. The web servers render
+theirs on /metrics; processes without an HTTP server (the logger, receiver,
+transmitter scripts) save their state as JSON into METRICS_DIR, and /metrics
+merges every fresh state file on the same host into one exposition. On the
+transmitter Pi, `python3 metrics.py` prints the merged text instead.
+
+Set PIPELINE_METRICS=0 to disable: every call then returns after one check.
+"""
+
+import argparse
+import atexit
+import contextlib
+import fcntl
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+ENABLED = os.environ.get('PIPELINE_METRICS', '1') != '0'
+METRICS_DIR = os.environ.get('PIPELINE_METRICS_DIR', '/tmp/pipeline_metrics')
+
+# Seconds; covers a 100 ms poll up to a multi-second arecord or radio timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# State files not updated for this long belong to processes that have gone away
+STATE_MAX_AGE_SECONDS = 600
+
+# Web server workers save to <process>-worker<slot>.json, taking the lowest slot
+# no live worker holds. A worker replacing a killed one reuses its file instead
+# of being summed alongside it, and the number of files stays at the number of
+# workers. Slots beyond this fall back to one file per pid.
+MAX_WORKER_SLOTS = 64
+# Worker state files (and the per-pid ones of older versions); only these are
+# deleted once expired, since the scripts restore their counts from theirs
+WORKER_STATE_FILE = re.compile(r'.+-(worker)?\d+\.json$')
+
+# Shared no-op context manager handed out while disabled
+_NULL_TIMER = contextlib.nullcontext()
+
+class Histogram:
+    """Distribution of observed values (usually seconds) per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels tuple -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed seconds of its block"""
+        if not ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def state(self):
+        with self._lock:
+            return [[list(key), list(series)] for key, series in self._series.items()]
+
+    def load(self, series_list):
+        with self._lock:
+            for key, series in series_list:
+                if len(series) == len(self.buckets) + 2:
+                    self._series[tuple(tuple(pair) for pair in key)] = list(series)
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._series.items()]
+
+    def load(self, series_list):
+        with self._lock:
+            for key, value in series_list:
+                self._series[tuple(tuple(pair) for pair in key)] = value
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    """Get or create the named histogram"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Histogram(name, help, buckets)
+        return _registry[name]
+
+def counter(name, help):
+    """Get or create the named counter"""
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = Counter(name, help)
+        return _registry[name]
+
+# The shared families every instrumented process records into
+STAGE_SECONDS = histogram('pipeline_stage_seconds', 'Time spent in each pipeline stage')
+EVENTS = counter('pipeline_events_total', 'Items handled by each pipeline stage, by outcome')
+
+def registry_state():
+    """JSON-serialisable snapshot of this process's metrics"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {metric.name: {'type': metric.kind, 'help': metric.help,
+                          'buckets': list(getattr(metric, 'buckets', ())), 'series': metric.state()}
+            for metric in metrics}
+
+def state_path(process):
+    return os.path.join(METRICS_DIR, f"{process}.json")
+
+def save_state(process):
+    """Publish this process's metrics for the web servers' /metrics (atomic replace)"""
+    if not ENABLED:
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = state_path(process)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(registry_state(), f, separators=(',', ':'))
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error saving metrics for {process}: {e}")
+
+def restore_state(process):
+    """Continue from a previous run's saved metrics (for short-lived processes like process_audio.py)"""
+    if not ENABLED:
+        return
+    try:
+        with open(state_path(process), 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return
+    for name, family in state.items():
+        if family['type'] == 'histogram':
+            histogram(name, family['help'], family['buckets']).load(family['series'])
+        else:
+            counter(name, family['help']).load(family['series'])
+
+def remove_state(process):
+    try:
+        os.remove(state_path(process))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Error removing metrics for {process}: {e}")
+
+class PeriodicSaver:
+    """Calls save_state at most every `interval` seconds, for hot loops; `process` may be a callable giving the name"""
+
+    def __init__(self, process, interval=10.0):
+        self.process = process
+        self.interval = interval
+        self._next_save = 0.0
+
+    def __call__(self, *args):
+        if ENABLED and time.monotonic() >= self._next_save:
+            self._next_save = time.monotonic() + self.interval
+            save_state(self.process() if callable(self.process) else self.process)
+
+def claim_slot(process):
+    """(state name, open lock file) for the lowest worker slot nobody holds; the lock lasts as long as the process"""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        for slot in range(MAX_WORKER_SLOTS):
+            lock_file = open(os.path.join(METRICS_DIR, f"{process}-worker{slot}.lock"), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            return f"{process}-worker{slot}", lock_file
+    except OSError as e:
+        print(f"Error claiming a metrics slot for {process}: {e}")
+    return f"{process}-{os.getpid()}", None
+
+class WorkerSlot:
+    """The state name of this web server worker, claimed on first use in each process.
+
+    Claiming lazily matters under gunicorn: the app may be imported before the
+    workers fork, and each worker needs a slot of its own.
+    """
+
+    def __init__(self, process):
+        self.process = process
+        self._pid = None
+        self._name = None
+        self._lock_file = None
+
+    def __call__(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            self._pid = pid
+            self._name, self._lock_file = claim_slot(self.process)
+            # A worker that exits cleanly (recycled, or the service stopping) takes its counts with it
+            name = self._name
+            atexit.register(lambda: os.getpid() == pid and remove_state(name))
+        return self._name
+
+def read_states(exclude=None):
+    """Fresh state files in METRICS_DIR, skipping `exclude` (this process's own); expired worker files are deleted"""
+    states = []
+    now = time.time()
+    for path in sorted(glob.glob(os.path.join(METRICS_DIR, '*.json'))):
+        if exclude and os.path.basename(path) == f"{exclude}.json":
+            continue
+        try:
+            if now - os.path.getmtime(path) > STATE_MAX_AGE_SECONDS:
+                if WORKER_STATE_FILE.match(os.path.basename(path)):
+                    os.remove(path)
+                continue
+            with open(path, 'r') as f:
+                states.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return states
+
+def merge_states(states):
+    """Sum series with identical labels across processes (e.g. several WSGI workers)"""
+    merged = {}
+    for state in states:
+        for name, family in state.items():
+            target = merged.setdefault(name, {'type': family['type'], 'help': family['help'],
+                                              'buckets': family['buckets'], 'series': {}})
+            if target['buckets'] != family['buckets']:
+                continue
+            for key, value in family['series']:
+                key = tuple(tuple(pair) for pair in key)
+                if family['type'] == 'histogram':
+                    existing = target['series'].get(key)
+                    target['series'][key] = [a + b for a, b in zip(existing, value)] if existing else list(value)
+                else:
+                    target['series'][key] = target['series'].get(key, 0) + value
+    return merged
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def render(states):
+    """Prometheus text exposition of merged metric states"""
+    lines = []
+    for name, family in sorted(merge_states(states).items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for key, value in sorted(family['series'].items()):
+            if family['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(family['buckets'], value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', repr(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_format_labels(key)} {value[-2]}")
+                lines.append(f"{name}_count{_format_labels(key)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_format_labels(key)} {value}")
+    return '\n'.join(lines) + '\n'
+
+def render_all(process=None):
+    """This process's live metrics plus every other process's saved state on this host"""
+    if not ENABLED:
+        return "# metrics disabled (PIPELINE_METRICS=0)\n"
+    return render([registry_state()] + read_states(exclude=process))
+
+def instrument_app(app, process):
+    """Time every Flask request by endpoint, save state for other workers, and serve /metrics"""
+    from flask import Response, g, request
+
+    # One state file per worker slot; their series share labels and are summed on render
+    state_name = WorkerSlot(process)
+    saver = PeriodicSaver(state_name)
+
+    @app.before_request
+    def start_request_timer():
+        if ENABLED:
+            g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            STAGE_SECONDS.observe(time.perf_counter() - started, process=process, stage=f"http:{request.endpoint}")
+            EVENTS.inc(process=process, stage=f"http:{request.endpoint}", outcome=str(response.status_code))
+            saver()
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus text exposition for this host's pipeline"""
+        return Response(render_all(state_name()), mimetype='text/plain; version=0.0.4')
+
+def main():
+    global METRICS_DIR
+    parser = argparse.ArgumentParser(description="Print the pipeline metrics saved on this host as Prometheus text.")
+    parser.add_argument('--dir', default=METRICS_DIR, help="Directory of saved metric states")
+    args = parser.parse_args()
+
+    METRICS_DIR = args.dir
+    print(render(read_states()), end='')
+
+if __name__ == "__main__":
+    main()
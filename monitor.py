@@ -1,20 +1,14 @@
-import pigpio
-import time
-from collections import deque
+import sys
+from sliding_window import SlidingWindowSums
+from wind_capture import open_samples
 
-PIN = 17
-pulse_times = deque()
+TIME_WINDOWS = [1, 5, 10, 30, 60, 600, 3600]
 
-pi = pigpio.pi()
-if not pi.connected:
-    raise RuntimeError("Cannot connect to pigpio daemon")
+# Per-second pulse counts feed O(1) running sums for every window
+pulse_sums = SlidingWindowSums(TIME_WINDOWS)
 
-def count_pulse(gpio, level, tick):
-    now = time.time()
-    pulse_times.append(now)
-
-pi.set_mode(PIN, pigpio.INPUT)
-cb = pi.callback(PIN, pigpio.RISING_EDGE, count_pulse)
+# Shares wind_capture.py's GPIO callback when it is running ('local' to force the pin)
+samples = open_samples(sys.argv[1] if len(sys.argv) > 1 else 'auto')
 
 # Constants
 PULSES_PER_ROTATION = 20
@@ -30,19 +24,17 @@ def calculate_wind_speed(pulses, interval_seconds):
     return wind_mps, wind_mph
 
 def count_recent_pulses(window_seconds):
-    now = time.time()
-    while pulse_times and pulse_times[0] < now - 60:
-        pulse_times.popleft()
-    return len([t for t in pulse_times if t >= now - window_seconds])
+    # Until a window has filled, count what has arrived so far
+    return pulse_sums.sum(window_seconds, partial=True)
 
-print("Counting pulses with pigpio. Press Ctrl+C to stop.\n")
+print("Counting pulses. Press Ctrl+C to stop.\n")
 
 try:
-    while True:
-        time.sleep(1)
+    for sample in samples:
+        pulse_sums.add(sample['pulses'])
         print(f"{'Time Window':>12} | {'Pulses':>6} | {'m/s':>6} | {'mph':>6}")
         print("-" * 40)
-        for window in [1, 5, 10, 30, 60]:
+        for window in TIME_WINDOWS:
             pulses = count_recent_pulses(window)
             wind_mps, wind_mph = calculate_wind_speed(pulses, window)
             print(f"{window:>12}s | {pulses:>6} | {wind_mps:>6.2f} | {wind_mph:>6.2f}")
@@ -50,5 +42,4 @@ try:
 except KeyboardInterrupt:
     print("Stopped by user.")
 finally:
-    cb.cancel()
-    pi.stop()
+    samples.close()
@@ -0,0 +1,358 @@
+import asyncio
+import fcntl
+import functools
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+
+from metrics import EVENTS
+
+# "Tell me when the machine is free": residents register a webhook URL or an
+# ntfy topic, and when a wash cycle ends the log watcher hands the event to
+# a Notifier. Delivery runs on an asyncio loop in its own thread, so a slow or
+# dead endpoint never holds up the watcher or any request:
+#
+# - events arriving within BATCH_SECONDS of each other go out together, one
+#   request per endpoint
+# - each endpoint gets at most one request per MIN_INTERVAL_SECONDS; events
+#   for it in the meantime are merged into its next request
+# - failed requests are retried with exponential backoff (honouring
+#   Retry-After), up to MAX_ATTEMPTS
+#
+# Subscriptions live in a JSON file so every gunicorn worker sees them. Each
+# worker tails the log and sees the same cycle end, so only the worker that
+# holds the sender lock delivers.
+#
+# Anyone who can reach the page can subscribe, so webhooks may only point at
+# public addresses (checked when subscribing and again, after resolving, on
+# every delivery so DNS can't be switched to a LAN address later), each client
+# and device has a cap, and subscriptions expire.
+
+NTFY_SERVER = 'https://ntfy.sh'
+
+BATCH_SECONDS = 5
+MIN_INTERVAL_SECONDS = 60
+MAX_ATTEMPTS = 5
+BACKOFF_SECONDS = 5
+MAX_BACKOFF_SECONDS = 300
+REQUEST_TIMEOUT_SECONDS = 10
+
+# Undelivered events kept per endpoint while it is rate limited or down
+MAX_PENDING_PER_ENDPOINT = 50
+
+# Caps per client address and per device, and how long a subscription lasts
+MAX_SUBSCRIPTIONS_PER_CLIENT = 3
+MAX_SUBSCRIPTIONS_PER_DEVICE = 50
+SUBSCRIPTION_DAYS = 30
+
+SUBSCRIPTION_KINDS = ['webhook', 'ntfy']
+
+def is_public_address(address):
+    """False for loopback, private (RFC 1918), link-local, CGNAT, multicast and other non-global addresses"""
+    try:
+        ip = ipaddress.ip_address(address.split('%')[0])
+    except ValueError:
+        return False
+    return ip.is_global and not ip.is_multicast
+
+def public_addresses(addresses, allow_private=False):
+    """The usable addresses of a resolved host; ValueError if none are public"""
+    usable = [address for address in addresses if allow_private or is_public_address(address)]
+    if not usable:
+        raise ValueError("Notifications can only go to public addresses")
+    return usable
+
+def subscription_url(kind, target, allow_private=False):
+    """Where to POST for a subscription; ValueError if the target is unusable"""
+    target = (target or '').strip()
+    if kind == 'ntfy' and target and '/' not in target:
+        # A bare topic name on the public server
+        target = f"{NTFY_SERVER}/{target}"
+    parts = urllib.parse.urlsplit(target)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError(f"Expected an http(s) URL{' or a topic name' if kind == 'ntfy' else ''}, got {target!r}")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        resolved = socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Can't resolve {parts.hostname}: {e}")
+    public_addresses([info[4][0] for info in resolved], allow_private)
+    return target
+
+class SubscriptionStore:
+    """Subscriptions in a JSON file, reloaded when another process changes it"""
+
+    def __init__(self, path=None, allow_private=False):
+        self.path = path
+        # Only for testing against a local stand-in
+        self.allow_private = allow_private
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._mtime = None
+        self._reload()
+
+    def _reload(self):
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self._subscriptions = {sub['id']: sub for sub in json.load(f)}
+            self._mtime = mtime
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading subscriptions: {e}")
+
+    def _edit(self, change):
+        """Apply change(subscriptions) under the file lock, starting from what is on disk"""
+        with self._lock:
+            lock_file = open(self.path + '.lock', 'a') if self.path else None
+            try:
+                if lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._reload()
+                self._prune()
+                result = change(self._subscriptions)
+                if self.path:
+                    temp_path = self.path + '.tmp'
+                    with open(temp_path, 'w') as f:
+                        json.dump(list(self._subscriptions.values()), f, indent=1)
+                    os.replace(temp_path, self.path)
+                    self._mtime = os.path.getmtime(self.path)
+                return result
+            finally:
+                if lock_file:
+                    lock_file.close()
+
+    def _prune(self):
+        now = time.time()
+        for subscription_id in [sub['id'] for sub in self._subscriptions.values() if sub.get('expires', now) < now]:
+            del self._subscriptions[subscription_id]
+
+    def add(self, device, kind, target, client=None):
+        """Register and return a new subscription; ValueError if it can't be added"""
+        if kind not in SUBSCRIPTION_KINDS:
+            raise ValueError(f"kind must be one of {SUBSCRIPTION_KINDS}")
+        subscription = {
+            'id': secrets.token_urlsafe(12),
+            'device': device,
+            'kind': kind,
+            'url': subscription_url(kind, target, self.allow_private),
+            'client': client,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'expires': int(time.time()) + SUBSCRIPTION_DAYS * 86400,
+        }
+
+        def change(subscriptions):
+            if client is not None and sum(sub.get('client') == client for sub in subscriptions.values()) \
+                    >= MAX_SUBSCRIPTIONS_PER_CLIENT:
+                raise ValueError(f"At most {MAX_SUBSCRIPTIONS_PER_CLIENT} subscriptions per client")
+            if sum(sub['device'] == device for sub in subscriptions.values()) >= MAX_SUBSCRIPTIONS_PER_DEVICE:
+                raise ValueError(f"This machine already has {MAX_SUBSCRIPTIONS_PER_DEVICE} subscriptions")
+            subscriptions[subscription['id']] = subscription
+            return subscription
+        return self._edit(change)
+
+    def remove(self, subscription_id):
+        """True if the subscription existed"""
+        return self._edit(lambda subscriptions: subscriptions.pop(subscription_id, None) is not None)
+
+    def get(self, subscription_id):
+        with self._lock:
+            self._reload()
+            subscription = self._subscriptions.get(subscription_id)
+        if subscription is None or subscription.get('expires', time.time()) < time.time():
+            return None
+        return subscription
+
+    def for_device(self, device):
+        """Unexpired subscriptions to a device"""
+        now = time.time()
+        with self._lock:
+            self._reload()
+            return [sub for sub in self._subscriptions.values()
+                    if sub['device'] == device and sub.get('expires', now) >= now]
+
+async def http_post(url, body, headers, timeout=REQUEST_TIMEOUT_SECONDS, allow_private=False):
+    """POST without blocking the loop; returns (status, Retry-After seconds or None).
+
+    Connects to the address it checked, so a hostname that now resolves to a
+    LAN or loopback address is refused (ValueError) rather than followed.
+    """
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    resolved = await asyncio.wait_for(
+        asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM), timeout)
+    address = public_addresses([info[4][0] for info in resolved], allow_private)[0]
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(address, port, ssl=ssl.create_default_context() if secure else None,
+                                server_hostname=parts.hostname if secure else None), timeout)
+    try:
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        host = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+        lines = [f"POST {path} HTTP/1.1", f"Host: {host}", f"Content-Length: {len(body)}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        status = int(status_line.split()[1])
+        retry_after = None
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'retry-after' and value.strip().isdigit():
+                retry_after = int(value.strip())
+        return status, retry_after
+    finally:
+        writer.close()
+
+def build_request(kind, events):
+    """(body, headers) of one notification carrying every event in the batch"""
+    if kind == 'ntfy':
+        names = sorted({event['name'] for event in events})
+        body = '\n'.join(event['message'] for event in events)
+        return body.encode('utf-8'), {'Title': f"{' and '.join(names)} available", 'Tags': 'white_check_mark',
+                                      'Content-Type': 'text/plain; charset=utf-8'}
+    body = json.dumps({'event': 'available', 'notifications': events}, separators=(',', ':'))
+    return body.encode('utf-8'), {'Content-Type': 'application/json'}
+
+class Endpoint:
+    """Delivery state of one subscription URL"""
+
+    def __init__(self, kind, url):
+        self.kind = kind
+        self.url = url
+        self.pending = []
+        self.next_allowed = 0.0
+        self.task = None
+
+class Notifier:
+    """Fans availability events out to subscribers from a background asyncio loop"""
+
+    def __init__(self, store, batch_seconds=BATCH_SECONDS, min_interval=MIN_INTERVAL_SECONDS,
+                 max_attempts=MAX_ATTEMPTS, backoff_seconds=BACKOFF_SECONDS, post=None):
+        self.store = store
+        self.batch_seconds = batch_seconds
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.post = post or functools.partial(http_post, allow_private=store.allow_private)
+        self._loop = None
+        self._queue = None
+        self._endpoints = {}
+        self._sender_lock = None
+        self._started = threading.Event()
+
+    def start(self):
+        """Run the delivery loop in a daemon thread"""
+        threading.Thread(target=self._run_loop, daemon=True).start()
+        self._started.wait()
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.call_soon(self._started.set)
+        self._loop.run_until_complete(self._collect())
+
+    def notify(self, device, name, message, **details):
+        """Queue an availability event (thread-safe, never blocks); dropped if the loop isn't running"""
+        if self._loop is None:
+            return
+        event = {'device': device, 'name': name, 'message': message, 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+        event.update(details)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    def _is_sender(self):
+        """Take the sender lock if nobody holds it; True while this process has it"""
+        if not self.store.path:
+            return True
+        if self._sender_lock is None:
+            try:
+                lock_file = open(self.store.path + '.sender', 'a')
+            except OSError as e:
+                print(f"Can't open notification sender lock: {e}")
+                return False
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._sender_lock = lock_file
+        return True
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Gather whatever else arrives in the batch window
+            deadline = self._loop.time() + self.batch_seconds
+            while (remaining := deadline - self._loop.time()) > 0:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            if not self._is_sender():
+                continue
+            for event in batch:
+                for subscription in self.store.for_device(event['device']):
+                    self._enqueue(subscription, event)
+
+    def _enqueue(self, subscription, event):
+        key = (subscription['kind'], subscription['url'])
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            endpoint = self._endpoints[key] = Endpoint(*key)
+        endpoint.pending.append(event)
+        if len(endpoint.pending) > MAX_PENDING_PER_ENDPOINT:
+            del endpoint.pending[0]
+            EVENTS.inc(process='notifications', stage='notify', outcome='dropped')
+        if endpoint.task is None:
+            endpoint.task = self._loop.create_task(self._deliver(endpoint))
+
+    async def _deliver(self, endpoint):
+        try:
+            while endpoint.pending:
+                # Rate limit: events arriving while we wait go out in the same request
+                wait = endpoint.next_allowed - self._loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                events, endpoint.pending = endpoint.pending, []
+                await self._send(endpoint, events)
+        finally:
+            endpoint.task = None
+
+    async def _send(self, endpoint, events):
+        body, headers = build_request(endpoint.kind, events)
+        for attempt in range(self.max_attempts):
+            delay = min(self.backoff_seconds * 2 ** attempt, MAX_BACKOFF_SECONDS)
+            try:
+                status, retry_after = await self.post(endpoint.url, body, headers)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError) as e:
+                status, retry_after = None, None
+                print(f"Error notifying {endpoint.url}: {e}")
+            endpoint.next_allowed = self._loop.time() + self.min_interval
+            if status is not None and 200 <= status < 300:
+                EVENTS.inc(len(events), process='notifications', stage='notify', outcome='sent')
+                return
+            if status is not None and 400 <= status < 500 and status not in (408, 429):
+                # The endpoint rejects this request; retrying won't change that
+                print(f"Notification to {endpoint.url} rejected with HTTP {status}")
+                break
+            if attempt + 1 < self.max_attempts:
+                # A retry is still a request to the endpoint, so it waits out the rate limit too
+                await asyncio.sleep(max(delay, retry_after or 0, endpoint.next_allowed - self._loop.time()))
+        EVENTS.inc(len(events), process='notifications', stage='notify', outcome='failed')
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 
 import sys
+import os
+import json
+import time
 import numpy as np
 from scipy import io
 from scipy.fft import fft
 import argparse
+from laundry_config import AMPLITUDE_THRESHOLD, IDLE_ENERGY, RUNNING_ENERGY, NEAR_THRESHOLD_FRACTION
+from metrics import STAGE_SECONDS, EVENTS, restore_state, save_state
+from spectrum_archive import SpectrumArchive, DEFAULT_CAPACITY
 
 frequencies = {
     'Energy60Hz': 60,
@@ -14,8 +20,23 @@ frequencies = {
 #    'Energy540Hz': 540
 }  
 
+# Adaptive capture schedule (see next_capture). Seconds between recordings
+# while the 60Hz energy is near the threshold or moving, and the longest
+# back-off while it is stably idle or stably running.
+MIN_INTERVAL = 2.0
+MAX_INTERVAL = 60.0
+# Publish a reading at least this often even when nothing changes, so the
+# receiver never marks the machine stale (it does so after 2 minutes)
+HEARTBEAT_INTERVAL = 60.0
+# Weight of each new reading in the measured idle/running levels
+LEVEL_SMOOTHING = 0.1
+# A change larger than this since the previous recording counts as "moving"
+CHANGE_THRESHOLD = 0.25
+# Interval multiplier for each stable recording
+BACKOFF_FACTOR = 2.0
+
 def compute_energy(audio_file, frequencies):
-    """Compute energy at specified frequencies from audio file."""
+    """Compute energy at specified frequencies from audio file, plus the FFT frequencies and values."""
     try:
         samplerate, data = io.wavfile.read(audio_file)                                  # Read the audio file  
         if len(data.shape) > 1:                                                         # Convert stereo to mono if necessary
@@ -35,11 +56,22 @@ def compute_energy(audio_file, frequencies):
                 energy[label] = np.log10(energy[label] + 1)  # Add 1 to avoid log(0)    # Normalize to a more manageable range
             else:
                 energy[label] = 0.0
-        return energy, xf
+        return energy, xf, yf[:N//2]
     
     except Exception as e:
         print(f"Error in compute_energy: {str(e)}", file=sys.stderr)
-        return None, None
+        return None, None, None
+
+def archive_spectrum(archive_file, capacity, xf, yf):
+    """Append this capture's 0-1 kHz spectrum to the ring archive, on the same log scale as the energies"""
+    try:
+        archive = SpectrumArchive(archive_file, capacity)
+        try:
+            archive.append(time.time(), xf, np.log10(np.abs(yf) ** 2 + 1))
+        finally:
+            archive.close()
+    except Exception as e:
+        print(f"Error archiving spectrum: {str(e)}", file=sys.stderr)
 
 def update_log_file(log_file, energy):
     """Update log file with the frequency values, in the required format."""
@@ -56,6 +88,70 @@ def update_log_file(log_file, energy):
     except Exception as e:
         print(f"Error updating log file: {str(e)}", file=sys.stderr)
 
+def load_schedule_state(state_file):
+    """Previous schedule state, or an empty state if there is none yet"""
+    try:
+        with open(state_file, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_schedule_state(state_file, state):
+    """Replace the state file atomically so a killed run can't leave half a file"""
+    temp_file = state_file + ".tmp"
+    with open(temp_file, "w") as file:
+        json.dump(state, file)
+    os.replace(temp_file, state_file)
+
+def next_capture(state, energy, now, threshold=AMPLITUDE_THRESHOLD, min_interval=MIN_INTERVAL,
+                 max_interval=MAX_INTERVAL, heartbeat=HEARTBEAT_INTERVAL):
+    """Decide when to record next and whether to publish this reading.
+
+    Returns (interval, publish, new_state). The interval drops to min_interval
+    while the energy is near the threshold, has crossed it, or is changing,
+    and doubles per stable recording up to max_interval. Only those
+    interesting readings are published, plus one every heartbeat seconds.
+
+    "Near" is a fraction of the gap between the threshold and the measured
+    idle (or running) level, so normal idle noise just under the threshold
+    doesn't keep the capture loop at full speed.
+    """
+    last_energy = state.get('energy')
+    last_publish = state.get('last_publish', 0.0)
+    interval = state.get('interval', min_interval)
+    idle_level = state.get('idle_level', IDLE_ENERGY)
+    running_level = state.get('running_level', RUNNING_ENERGY)
+
+    crossed = last_energy is not None and (last_energy > threshold) != (energy > threshold)
+    if energy > threshold:
+        near = energy - threshold < NEAR_THRESHOLD_FRACTION * max(running_level - threshold, 0.0)
+        running_level += LEVEL_SMOOTHING * (energy - running_level)
+    else:
+        near = threshold - energy < NEAR_THRESHOLD_FRACTION * max(threshold - idle_level, 0.0)
+        idle_level += LEVEL_SMOOTHING * (energy - idle_level)
+    moving = last_energy is None or abs(energy - last_energy) > CHANGE_THRESHOLD
+    active = crossed or near or moving
+
+    if active:
+        interval = min_interval
+    else:
+        interval = min(max_interval, interval * BACKOFF_FACTOR)
+
+    publish = active or now - last_publish >= heartbeat
+    if publish:
+        last_publish = now
+
+    # Never sleep past the next heartbeat (the back-off itself carries on from `interval`)
+    sleep = max(min_interval, min(interval, last_publish + heartbeat - now))
+
+    return sleep, publish, {'energy': energy, 'interval': interval, 'last_publish': last_publish,
+                            'idle_level': idle_level, 'running_level': running_level}
+
+def write_schedule(schedule_file, interval, publish):
+    """One line "<seconds> <0|1>" for record_process_send.sh to `read`"""
+    with open(schedule_file, "w") as file:
+        file.write(f"{interval:.1f} {int(publish)}\n")
+
 def main():
     """Main function to process audio and log results."""
     
@@ -63,18 +159,57 @@ def main():
     parser = argparse.ArgumentParser(description="Process an audio file and update the log file with energy values.")
     parser.add_argument('audio_file', type=str, help="Input WAV audio file (e.g., now.wav)")
     parser.add_argument('log_file', type=str, help="Output log file (e.g., now.log)")
+    parser.add_argument('--schedule-file', type=str, default=None,
+                        help="Write '<next interval seconds> <publish 0|1>' here for the capture loop")
+    parser.add_argument('--state-file', type=str, default='schedule_state.json', help="Adaptive schedule state between runs")
+    parser.add_argument('--min-interval', type=float, default=MIN_INTERVAL, help="Shortest seconds between recordings")
+    parser.add_argument('--max-interval', type=float, default=MAX_INTERVAL, help="Longest seconds between recordings")
+    parser.add_argument('--heartbeat', type=float, default=HEARTBEAT_INTERVAL, help="Publish at least this often (seconds)")
+    parser.add_argument('--threshold', type=float, default=AMPLITUDE_THRESHOLD, help="60Hz energy threshold to watch")
+    parser.add_argument('--record-started', type=float, default=None, help="Epoch seconds arecord started (for metrics)")
+    parser.add_argument('--record-finished', type=float, default=None, help="Epoch seconds arecord finished (for metrics)")
+    parser.add_argument('--spectrum-archive', type=str, default=None, help="Also keep each capture's spectrum in this ring file")
+    parser.add_argument('--spectrum-capacity', type=int, default=DEFAULT_CAPACITY, help="Captures the archive holds before overwriting")
     
     # Parse arguments
     args = parser.parse_args()
     
+    # This process lives for one recording, so its metrics carry on from the last run
+    restore_state('process_audio')
+    if args.record_started and args.record_finished:
+        STAGE_SECONDS.observe(args.record_finished - args.record_started, process='transmitter', stage='arecord')
+        # Interpreter start plus numpy/scipy imports
+        STAGE_SECONDS.observe(time.time() - args.record_finished, process='transmitter', stage='python_startup')
+    
     try:
         # Compute energy values using the frequencies dictionary
-        energy, xf = compute_energy(args.audio_file, frequencies)
+        with STAGE_SECONDS.time(process='transmitter', stage='compute_energy'):
+            energy, xf, yf = compute_energy(args.audio_file, frequencies)
         if energy is None:
+            EVENTS.inc(process='transmitter', stage='compute_energy', outcome='error')
+            save_state('process_audio')
             sys.exit(1)
+        EVENTS.inc(process='transmitter', stage='compute_energy', outcome='ok')
+        
+        if args.spectrum_archive:
+            with STAGE_SECONDS.time(process='transmitter', stage='spectrum_archive'):
+                archive_spectrum(args.spectrum_archive, args.spectrum_capacity, xf, yf)
         
         # Update log file with frequency values
-        update_log_file(args.log_file, energy)
+        with STAGE_SECONDS.time(process='transmitter', stage='write_now_log'):
+            update_log_file(args.log_file, energy)
+        
+        if args.schedule_file:
+            state = load_schedule_state(args.state_file)
+            interval, publish, state = next_capture(state, energy['Energy60Hz'], time.time(), args.threshold,
+                                                    args.min_interval, args.max_interval, args.heartbeat)
+            save_schedule_state(args.state_file, state)
+            write_schedule(args.schedule_file, interval, publish)
+            print(f"Next recording in {interval:.1f}s, {'publishing' if publish else 'not publishing'} this reading")
+            EVENTS.inc(process='transmitter', stage='schedule', outcome='publish' if publish else 'skip')
+            STAGE_SECONDS.observe(interval, process='transmitter', stage='capture_interval')
+        
+        save_state('process_audio')
         
     except Exception as e:
         print(f"Error in main: {str(e)}", file=sys.stderr)
@@ -6,6 +6,9 @@ import traceback
 import os
 import pigpio
 from nrf24 import *
+from metrics import STAGE_SECONDS, EVENTS, save_state
+from laundry_config import AMPLITUDE_FREQUENCY, AMPLITUDE_THRESHOLD, RATIO_FREQUENCY, RATIO_THRESHOLD
+from laundry_config import DEVICES, check_devices, device_file, device_threshold
 
 def print_with_header(message):
     header = f"[AUDIO_RECEIVE_SCRIPT at {time.strftime('%Y-%m-%d %H:%M:%S')}]"
@@ -16,13 +19,65 @@ def update_log_file(log_file, frequency_data):
     try:
         # Overwrite the log file with the latest frequency data
         with open(log_file, 'w') as file:
-            for freq_num, freq_value in sorted(frequency_data.items()):
-                file.write(f"energy at {freq_num}Hz: {freq_value:.4f}\n")
+            for line in format_frequency_lines(frequency_data):
+                file.write(line + "\n")
         
         print_with_header(f"Updated {log_file} with {len(frequency_data)} frequency entries")
     except Exception as e:
         print_with_header(f"Error updating {log_file}: {e}")
 
+def format_frequency_lines(frequency_data):
+    """now.log lines, also used for the FREQUENCY VALUES section of history.log"""
+    return [f"energy at {freq_num}Hz: {freq_value:.4f}" for freq_num, freq_value in sorted(frequency_data.items())]
+
+def evaluate_amplitude_algorithm(frequency_data, threshold=AMPLITUDE_THRESHOLD):
+    """AMPLITUDE_ALGORITHM line for history.log"""
+    if AMPLITUDE_FREQUENCY not in frequency_data:
+        return f"AMPLITUDE_ALGORITHM=NULL ({AMPLITUDE_FREQUENCY}Hz energy not available)"
+    
+    # Compare the value as written to the log, so readers of the log agree with the result
+    energy = round(frequency_data[AMPLITUDE_FREQUENCY], 4)
+    if energy > threshold:
+        return f"AMPLITUDE_ALGORITHM=ON ({AMPLITUDE_FREQUENCY}Hz energy: {energy:.4f} > {threshold})"
+    return f"AMPLITUDE_ALGORITHM=OFF ({AMPLITUDE_FREQUENCY}Hz energy: {energy:.4f} <= {threshold})"
+
+def evaluate_ratio_algorithm(frequency_data):
+    """RATIO_ALGORITHM line for history.log"""
+    if AMPLITUDE_FREQUENCY not in frequency_data or RATIO_FREQUENCY not in frequency_data:
+        return "RATIO_ALGORITHM=NULL (Required energies not available)"
+    
+    base = round(frequency_data[AMPLITUDE_FREQUENCY], 4)
+    if base == 0:
+        return f"RATIO_ALGORITHM=NULL ({AMPLITUDE_FREQUENCY}Hz energy is zero)"
+    
+    ratio = round(frequency_data[RATIO_FREQUENCY], 4) / base
+    label = f"{RATIO_FREQUENCY}Hz/{AMPLITUDE_FREQUENCY}Hz ratio"
+    if ratio > RATIO_THRESHOLD:
+        return f"RATIO_ALGORITHM=ON ({label}: {ratio:.6f} > {RATIO_THRESHOLD:.2f})"
+    return f"RATIO_ALGORITHM=OFF ({label}: {ratio:.6f} <= {RATIO_THRESHOLD:.2f})"
+
+def format_history_record(timestamp, frequency_data, threshold=AMPLITUDE_THRESHOLD):
+    """One blank-line terminated history.log paragraph, as run_laundry_monitor_alg.sh used to write"""
+    lines = [timestamp, "FREQUENCY VALUES:"]
+    lines += format_frequency_lines(frequency_data)
+    lines += [
+        "ALGORITHM EVALUATIONS:",
+        evaluate_amplitude_algorithm(frequency_data, threshold),
+        evaluate_ratio_algorithm(frequency_data),
+        "",
+    ]
+    return "\n".join(lines) + "\n"
+
+def append_history_record(history_log, frequency_data, threshold=AMPLITUDE_THRESHOLD):
+    """Append one reading to history.log in a single write, so readers never see half a paragraph"""
+    try:
+        record = format_history_record(time.strftime('%Y-%m-%d %H:%M:%S'), frequency_data, threshold)
+        with open(history_log, 'a') as file:
+            file.write(record)
+        print_with_header(f"Appended reading to {history_log}")
+    except Exception as e:
+        print_with_header(f"Error appending to {history_log}: {e}")
+
 def decode_payload(payload):
     """
     Decode the payload received from the sender script
@@ -71,6 +126,10 @@ if __name__ == "__main__":
     parser.add_argument('--channel', type=int, default=90, help="RF Channel (default: 90).")
     parser.add_argument('--power', type=str, choices=['LOW', 'MEDIUM', 'HIGH'], default='HIGH', help="Power level (default: HIGH).")
     parser.add_argument('--logfile', type=str, default='now.log', help="Log file to update (default: now.log).")
+    parser.add_argument('--history-log', type=str, default=None,
+                        help="Pipeline mode: also evaluate the algorithms and append each reading to this history log.")
+    parser.add_argument('--devices', action='store_true',
+                        help="Listen for every transmitter in laundry_config.DEVICES, one pipe each, with per-device now/history logs (implies pipeline mode).")
     
     args = parser.parse_args()
     hostname = args.hostname
@@ -79,11 +138,29 @@ if __name__ == "__main__":
     channel = args.channel
     power_level = args.power
     log_file = args.logfile
+    history_log = args.history_log
     
-    # Verify that address is between 3 and 5 characters.
-    if not (2 < len(address) < 6):
-        print_with_header(f'Invalid address {address}. Addresses must be between 3 and 5 ASCII characters.')
-        sys.exit(1)
+    # One listener per reading pipe, in pipe order
+    if args.devices:
+        problems = check_devices(DEVICES)
+        if problems:
+            for problem in problems:
+                print_with_header(f"Invalid DEVICES in laundry_config.py: {problem}")
+            sys.exit(1)
+        listeners = [{
+            'id': device['id'],
+            'address': device['address'],
+            'log_file': device_file(device, 'now_log'),
+            'history_log': device_file(device, 'history_log'),
+            'threshold': device_threshold(device),
+        } for device in DEVICES]
+    else:
+        # Verify that address is between 3 and 5 characters.
+        if not (2 < len(address) < 6):
+            print_with_header(f'Invalid address {address}. Addresses must be between 3 and 5 ASCII characters.')
+            sys.exit(1)
+        listeners = [{'id': address, 'address': address, 'log_file': log_file,
+                      'history_log': history_log, 'threshold': AMPLITUDE_THRESHOLD}]
     
     # Convert power level string to appropriate enum value
     if power_level == 'LOW':
@@ -103,17 +180,19 @@ if __name__ == "__main__":
     # Create NRF24 object with dynamic payload size, using the passed channel and power level
     nrf = NRF24(pi, ce=25, payload_size=RF24_PAYLOAD.DYNAMIC, channel=channel, 
                 data_rate=RF24_DATA_RATE.RATE_250KBPS, pa_level=power)
-    nrf.set_address_bytes(len(address))
+    nrf.set_address_bytes(len(listeners[0]['address']))
     
-    # Listen on the address specified as parameter
-    nrf.open_reading_pipe(RF24_RX_ADDR.P0, address)
+    # Listen on each address, P0 first; data_pipe() reports the pipe number 0-5
+    for pipe_number, listener in enumerate(listeners):
+        nrf.open_reading_pipe(RF24_RX_ADDR.P0 + pipe_number, listener['address'])
     
     # Display the content of NRF24L01 device registers.
     nrf.show_registers()
     
     # Enter a loop receiving data on the address specified.
     try:
-        print_with_header(f'Receiving from {address} on channel {channel} with power {power_level}')
+        addresses = ', '.join(listener['address'] for listener in listeners)
+        print_with_header(f'Receiving from {addresses} on channel {channel} with power {power_level}')
         count = 0
         while True:
             # As long as data is ready for processing, process it.
@@ -132,14 +211,34 @@ if __name__ == "__main__":
                 # Show message received as hex.
                 print_with_header(f"Received: pipe: {pipe}, len: {len(payload)}, bytes: {' '.join(f'{x:02x}' for x in payload)}, count: {count}")
                 
+                # Route the reading to the transmitter that owns this pipe
+                listener = listeners[pipe] if pipe < len(listeners) else None
+                if listener is None:
+                    print_with_header(f"No device configured for pipe {pipe}, skipping")
+                    EVENTS.inc(process='receiver', stage='receive', outcome='unknown_pipe')
+                    continue
+                
                 # Decode the payload
-                frequency_data = decode_payload(payload)
+                with STAGE_SECONDS.time(process='receiver', stage='decode'):
+                    frequency_data = decode_payload(payload)
                 
                 if frequency_data:
                     # Update now.log with received frequency values
-                    update_log_file(log_file, frequency_data)
+                    with STAGE_SECONDS.time(process='receiver', stage='write_now_log'):
+                        update_log_file(listener['log_file'], frequency_data)
+                    
+                    # Record every reading as it arrives instead of polling now.log's mtime
+                    if listener['history_log']:
+                        with STAGE_SECONDS.time(process='receiver', stage='append_history'):
+                            append_history_record(listener['history_log'], frequency_data, listener['threshold'])
+                    EVENTS.inc(process='receiver', stage='receive', outcome='ok', device=listener['id'])
                 else:
                     print_with_header("Failed to decode payload, skipping log update")
+                    EVENTS.inc(process='receiver', stage='receive', outcome='decode_error', device=listener['id'])
+                
+                # Radio read to history.log, including the debug printing
+                STAGE_SECONDS.observe(time.time() - now, process='receiver', stage='payload_total')
+                save_state('receive_audio_analysis')
                 
             # Sleep 100 ms.
             time.sleep(0.1)
@@ -148,4 +247,3 @@ if __name__ == "__main__":
         nrf.power_down()
         pi.stop()
 
-garges@raspberrypi:~/LaundryMonitor $ 
@@ -7,12 +7,21 @@ ARCHIVE_LOG="laundry_monitor.log"
 AUDIO_RECORD_SCRIPT="record_audio.sh"
 AUDIO_PROCESS_SCRIPT="process_audio.py"
 AUDIO_SEND_SCRIPT="send_audio_analysis.py"
+# Must match this machine's entry in DEVICES (laundry_config.py) on the receiver
 ADDRESS="1SNSR"
 CHANNEL=96           
 POWER="HIGH"         
 NRF_ENV="$HOME/nrf/bin/activate"
 AUDIO_GAIN=5
 RECORD_LENGTH=1
+# Adaptive schedule: process_audio.py writes "<sleep seconds> <publish 0|1>" here
+SCHEDULE_FILE="schedule.txt"
+SCHEDULE_STATE="schedule_state.json"
+MIN_INTERVAL=2
+MAX_INTERVAL=60
+HEARTBEAT=60
+# Set to a file name to keep every capture's 0-1 kHz spectrum (ring of ~50 MB, see spectrum_archive.py)
+SPECTRUM_ARCHIVE=""
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
 ##############################################################
@@ -34,7 +43,7 @@ source "${NRF_ENV}"
 trap cleanup EXIT
 
 log_with_timestamp "Starting ${AUDIO_SEND_SCRIPT} in the background with channel ${CHANNEL} and power ${POWER}..."
-nohup python3 "${AUDIO_SEND_SCRIPT}" --channel "${CHANNEL}" --power "${POWER}" --logfile ${NOW_LOG} >> "${ARCHIVE_LOG}" 2>&1 & 
+nohup python3 "${AUDIO_SEND_SCRIPT}" --channel "${CHANNEL}" --power "${POWER}" --address "${ADDRESS}" --logfile ${NOW_LOG} >> "${ARCHIVE_LOG}" 2>&1 & 
 AUDIO_SEND_PID=$!
 
 while true; do
@@ -43,13 +52,33 @@ while true; do
     log_with_timestamp "----------------------------------------------------------"
     
     log_with_timestamp "Recording audio..."
+    # EPOCHREALTIME (bash 5) timestamps the stage without forking date
+    RECORD_STARTED="${EPOCHREALTIME}"
     "${SCRIPT_DIR}/${AUDIO_RECORD_SCRIPT}" "${AUDIO_GAIN}" "${RECORD_LENGTH}" "${AUDIO_FILE}">> "${ARCHIVE_LOG}" 2>&1
+    RECORD_FINISHED="${EPOCHREALTIME}"
 
     log_with_timestamp "Processing audio..."
-    python3 "${SCRIPT_DIR}/${AUDIO_PROCESS_SCRIPT}" "${AUDIO_FILE}" "${NOW_BUFFER_LOG}" >> "${ARCHIVE_LOG}" 2>&1
+    rm -f "${SCHEDULE_FILE}"
+    python3 "${SCRIPT_DIR}/${AUDIO_PROCESS_SCRIPT}" "${AUDIO_FILE}" "${NOW_BUFFER_LOG}" \
+        --schedule-file "${SCHEDULE_FILE}" --state-file "${SCHEDULE_STATE}" \
+        --min-interval "${MIN_INTERVAL}" --max-interval "${MAX_INTERVAL}" --heartbeat "${HEARTBEAT}" \
+        ${SPECTRUM_ARCHIVE:+--spectrum-archive "${SPECTRUM_ARCHIVE}"} \
+        ${RECORD_STARTED:+--record-started "${RECORD_STARTED}" --record-finished "${RECORD_FINISHED}"} >> "${ARCHIVE_LOG}" 2>&1
     
-    log_with_timestamp "Writing to from ${NOW_BUFFER_LOG} to ${NOW_LOG}"
-    cat "${NOW_BUFFER_LOG}" > "${NOW_LOG}"
+    # Fall back to the old fixed cadence if processing failed
+    SLEEP_SECONDS=10
+    PUBLISH=1
+    if [ -f "${SCHEDULE_FILE}" ]; then
+        read -r SLEEP_SECONDS PUBLISH < "${SCHEDULE_FILE}"
+    fi
+    
+    if [ "${PUBLISH}" = "1" ]; then
+        log_with_timestamp "Writing to from ${NOW_BUFFER_LOG} to ${NOW_LOG}"
+        cat "${NOW_BUFFER_LOG}" > "${NOW_LOG}"
+    else
+        log_with_timestamp "Reading is stable, not sending it"
+    fi
 
-    sleep 10
+    log_with_timestamp "Next recording in ${SLEEP_SECONDS}s"
+    sleep "${SLEEP_SECONDS}"
 done
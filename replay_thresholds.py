@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Replay history.log against a grid of detection settings to tune the thresholds offline"""
+
+import argparse
+import csv
+import itertools
+import re
+import sys
+import time
+
+import numpy as np
+
+from downsample import timestamps_to_seconds
+from laundry_config import AMPLITUDE_FREQUENCY, AMPLITUDE_THRESHOLD, RATIO_FREQUENCY, RATIO_THRESHOLD
+from laundry_sessions import END_DEBOUNCE_SECONDS, MIN_SESSION_SECONDS, START_DEBOUNCE_SECONDS
+
+# Each setting is evaluated the way laundry_sessions.SessionTracker runs live:
+# the raw state comes from the energy (with an optional hysteresis band below
+# the threshold), and a change only counts once the new raw state has held for
+# the start/end debounce. Debounced changes are dated back to when the raw
+# state first changed, as the tracker dates its cycles.
+#
+# The dense work (one pass over every reading) happens once per threshold and
+# hysteresis pair. The debounce settings only look at the runs of identical raw
+# state, which number in the thousands rather than the millions, so each extra
+# debounce setting costs next to nothing.
+
+HISTORY_LOG = '/home/garges/LaundryMonitor/history.log'
+
+# Recommendations must find about as many cycles, and about as much IN USE
+# time, as the current settings: within this factor either way. A threshold
+# that barely ever triggers has few flips, but only because it detects nothing.
+SANE_BAND = 2.0
+
+# Both patterns start with a literal so the regex engine can skip ahead with a
+# substring search; a ^ anchor in MULTILINE mode tries every byte and is ~15x slower
+TIMESTAMP_PATTERN = re.compile(rb'\n(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\n')
+
+def energy_pattern(frequency):
+    return re.compile(rb'\nenergy at ' + str(frequency).encode() + rb'Hz: ([-\d.]+)')
+
+def load_history(path):
+    """history.log as (epoch seconds, amplitude energy, ratio energy) float arrays, NaN where missing.
+
+    Runs one regex per field over the whole file and assigns each match to its
+    paragraph by position, instead of splitting and parsing paragraph by paragraph.
+    """
+    with open(path, 'rb') as f:
+        # Leading newline so the first line matches like every other
+        data = b'\n' + f.read()
+
+    positions = []
+    stamps = []
+    for match in TIMESTAMP_PATTERN.finditer(data):
+        positions.append(match.start())
+        stamps.append(match.group(1).decode())
+    positions = np.array(positions, dtype=np.int64)
+    times = timestamps_to_seconds(stamps)
+
+    def field(frequency):
+        values = np.full(len(positions), np.nan)
+        starts = []
+        texts = []
+        for match in energy_pattern(frequency).finditer(data):
+            starts.append(match.start())
+            texts.append(match.group(1))
+        if starts:
+            owner = np.searchsorted(positions, np.array(starts, dtype=np.int64), side='right') - 1
+            # Bytes to float in one conversion
+            parsed = np.array(texts).astype(np.float64)
+            # Lines before the first timestamp belong to no reading
+            values[owner[owner >= 0]] = parsed[owner >= 0]
+        return values
+
+    amplitude = field(AMPLITUDE_FREQUENCY)
+    harmonic = field(RATIO_FREQUENCY)
+
+    # The receiver appends in order, but a hand-merged log may not be
+    order = np.argsort(times, kind='stable')
+    return times[order], amplitude[order], harmonic[order]
+
+def hysteresis_states(values, on_above, off_at_or_below):
+    """Raw state per reading: ON above on_above, OFF at or below off_at_or_below, unchanged in between.
+
+    Readings inside the band (and missing readings) carry the last decided
+    state forward; the state starts OFF.
+    """
+    on = values > on_above
+    decided = on | (values <= off_at_or_below)
+    if decided.all():
+        # No band and nothing missing: every reading decides for itself
+        return on
+    last_decided = np.where(decided, np.arange(len(values), dtype=np.int32), -1)
+    np.maximum.accumulate(last_decided, out=last_decided)
+    return np.where(last_decided >= 0, on[np.maximum(last_decided, 0)], False)
+
+def state_runs(times, states):
+    """Runs of identical raw state: (start times, states, seconds from first to last reading of the run)"""
+    changes = np.flatnonzero(states[1:] != states[:-1]) + 1
+    firsts = np.concatenate(([0], changes))
+    lasts = np.concatenate((changes - 1, [len(states) - 1]))
+    return times[firsts], states[firsts], times[lasts] - times[firsts]
+
+def debounce(runs, start_debounce, end_debounce):
+    """Times and new states of the debounced changes, starting from OFF"""
+    starts, values, spans = runs
+    confirmed = spans >= np.where(values, start_debounce, end_debounce)
+    starts, values = starts[confirmed], values[confirmed]
+    # A confirmed run in the state we're already in is no change
+    changed = values != np.concatenate(([False], values[:-1]))
+    return starts[changed], values[changed]
+
+def session_durations(switch_times, end_time):
+    """Seconds of each ON period; changes alternate ON, OFF, ON, ... and an open cycle ends at end_time"""
+    ons = switch_times[0::2]
+    offs = switch_times[1::2]
+    if len(offs) < len(ons):
+        offs = np.concatenate((offs, [end_time]))
+    return offs - ons
+
+def on_intervals(switches, end_time):
+    """(starts, ends, cumulative ON seconds before each start) of the ON periods"""
+    ons = switches[0][0::2]
+    durations = session_durations(switches[0], end_time)
+    return ons, ons + durations, np.concatenate(([0.0], np.cumsum(durations)))
+
+def on_seconds_before(intervals, moments):
+    """Total ON seconds of `intervals` before each of the sorted `moments`"""
+    ons, offs, cumulative = intervals
+    if len(ons) == 0:
+        return np.zeros(len(moments))
+    k = np.searchsorted(ons, moments, side='right') - 1
+    inside = np.clip(moments - ons[np.maximum(k, 0)], 0, (offs - ons)[np.maximum(k, 0)])
+    return np.where(k >= 0, cumulative[np.maximum(k, 0)] + inside, 0.0)
+
+def disagreement_seconds(a, b):
+    """Seconds during which two sets of ON intervals differ: |A| + |B| - 2 |A and B|.
+
+    The overlap is read off B's cumulative ON time at A's endpoints, so there
+    is no merge of the two change lists.
+    """
+    overlap = (on_seconds_before(b, a[1]) - on_seconds_before(b, a[0])).sum()
+    return float(a[2][-1] + b[2][-1] - 2 * overlap)
+
+def parse_grid(text):
+    """'14.5:16.5:0.05' (inclusive range) or '0,60,120'"""
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 6) for i in range(count)]
+    return [float(part) for part in text.split(',') if part]
+
+def summarize(switches, end_time, min_session):
+    durations = session_durations(switches[0], end_time)
+    sessions = durations[durations >= min_session]
+    return {
+        'flips': len(switches[0]),
+        'sessions': len(sessions),
+        'median_session_minutes': round(float(np.median(sessions)) / 60, 1) if len(sessions) else None,
+    }
+
+def replay(times, amplitude, harmonic, thresholds, hysteresis, start_debounces, end_debounces, ratios,
+           min_session=MIN_SESSION_SECONDS, reference=None):
+    """One result dict per combination of amplitude setting and ratio cutoff.
+
+    With `reference` (ON intervals from on_intervals, e.g. the current
+    settings) each row also gets the share of time it disagrees with them.
+    """
+    start_time, end_time = float(times[0]), float(times[-1])
+    span = max(end_time - start_time, 1.0)
+    debounces = list(itertools.product(start_debounces, end_debounces))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio_values = np.where(amplitude > 0, harmonic / amplitude, np.nan)
+
+    # The ratio algorithm has no hysteresis, so there are only len(ratios) raw state series
+    ratio_intervals = {}
+    ratio_summaries = {}
+    for cutoff in ratios:
+        runs = state_runs(times, hysteresis_states(ratio_values, cutoff, cutoff))
+        for start_debounce, end_debounce in debounces:
+            switches = debounce(runs, start_debounce, end_debounce)
+            ratio_intervals[cutoff, start_debounce, end_debounce] = on_intervals(switches, end_time)
+            ratio_summaries[cutoff, start_debounce, end_debounce] = summarize(switches, end_time, min_session)
+
+    results = []
+    for threshold, band in itertools.product(thresholds, hysteresis):
+        runs = state_runs(times, hysteresis_states(amplitude, threshold, threshold - band))
+        for start_debounce, end_debounce in debounces:
+            switches = debounce(runs, start_debounce, end_debounce)
+            amplitude_summary = summarize(switches, end_time, min_session)
+            intervals = on_intervals(switches, end_time)
+            for cutoff in ratios:
+                key = (cutoff, start_debounce, end_debounce)
+                ratio_summary = ratio_summaries[key]
+                results.append({
+                    'threshold': threshold,
+                    'hysteresis': band,
+                    'start_debounce': start_debounce,
+                    'end_debounce': end_debounce,
+                    'ratio_cutoff': cutoff,
+                    'flips': amplitude_summary['flips'],
+                    'sessions': amplitude_summary['sessions'],
+                    'median_session_minutes': amplitude_summary['median_session_minutes'],
+                    'on_percent': round(100 * intervals[2][-1] / span, 2),
+                    'ratio_flips': ratio_summary['flips'],
+                    'ratio_sessions': ratio_summary['sessions'],
+                    'disagreement_percent': round(100 * disagreement_seconds(intervals, ratio_intervals[key]) / span, 2),
+                })
+                if reference is not None:
+                    results[-1]['current_disagreement_percent'] = \
+                        round(100 * disagreement_seconds(intervals, reference) / span, 2)
+    return results
+
+def current_intervals(times, amplitude):
+    """ON intervals of the settings in laundry_config.py / laundry_sessions.py"""
+    runs = state_runs(times, hysteresis_states(amplitude, AMPLITUDE_THRESHOLD, AMPLITUDE_THRESHOLD))
+    return on_intervals(debounce(runs, START_DEBOUNCE_SECONDS, END_DEBOUNCE_SECONDS), float(times[-1]))
+
+def within_band(value, reference, band):
+    return reference / band <= value <= reference * band
+
+def rank_settings(results, current, sort='disagreement_percent', band=SANE_BAND):
+    """Rows worth recommending, best first.
+
+    Only settings whose cycle count and IN USE share are within `band` of the
+    current ones qualify; they are ranked by disagreement (with the ratio
+    algorithm, or with the current settings), and fewer flips only break ties.
+    """
+    if current['sessions'] and 0 < current['on_percent'] < 100:
+        useful = [row for row in results
+                  if within_band(row['sessions'], current['sessions'], band)
+                  and within_band(row['on_percent'], current['on_percent'], band)]
+    else:
+        # The current settings find nothing to compare against; only drop the trivially stable ones
+        useful = [row for row in results if row['sessions'] and 0 < row['on_percent'] < 100]
+    return sorted(useful, key=lambda row: (row[sort], row['flips']))
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep detection thresholds and debounce settings over history.log.")
+    parser.add_argument('history_log', nargs='?', default=HISTORY_LOG, help="history.log to replay")
+    parser.add_argument('--thresholds', default='14.5:16.5:0.05', help=f"{AMPLITUDE_FREQUENCY}Hz energy thresholds, 'start:stop:step' or a comma list")
+    parser.add_argument('--hysteresis', default='0,0.1,0.2,0.3,0.5', help="Energy band below the threshold that keeps an ON state ON")
+    parser.add_argument('--start-debounce', default='0,60,120', help="Seconds above the threshold before a cycle starts")
+    parser.add_argument('--end-debounce', default='0,300,600', help="Seconds below before a cycle ends")
+    parser.add_argument('--ratios', default='0.15,0.2,0.25', help=f"{RATIO_FREQUENCY}Hz/{AMPLITUDE_FREQUENCY}Hz ratio cutoffs")
+    parser.add_argument('--min-session', type=float, default=MIN_SESSION_SECONDS, help="Shorter cycles are not counted as sessions")
+    parser.add_argument('--output', default=None, help="Write every row as CSV here")
+    parser.add_argument('--top', type=int, default=20, help="Rows to print")
+    parser.add_argument('--sort', default='disagreement_percent', choices=['disagreement_percent', 'current_disagreement_percent'],
+                        help="Rank by time disagreeing with the ratio algorithm or with the current settings (fewer flips break ties)")
+    parser.add_argument('--band', type=float, default=SANE_BAND,
+                        help="Only rank settings whose cycle count and IN USE share are within this factor of the current ones")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    times, amplitude, harmonic = load_history(args.history_log)
+    load_seconds = time.perf_counter() - started
+    if len(times) < 2:
+        print(f"Error: fewer than 2 readings in {args.history_log}")
+        sys.exit(1)
+    days = (times[-1] - times[0]) / 86400
+    print(f"Loaded {len(times)} readings ({days:.1f} days) in {load_seconds:.2f}s")
+
+    # What is running now, for reference
+    reference = current_intervals(times, amplitude)
+    current = replay(times, amplitude, harmonic, [AMPLITUDE_THRESHOLD], [0.0], [START_DEBOUNCE_SECONDS],
+                     [END_DEBOUNCE_SECONDS], [RATIO_THRESHOLD], args.min_session, reference)[0]
+
+    grid = [parse_grid(text) for text in (args.thresholds, args.hysteresis, args.start_debounce, args.end_debounce, args.ratios)]
+    started = time.perf_counter()
+    results = replay(times, amplitude, harmonic, *grid, min_session=args.min_session, reference=reference)
+    sweep_seconds = time.perf_counter() - started
+    print(f"Evaluated {len(results)} settings in {sweep_seconds:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Wrote {args.output}")
+
+    columns = list(current.keys())
+    print()
+    print(' '.join(f"{column:>12.12}" for column in columns))
+    print(' '.join(f"{str(current[column]):>12}" for column in columns), '<- current')
+    ranked = rank_settings(results, current, args.sort, args.band)
+    for row in ranked[:args.top]:
+        print(' '.join(f"{str(row[column]):>12}" for column in columns))
+    print(f"({len(results) - len(ranked)} settings not ranked: too far from the current cycle count or IN USE share)")
+
+if __name__ == "__main__":
+    main()
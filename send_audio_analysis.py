@@ -6,6 +6,7 @@ import traceback
 import os
 import pigpio
 from nrf24 import *
+from metrics import STAGE_SECONDS, EVENTS, save_state
 
 def print_with_header(message):
     header = f"[AUDIO_SEND_SCRIPT at {time.strftime('%Y-%m-%d %H:%M:%S')}]"
@@ -79,10 +80,12 @@ def packetize_data(frequencies):
     return payload
 
 def send_data(nrf, log_file):
-    frequencies = read_frequencies_from_log(log_file)
+    with STAGE_SECONDS.time(process='transmitter', stage='read_now_log'):
+        frequencies = read_frequencies_from_log(log_file)
     
     if not frequencies:
         print_with_header("Error: Could not read frequencies, skipping.")
+        EVENTS.inc(process='transmitter', stage='send', outcome='read_error')
         return False
 
     print_with_header(f"Read frequencies from log: {frequencies}")
@@ -93,20 +96,27 @@ def send_data(nrf, log_file):
     print_with_header(f"Payload (hex): {' '.join(f'{x:02x}' for x in payload)}")
     
     nrf.reset_packages_lost()
+    started = time.perf_counter()
     nrf.send(payload)
     
     try:
         nrf.wait_until_sent()
     except TimeoutError:
         print_with_header('Timeout waiting for transmission to complete.')
+        STAGE_SECONDS.observe(time.perf_counter() - started, process='transmitter', stage='radio_send')
+        EVENTS.inc(process='transmitter', stage='send', outcome='timeout')
         time.sleep(10)
         return False
+    STAGE_SECONDS.observe(time.perf_counter() - started, process='transmitter', stage='radio_send')
+    EVENTS.inc(nrf.get_retries(), process='transmitter', stage='send', outcome='retries')
     
     if nrf.get_packages_lost() == 0:
         print_with_header(f"Success: lost={nrf.get_packages_lost()}, retries={nrf.get_retries()}")
+        EVENTS.inc(process='transmitter', stage='send', outcome='sent')
         return True
     else:
         print_with_header(f"Error: lost={nrf.get_packages_lost()}, retries={nrf.get_retries()}")
+        EVENTS.inc(process='transmitter', stage='send', outcome='lost')
         return False
 
 if __name__ == "__main__":    
@@ -116,12 +126,13 @@ if __name__ == "__main__":
     parser.add_argument('--channel', type=int, default=90, help="Channel to use (default: 90).")
     parser.add_argument('--power', type=str, choices=['LOW', 'MEDIUM', 'HIGH'], default='LOW', help="Power level (default: LOW).")
     parser.add_argument('--logfile', type=str, default='now.log')
+    parser.add_argument('--address', type=str, default='1SNSR', help="Address of this transmitter, as listed in the receiver's DEVICES (default: 1SNSR).")
     
     args = parser.parse_args()
     channel = args.channel
     power_level = args.power
     log_file = args.logfile
-    address = "1SNSR"
+    address = args.address
 
     if power_level == 'LOW':
         power = RF24_PA.LOW
@@ -149,8 +160,12 @@ if __name__ == "__main__":
         log_monitor = monitor_log_file(log_file)
         for _ in log_monitor:
             print_with_header(f"detected change of {log_file}")
+            # How long the reading waited for the 1 second mtime poll
+            STAGE_SECONDS.observe(max(0.0, time.time() - os.path.getmtime(log_file)), process='transmitter', stage='log_pickup')
             send_data(nrf, log_file)
-            time.sleep(5)
+            save_state('send_audio_analysis')
+            # The transmitter loop's adaptive schedule sets the pace; this only spaces back-to-back sends
+            time.sleep(1)
 
     except:
         traceback.print_exc()
@@ -0,0 +1,39 @@
+class SlidingWindowSums:
+    """Running sums of the last N samples for any set of window lengths.
+
+    Keeps a circular buffer of prefix sums sized to the longest window, so
+    adding a sample and querying any window are both O(1) no matter how
+    many windows there are or how long they get (an hour of per-second
+    counts is 3601 integers). Integer samples stay exact; there is no
+    floating point drift from adding and subtracting.
+    """
+
+    def __init__(self, windows):
+        self.windows = sorted(set(windows))
+        self._size = self.windows[-1] + 1
+        self._prefix = [0] * self._size
+        self._total = 0
+        self._samples = 0
+
+    def add(self, value):
+        """Append the newest sample (e.g. pulses counted in the last second)"""
+        self._total += value
+        self._samples += 1
+        self._prefix[self._samples % self._size] = self._total
+
+    def samples(self):
+        return self._samples
+
+    def sum(self, window, partial=False):
+        """Sum of the last `window` samples; None until that many exist unless partial"""
+        if window > self._size - 1:
+            raise ValueError(f"Window {window} is longer than the longest configured window {self._size - 1}")
+        if window > self._samples:
+            if not partial:
+                return None
+            window = self._samples
+        return self._total - self._prefix[(self._samples - window) % self._size]
+
+    def sums(self, partial=False):
+        """Sums for every configured window"""
+        return {window: self.sum(window, partial) for window in self.windows}
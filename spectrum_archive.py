@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Fixed-size memory-mapped archive of the low-frequency spectrum of every capture"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+# process_audio.py computes a full FFT per capture but only keeps two bins.
+# With --spectrum-archive it also appends a downsampled 0-MAX_FREQUENCY Hz
+# spectrum here, so a misdetection can be looked at after the fact.
+#
+# Layout:
+#   header  (64 bytes)            magic, version, sequence, count, capacity, bins, max frequency
+#   index   (capacity * 8 bytes)  float64 epoch seconds of each slot
+#   spectra (capacity * bins * 2) float16 log10(power + 1) per bin, the scale of the logged energies
+#
+# Slots are reused in ring order once `capacity` captures have been stored, so
+# the file never grows. The times live apart from the spectra so a range
+# lookup binary-searches a few index pages instead of touching every record.
+# The sequence number is a seqlock as in wind_shared_history.py: odd while
+# the writer is mid-append, and readers retry if it moved under them.
+
+MAGIC = b'SPEC'
+VERSION = 1
+HEADER_FORMAT = '<4sIQQIIf'
+HEADER_SIZE = 64
+INDEX_OFFSET = HEADER_SIZE
+SEQUENCE_OFFSET = 8
+COUNT_OFFSET = 16
+
+DEFAULT_CAPACITY = 50000     # ~50 MB with the default bins
+DEFAULT_BINS = 500           # 2 Hz per bin
+DEFAULT_MAX_FREQUENCY = 1000.0
+
+# Attempts before a reader gives up on an archive that keeps changing
+MAX_READ_RETRIES = 100
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def data_offset(capacity):
+    return INDEX_OFFSET + capacity * 8
+
+def file_size(capacity, bins):
+    return data_offset(capacity) + capacity * bins * 2
+
+def bin_frequencies(bins, max_frequency):
+    """Centre frequency of each stored bin"""
+    width = max_frequency / bins
+    return (np.arange(bins) + 0.5) * width
+
+def downsample_spectrum(frequencies, levels, bins, max_frequency):
+    """Strongest level in each bin, so a narrow hum peak keeps its height"""
+    keep = (frequencies >= 0) & (frequencies < max_frequency)
+    slots = (frequencies[keep] * (bins / max_frequency)).astype(np.int64)
+    binned = np.zeros(bins, dtype=np.float32)
+    np.maximum.at(binned, slots, levels[keep])
+    return binned
+
+class SpectrumArchive:
+    """Writer: opens the archive (creating it with the given layout if needed) and appends captures"""
+
+    def __init__(self, path, capacity=DEFAULT_CAPACITY, bins=DEFAULT_BINS, max_frequency=DEFAULT_MAX_FREQUENCY):
+        self.path = path
+        if not self._open_existing():
+            self._create(capacity, bins, max_frequency)
+
+    def _open_existing(self):
+        try:
+            self._file = open(self.path, 'r+b')
+        except FileNotFoundError:
+            return False
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0)
+            magic, version, sequence, count, capacity, bins, max_frequency = \
+                struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+            if magic != MAGIC or version != VERSION or len(self._mm) != file_size(capacity, bins):
+                raise ValueError(f"{self.path} is not a version {VERSION} spectrum archive")
+        except (OSError, ValueError, struct.error):
+            # An interrupted creation; start again
+            self.close()
+            return False
+        self._setup(sequence, count, capacity, bins, max_frequency)
+        if sequence & 1:
+            # A writer died mid-append: the slot it was writing is suspect, the rest is fine
+            self._set_sequence(sequence + 1)
+        return True
+
+    def _create(self, capacity, bins, max_frequency):
+        # Build beside the final path so a reader never maps a half-initialised file
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.truncate(file_size(capacity, bins))
+        self._file = open(temp_path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        struct.pack_into(HEADER_FORMAT, self._mm, 0, MAGIC, VERSION, 0, 0, capacity, bins, max_frequency)
+        os.replace(temp_path, self.path)
+        self._setup(0, 0, capacity, bins, max_frequency)
+
+    def _setup(self, sequence, count, capacity, bins, max_frequency):
+        self.capacity = capacity
+        self.bins = bins
+        self.max_frequency = max_frequency
+        self._sequence = sequence
+        self._count = count
+        self._times = np.frombuffer(self._mm, dtype=np.float64, count=capacity, offset=INDEX_OFFSET)
+        self._spectra = np.frombuffer(self._mm, dtype=np.float16, count=capacity * bins,
+                                      offset=data_offset(capacity)).reshape(capacity, bins)
+
+    def _set_sequence(self, sequence):
+        self._sequence = sequence
+        struct.pack_into('<Q', self._mm, SEQUENCE_OFFSET, sequence)
+
+    def append(self, timestamp, frequencies, levels):
+        """Store one capture: epoch seconds plus the FFT frequencies and log10(power + 1) levels"""
+        binned = downsample_spectrum(frequencies, levels, self.bins, self.max_frequency)
+        slot = self._count % self.capacity
+
+        self._set_sequence(self._sequence + 1)
+        self._spectra[slot] = binned.astype(np.float16)
+        self._times[slot] = timestamp
+        self._count += 1
+        struct.pack_into('<Q', self._mm, COUNT_OFFSET, self._count)
+        self._set_sequence(self._sequence + 1)
+
+    def close(self):
+        # Drop the numpy views first, or mmap refuses to close under them
+        self._times = self._spectra = None
+        if getattr(self, '_mm', None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+class SpectrumArchiveReader:
+    """Read-only view; only the index pages and the requested records are touched"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, _, capacity, bins, max_frequency = struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+        if magic != MAGIC or version != VERSION or len(self._mm) != file_size(capacity, bins):
+            raise ValueError(f"{path} is not a version {VERSION} spectrum archive")
+
+        self.capacity = capacity
+        self.bins = bins
+        self.max_frequency = max_frequency
+        self.frequencies = bin_frequencies(bins, max_frequency)
+        self._times = np.frombuffer(self._mm, dtype=np.float64, count=capacity, offset=INDEX_OFFSET)
+        self._spectra = np.frombuffer(self._mm, dtype=np.float16, count=capacity * bins,
+                                      offset=data_offset(capacity)).reshape(capacity, bins)
+
+    def sequence(self):
+        return struct.unpack_from('<Q', self._mm, SEQUENCE_OFFSET)[0]
+
+    def _consistent(self, read):
+        for _ in range(MAX_READ_RETRIES):
+            before = self.sequence()
+            if before & 1:
+                time.sleep(0.001)
+                continue
+            result = read()
+            if self.sequence() == before:
+                return result
+        raise RuntimeError("Spectrum archive kept changing while being read")
+
+    def count(self):
+        """Total captures ever appended"""
+        return self._consistent(lambda: struct.unpack_from('<Q', self._mm, COUNT_OFFSET)[0])
+
+    def _segments(self, count):
+        """Slot ranges holding the stored captures, oldest first (two once the ring has wrapped)"""
+        if count <= self.capacity:
+            return [(0, count)]
+        head = count % self.capacity
+        return [(head, self.capacity), (0, head)] if head else [(0, self.capacity)]
+
+    def read_range(self, start=None, end=None):
+        """(times, frequencies, spectrogram) of captures with start <= time < end (epoch seconds).
+
+        The spectrogram is float32, one row per capture and one column per
+        entry of `frequencies`. Either bound may be None for open-ended.
+        """
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+
+        def read():
+            count = struct.unpack_from('<Q', self._mm, COUNT_OFFSET)[0]
+            times = []
+            rows = []
+            for lo, hi in self._segments(count):
+                # Each segment is in capture order, so its index slice is sorted
+                segment = self._times[lo:hi]
+                first = lo + int(np.searchsorted(segment, start, side='left'))
+                last = lo + int(np.searchsorted(segment, end, side='left'))
+                if first < last:
+                    times.append(np.array(self._times[first:last]))
+                    rows.append(self._spectra[first:last].astype(np.float32))
+            return times, rows
+
+        times, rows = self._consistent(read)
+        if not times:
+            return np.empty(0), self.frequencies, np.empty((0, self.bins), dtype=np.float32)
+        return np.concatenate(times), self.frequencies, np.concatenate(rows)
+
+    def close(self):
+        self._times = self._spectra = None
+        self._mm.close()
+
+def parse_time(value):
+    """Epoch seconds, or a local 'YYYY-MM-DD HH:MM:SS' like the log timestamps"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return time.mktime(time.strptime(value, TIME_FORMAT))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a time range of the spectrum archive.")
+    parser.add_argument('archive', help="Archive written by process_audio.py --spectrum-archive")
+    parser.add_argument('--start', default=None, help="Epoch seconds or 'YYYY-MM-DD HH:MM:SS' (local)")
+    parser.add_argument('--end', default=None, help="Epoch seconds or 'YYYY-MM-DD HH:MM:SS' (local)")
+    parser.add_argument('--output', default=None, help="Save times, frequencies and spectrogram to this .npz")
+    args = parser.parse_args()
+
+    try:
+        reader = SpectrumArchiveReader(args.archive)
+    except (OSError, ValueError) as e:
+        print(f"Error opening spectrum archive: {e}")
+        sys.exit(1)
+
+    times, frequencies, spectrogram = reader.read_range(parse_time(args.start), parse_time(args.end))
+    print(f"{len(times)} captures, {reader.bins} bins up to {reader.max_frequency:g} Hz "
+          f"({reader.count()} captured in total, capacity {reader.capacity})")
+    if len(times):
+        print(f"From {time.strftime(TIME_FORMAT, time.localtime(times[0]))} "
+              f"to {time.strftime(TIME_FORMAT, time.localtime(times[-1]))}")
+        peak = np.argmax(spectrogram.mean(axis=0))
+        print(f"Strongest average bin: {frequencies[peak]:.1f} Hz")
+    if args.output:
+        np.savez_compressed(args.output, times=times, frequencies=frequencies, spectrogram=spectrogram)
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import hashlib
+import mimetypes
+import os
+
+from flask import abort, request
+
+from http_compression import PrecompressedBody
+
+# Serves the files of an app's static folder from memory under URLs that
+# contain a hash of their content (chart.js -> /assets/chart.3f9c1e2a7b04.js).
+# A changed file gets a new URL, so browsers may cache every URL forever and
+# repeat page loads don't ask for them again at all.
+#
+# Chart.js ships with the repo (static/chart.js, v3.7.1, MIT) and is served
+# from here like any other asset, so the pages work on a LAN without internet.
+# An app whose static folder lives elsewhere (the wind server) gets the bundled
+# copy unless its own folder has one.
+
+ASSET_URL_PREFIX = '/assets'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+BUNDLED_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+CHART_JS = 'chart.js'
+
+def hashed_name(name, body):
+    """'chart.js' -> 'chart.<12 hex digits of sha256>.js'"""
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{digest}{extension}"
+
+class StaticAssets:
+    """Every file in `folder`, loaded and compressed once at startup"""
+
+    def __init__(self, app, folder, url_prefix=ASSET_URL_PREFIX):
+        self.url_prefix = url_prefix
+        self.static_url_path = app.static_url_path
+        self._hashed = {}   # name relative to folder -> hashed name
+        self._bodies = {}   # hashed name -> PrecompressedBody
+        self._load(folder)
+        if CHART_JS not in self._hashed:
+            self._add(os.path.join(BUNDLED_FOLDER, CHART_JS), CHART_JS)
+        app.add_url_rule(f"{url_prefix}/<path:filename>", 'hashed_asset', self.serve)
+
+    def _load(self, folder):
+        if not folder or not os.path.isdir(folder):
+            print(f"Static folder {folder} not found; pages will use the original asset URLs")
+            return
+        for root, _, files in os.walk(folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                self._add(path, os.path.relpath(path, folder).replace(os.sep, '/'))
+
+    def _add(self, path, name):
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError as e:
+            print(f"Error loading static asset {path}: {e}")
+            return
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        hashed = hashed_name(name, body)
+        self._hashed[name] = hashed
+        self._bodies[hashed] = PrecompressedBody(body, mimetype, IMMUTABLE_CACHE_CONTROL)
+
+    def has(self, name):
+        """True if the static folder has this file, e.g. to leave out links that would 404"""
+        return name in self._hashed
+
+    def url(self, name, fallback=None):
+        """Content-hashed URL of a static file; `fallback` (or its plain /static URL) if it wasn't found"""
+        if name in self._hashed:
+            return f"{self.url_prefix}/{self._hashed[name]}"
+        return fallback or f"{self.static_url_path}/{name}"
+
+    def response(self, name, cache_control=None):
+        """A file by its plain name (e.g. for /favicon.ico), or a 404"""
+        if name not in self._hashed:
+            abort(404)
+        return self._bodies[self._hashed[name]].response(request.headers.get('Accept-Encoding'),
+                                                        request.headers.get('If-None-Match'), cache_control)
+
+    def serve(self, filename):
+        body = self._bodies.get(filename)
+        if body is None:
+            # e.g. an old hash from before the file changed
+            abort(404)
+        return body.response(request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Stress the wind history under one writer and concurrent readers, failing on any torn or out-of-order entry"""
+
+import argparse
+import functools
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from wind_shared_history import SharedHistoryReader, SharedHistoryWriter, seconds_to_time, time_to_seconds
+import wind_webserver
+
+# Every value of a row is derived from its time, so a reader can tell a row
+# that mixes two writes (torn) from a good one without knowing what was
+# written: each field must equal (seconds - BASE) % VALUE_MODULUS, which a
+# float32 holds exactly. Rows must also come out one second apart, oldest first.
+
+BASE = time_to_seconds("2025-01-01 00:00:00")
+VALUE_MODULUS = 10000
+FIELDS = [key for key, _ in wind_webserver.DATA_FIELDS]
+WINDOW_FIELDS = [f"{w}s" for w in wind_webserver.TIME_WINDOWS]
+
+# Enough that /api/history never downsamples the longest read (30 minutes)
+ALL_POINTS = 10000
+
+# Readers parse the same times over and over; keep checking cheap so they read often
+parse_time = functools.lru_cache(maxsize=None)(time_to_seconds)
+
+def make_row(second):
+    value = float(second % VALUE_MODULUS)
+    row = {'time': seconds_to_time(BASE + second)}
+    row.update({field: value for field in FIELDS})
+    return row
+
+def expected_value(seconds):
+    return float((seconds - BASE) % VALUE_MODULUS)
+
+def check_row(row, fields=FIELDS):
+    """A problem with one row (e.g. an entry or the current readings), or None"""
+    expected = expected_value(parse_time(row['time']))
+    wrong = [field for field in fields if row.get(field) != expected]
+    if wrong:
+        return f"torn row at {row['time']}: {wrong[0]}={row.get(wrong[0])}, expected {expected}"
+    return None
+
+def check_rows(rows, after=None, fields=FIELDS):
+    """A problem with a run of rows: torn, or not consecutive seconds after `after` (a time string)"""
+    previous = parse_time(after) if after else None
+    for row in rows:
+        problem = check_row(row, fields)
+        if problem:
+            return problem
+        seconds = parse_time(row['time'])
+        if previous is not None and seconds <= previous:
+            return f"out of order: {row['time']} after {seconds_to_time(previous)}"
+        previous = seconds
+    return None
+
+def check_contiguous(rows, fields=FIELDS):
+    """Like check_rows, and the rows must leave no gap (true of any single read)"""
+    problem = check_rows(rows, fields=fields)
+    if problem:
+        return problem
+    times = [parse_time(row['time']) for row in rows]
+    gaps = [later - earlier for earlier, later in zip(times, times[1:]) if later - earlier != 1]
+    return f"gap of {gaps[0]} s inside one read" if gaps else None
+
+# Shared-memory ring: one writer process, reader processes mapping the segment
+
+def ring_writer(path, capacity, seconds, max_batch, written, started, done):
+    writer = SharedHistoryWriter(path, FIELDS, capacity)
+    # Write only once every reader has the segment open
+    started.wait()
+    deadline = time.monotonic() + seconds
+    second = 0
+    while time.monotonic() < deadline:
+        batch = random.randint(1, max_batch)
+        writer.append([make_row(second + i) for i in range(batch)])
+        second += batch
+    written.value = second
+    done.set()
+    writer.close()
+
+def ring_reader(path, results, started, done):
+    reader = SharedHistoryReader(path)
+    started.wait()
+    cursor = 0
+    last_time = None
+    reads = retries_exhausted = 0
+    problems = []
+    while not done.is_set() and len(problems) < 10:
+        try:
+            entries, cursor = reader.read_since(cursor)
+            problem = check_contiguous(entries) or check_rows(entries, last_time)
+            if entries:
+                last_time = entries[-1]['time']
+            recent = reader.read_last_minutes(random.choice([1, 5, 30]))
+            problem = problem or check_contiguous(recent)
+            latest = reader.latest()
+            problem = problem or (check_row(latest) if latest else None)
+            reads += 3
+        except RuntimeError:
+            # The seqlock retries ran out; allowed, as long as nothing torn ever comes back
+            retries_exhausted += 1
+            continue
+        if problem:
+            problems.append(problem)
+    results.put((reads, retries_exhausted, problems))
+
+def stress_shared_ring(args):
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    path = os.path.join(directory, f"wind_history_stress_{os.getpid()}")
+    context = multiprocessing.get_context('fork')
+    written = context.Value('q', 0)
+    results = context.Queue()
+    started = context.Barrier(args.readers + 1)
+    done = context.Event()
+
+    writer = context.Process(target=ring_writer,
+                             args=(path, args.capacity, args.seconds, args.max_batch, written, started, done))
+    writer.start()
+    # Readers open the segment once the writer has published it
+    while not os.path.exists(path):
+        time.sleep(0.01)
+    readers = [context.Process(target=ring_reader, args=(path, results, started, done)) for _ in range(args.readers)]
+    for process in readers:
+        process.start()
+
+    outcomes = [results.get() for _ in readers]
+    writer.join()
+    for process in readers:
+        process.join()
+    os.unlink(path)
+
+    problems = [problem for _, _, found in outcomes for problem in found]
+    print(f"shared ring: {written.value} rows written through a {args.capacity}-row ring "
+          f"({written.value / args.capacity:.0f} wraps), {sum(o[0] for o in outcomes)} reads by {args.readers} readers, "
+          f"{sum(o[1] for o in outcomes)} gave up retrying, {len(problems)} problems")
+    return problems
+
+# In-process snapshots: the CSV ingest thread publishing, request threads
+# reading them through the HTTP API (routing, JSON, gzip and columnar encoding)
+
+def get_json(client, url):
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    if response.status_code != 200:
+        raise AssertionError(f"{url}: HTTP {response.status_code}")
+    body = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+def check_history(data):
+    """A problem with an /api/history response (one list of points per window), or None"""
+    windows = [data[key] for key in WINDOW_FIELDS]
+    if len({len(points) for points in windows}) > 1:
+        return "windows of one history response have different lengths"
+    rows = [dict({'time': points[0]['time']}, **{key: point['mph'] for key, point in zip(WINDOW_FIELDS, points)})
+            for points in zip(*windows)]
+    if any(point['time'] != row['time'] for points, row in zip(zip(*windows), rows) for point in points):
+        return "windows of one history response are out of step"
+    return check_contiguous(rows, WINDOW_FIELDS)
+
+def check_columnar(data):
+    """A problem with an /api/history?format=columnar response, or None"""
+    if data['t0'] is None:
+        return None
+    if any(step != 1 for step in data['dt'][1:]):
+        return "gap or reordering in the columnar history"
+    for key in WINDOW_FIELDS:
+        values = data['windows'][key]
+        if len(values) != len(data['dt']):
+            return f"columnar {key} has {len(values)} values for {len(data['dt'])} times"
+        wrong = [i for i, value in enumerate(values) if value != expected_value(data['t0'] + i)]
+        if wrong:
+            return f"torn columnar row at t0+{wrong[0]}: {key}={values[wrong[0]]}"
+    return None
+
+def stress_snapshots(args):
+    """Returns the problems seen; the module's snapshot and retention are restored afterwards"""
+    saved = wind_webserver.snapshot, wind_webserver.history_retention, wind_webserver._threads_started
+    wind_webserver.snapshot = wind_webserver.WindSnapshot(0, (), 0, dict(wind_webserver.initial_current))
+    wind_webserver.history_retention = args.capacity
+    # This function is the ingest thread; don't let the first request start the real one
+    wind_webserver._threads_started = True
+    try:
+        return run_snapshot_stress(args)
+    finally:
+        wind_webserver.snapshot, wind_webserver.history_retention, wind_webserver._threads_started = saved
+
+def run_snapshot_stress(args):
+    problems = []
+    reads = [0]
+    written = [0]
+    lock = threading.Lock()
+    started = threading.Barrier(args.readers + 1)
+    done = threading.Event()
+
+    def ingest():
+        started.wait()
+        deadline = time.monotonic() + args.seconds
+        second = 0
+        while time.monotonic() < deadline:
+            batch = random.randint(1, args.max_batch)
+            wind_webserver.publish_entries([make_row(second + i) for i in range(batch)])
+            second += batch
+        written[0] = second
+        done.set()
+
+    def read():
+        # One client per thread, like separate browsers
+        client = wind_webserver.app.test_client()
+        found = []
+        count = 0
+        started.wait()
+        while not done.is_set() and len(found) < 10:
+            try:
+                minutes = random.choice([1, 5, 30])
+                problem = check_history(get_json(client, f"/api/history?minutes={minutes}&points={ALL_POINTS}"))
+                problem = problem or check_columnar(
+                    get_json(client, f"/api/history?minutes={minutes}&points={ALL_POINTS}&format=columnar"))
+                current = get_json(client, '/api/current')
+                if not problem and current['last_updated']:
+                    problem = check_row(dict(current, time=current['last_updated']))
+            except Exception as e:
+                problem = f"request failed: {e!r}"
+            count += 3
+            if problem:
+                found.append(problem)
+        with lock:
+            problems.extend(found)
+            reads[0] += count
+
+    threads = [threading.Thread(target=ingest)] + [threading.Thread(target=read) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f"snapshots: {written[0]} rows in {wind_webserver.snapshot.version} snapshots, "
+          f"{reads[0]} API requests by {args.readers} threads, {len(problems)} problems")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent writer/reader stress test of the wind history stores.")
+    parser.add_argument('--target', choices=['shared', 'snapshots', 'both'], default='both',
+                        help="The shared-memory ring (worker mode), the in-process snapshots, or both")
+    parser.add_argument('--seconds', type=float, default=5.0, help="How long to run each target")
+    parser.add_argument('--readers', type=int, default=4, help="Concurrent reader processes/threads")
+    parser.add_argument('--capacity', type=int, default=2000, help="Rows kept, small so the ring wraps constantly")
+    parser.add_argument('--max-batch', type=int, default=100, help="Largest rows per write")
+    args = parser.parse_args()
+
+    problems = []
+    if args.target in ('shared', 'both'):
+        problems += stress_shared_ring(args)
+    if args.target in ('snapshots', 'both'):
+        problems += stress_snapshots(args)
+
+    for problem in problems[:20]:
+        print(f"  {problem}")
+    if problems:
+        sys.exit(1)
+    print("OK: no torn or out-of-order entries")
+
+if __name__ == "__main__":
+    main()
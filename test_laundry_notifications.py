@@ -0,0 +1,53 @@
+from laundry_config import DEVICES
+from laundry_sessions import MIN_SESSION_SECONDS, seconds_to_timestamp
+from notifications import MAX_SUBSCRIPTIONS_PER_CLIENT, SubscriptionStore
+import laundry_webserver
+
+class RecordingNotifier:
+    def __init__(self):
+        self.sent = []
+
+    def notify(self, device, name, message, **details):
+        self.sent.append((device, message, details))
+
+def append_readings(device, start, seconds, energy):
+    with open(device.log_file, 'a') as f:
+        for t in range(start, start + seconds, 10):
+            f.write(f"{seconds_to_timestamp(t)}\nFREQUENCY VALUES:\nenergy at 60Hz: {energy:.4f}\n\n")
+    device.poll()
+
+def make_device(tmp_path):
+    notifier = RecordingNotifier()
+    device = laundry_webserver.LaundryDevice(DEVICES[0], str(tmp_path), notifier=notifier)
+    append_readings(device, 0, 600, 15.0)
+    return device, notifier
+
+def test_blip_too_short_for_a_cycle_notifies_nobody(tmp_path):
+    device, notifier = make_device(tmp_path)
+    append_readings(device, 600, MIN_SESSION_SECONDS - 120, 16.2)
+    append_readings(device, 600 + MIN_SESSION_SECONDS - 120, 600, 15.0)
+    assert notifier.sent == []
+
+def test_finished_cycle_notifies_with_its_own_end_time(tmp_path):
+    device, notifier = make_device(tmp_path)
+    append_readings(device, 600, 1800, 16.2)
+    append_readings(device, 2400, 600, 15.0)
+    assert len(notifier.sent) == 1
+    _, message, details = notifier.sent[0]
+    assert details['finished'] == seconds_to_timestamp(2400)
+    assert message.endswith(f"(cycle finished at {seconds_to_timestamp(2400)[11:16]})")
+
+def subscribe_via_proxies(client, forwarded):
+    """POST a subscription as it arrives through the cloud VM's nginx, the tunnel and the Pi's nginx"""
+    return client.post('/api/subscriptions', json={'kind': 'webhook', 'target': 'http://127.0.0.1:9/hook'},
+                       headers={'X-Forwarded-For': forwarded}, environ_base={'REMOTE_ADDR': '127.0.0.1'})
+
+def test_spoofed_forwarded_for_does_not_lift_the_client_cap(monkeypatch):
+    monkeypatch.setattr(laundry_webserver.notifier, 'store', SubscriptionStore(allow_private=True))
+    client = laundry_webserver.app.test_client()
+    # The visitor's own header comes first; each proxy appends the address it saw
+    statuses = [subscribe_via_proxies(client, f"198.51.100.{i}, 127.0.0.{i}, 203.0.113.7, 127.0.0.1").status_code
+                for i in range(MAX_SUBSCRIPTIONS_PER_CLIENT + 2)]
+    assert statuses == [201] * MAX_SUBSCRIPTIONS_PER_CLIENT + [400, 400]
+    # Someone else behind the same proxies still gets in
+    assert subscribe_via_proxies(client, "203.0.113.8, 127.0.0.1").status_code == 201
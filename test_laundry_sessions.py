@@ -0,0 +1,24 @@
+from laundry_sessions import MIN_SESSION_SECONDS, SessionTracker, seconds_to_timestamp
+
+THRESHOLD = 15.25
+
+def feed(tracker, start, seconds, energy, step=10):
+    """Readings every `step` seconds; returns the transitions they caused"""
+    return [event for t in range(start, start + seconds, step)
+            if (event := tracker.add_reading(seconds_to_timestamp(t), energy))]
+
+def test_full_cycle_is_recorded_and_ended():
+    tracker = SessionTracker(THRESHOLD)
+    events = feed(tracker, 0, 600, 15.0) + feed(tracker, 600, 1800, 16.2) + feed(tracker, 2400, 600, 15.0)
+    assert events == ['started', 'ended']
+    assert tracker.status(now=3000)['sessions_recorded'] == 1
+
+def test_short_blip_is_discarded_not_ended():
+    tracker = SessionTracker(THRESHOLD)
+    # Long enough to start (60 s), too short to count as a cycle
+    events = feed(tracker, 0, 600, 15.0) + feed(tracker, 600, MIN_SESSION_SECONDS - 120, 16.2) + \
+        feed(tracker, 600 + MIN_SESSION_SECONDS - 120, 600, 15.0)
+    assert events == ['started', 'discarded']
+    status = tracker.status(now=2000)
+    assert status['sessions_recorded'] == 0
+    assert status['last_finished'] is None
@@ -0,0 +1,64 @@
+import json
+import os
+import time
+
+import pytest
+from flask import Flask
+
+import metrics
+from metrics import STATE_MAX_AGE_SECONDS, WorkerSlot, claim_slot, read_states, remove_state, state_path
+
+@pytest.fixture(autouse=True)
+def metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, 'ENABLED', True)
+    return tmp_path
+
+def write_state(name, age=0):
+    path = state_path(name)
+    with open(path, 'w') as f:
+        json.dump({'metrics': {}}, f)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+def test_replacement_worker_takes_over_a_dead_workers_slot():
+    first, first_lock = claim_slot('app')
+    second, second_lock = claim_slot('app')
+    assert (first, second) == ('app-worker0', 'app-worker1')
+    # The kernel drops a killed worker's lock; its replacement reuses the file
+    first_lock.close()
+    replacement, replacement_lock = claim_slot('app')
+    assert replacement == 'app-worker0'
+    second_lock.close()
+    replacement_lock.close()
+
+def test_expired_worker_files_are_deleted_but_script_files_kept():
+    expired_worker = write_state('app-worker3', age=STATE_MAX_AGE_SECONDS + 60)
+    expired_pid = write_state('app-12345', age=STATE_MAX_AGE_SECONDS + 60)
+    expired_script = write_state('process_audio', age=STATE_MAX_AGE_SECONDS + 60)
+    write_state('app-worker0')
+
+    assert len(read_states()) == 1
+    assert not os.path.exists(expired_worker)
+    assert not os.path.exists(expired_pid)
+    # process_audio restores its counts from this file when it restarts
+    assert os.path.exists(expired_script)
+
+def test_instrumented_app_saves_under_its_slot(metrics_dir):
+    app = Flask(__name__)
+    metrics.instrument_app(app, 'app')
+    app.add_url_rule('/', 'index', lambda: 'ok')
+    client = app.test_client()
+    assert client.get('/').status_code == 200
+    assert sorted(os.listdir(metrics_dir)) == ['app-worker0.json', 'app-worker0.lock']
+    assert client.get('/metrics').status_code == 200
+
+def test_worker_exit_removes_its_state_file():
+    slot = WorkerSlot('app')
+    name = slot()
+    assert slot() == name
+    write_state(name)
+    remove_state(name)
+    remove_state(name)
+    assert not os.path.exists(state_path(name))
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import notifications
+from notifications import Notifier, SubscriptionStore, http_post
+
+class StandIn:
+    """Local HTTP server recording each POST; `responses[path]` lists statuses to answer before a 200"""
+
+    def __init__(self):
+        self.received = []
+        self.responses = {}
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                queued = stand_in.responses.get(self.path)
+                status = queued.pop(0) if queued else 200
+                stand_in.received.append((time.monotonic(), self.path, status, body.decode()))
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def posts(self, path):
+        return [entry for entry in self.received if entry[1] == path]
+
+@pytest.fixture
+def stand_in():
+    server = StandIn()
+    yield server
+    server.server.shutdown()
+
+def make_notifier(store, **options):
+    settings = {'batch_seconds': 0.2, 'min_interval': 0.5, 'backoff_seconds': 0.05}
+    settings.update(options)
+    notifier = Notifier(store, **settings)
+    notifier.start()
+    return notifier
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_events_in_one_window_are_batched(stand_in):
+    store = SubscriptionStore(allow_private=True)
+    store.add('washer', 'webhook', stand_in.url + '/hook')
+    store.add('washer', 'ntfy', stand_in.url + '/topic')
+    store.add('dryer', 'ntfy', stand_in.url + '/dryer')
+    notifier = make_notifier(store)
+    notifier.notify('washer', 'Washer', 'Washer is free')
+    notifier.notify('washer', 'Washer', 'Washer is free again')
+
+    assert wait_for(lambda: stand_in.posts('/hook') and stand_in.posts('/topic'))
+    time.sleep(0.3)
+    assert len(stand_in.posts('/hook')) == 1
+    assert '"Washer is free again"' in stand_in.posts('/hook')[0][3]
+    assert stand_in.posts('/topic')[0][3] == 'Washer is free\nWasher is free again'
+    # Only the device's own subscribers are told
+    assert not stand_in.posts('/dryer')
+
+def test_requests_to_an_endpoint_are_rate_limited(stand_in):
+    store = SubscriptionStore(allow_private=True)
+    store.add('washer', 'webhook', stand_in.url + '/hook')
+    notifier = make_notifier(store, min_interval=0.6)
+    notifier.notify('washer', 'Washer', 'first')
+    assert wait_for(lambda: stand_in.posts('/hook'))
+    notifier.notify('washer', 'Washer', 'second')
+    time.sleep(0.25)
+    notifier.notify('washer', 'Washer', 'third')
+
+    assert wait_for(lambda: len(stand_in.posts('/hook')) == 2)
+    time.sleep(0.8)
+    posts = stand_in.posts('/hook')
+    assert len(posts) == 2
+    assert posts[1][0] - posts[0][0] >= 0.6
+    # Events that waited out the limit share one request
+    assert '"second"' in posts[1][3] and '"third"' in posts[1][3]
+
+@pytest.mark.parametrize('failures', [[503, 503], [429]])
+def test_server_errors_and_429_are_retried_after_the_rate_limit(stand_in, failures):
+    store = SubscriptionStore(allow_private=True)
+    store.add('washer', 'webhook', stand_in.url + '/flaky')
+    stand_in.responses['/flaky'] = list(failures)
+    notifier = make_notifier(store, min_interval=0.3)
+    notifier.notify('washer', 'Washer', 'free')
+
+    assert wait_for(lambda: any(status == 200 for _, _, status, _ in stand_in.posts('/flaky')))
+    posts = stand_in.posts('/flaky')
+    assert [status for _, _, status, _ in posts] == failures + [200]
+    # Even retries keep at least min_interval apart
+    assert all(later[0] - earlier[0] >= 0.3 for earlier, later in zip(posts, posts[1:]))
+
+def test_other_client_errors_are_not_retried(stand_in):
+    store = SubscriptionStore(allow_private=True)
+    store.add('washer', 'webhook', stand_in.url + '/gone')
+    stand_in.responses['/gone'] = [404, 404, 404]
+    notifier = make_notifier(store, min_interval=0.05)
+    notifier.notify('washer', 'Washer', 'free')
+
+    assert wait_for(lambda: stand_in.posts('/gone'))
+    time.sleep(0.5)
+    assert len(stand_in.posts('/gone')) == 1
+
+@pytest.mark.parametrize('url', ['http://127.0.0.1:8080/hook', 'http://10.0.0.5/hook', 'http://192.168.1.1/',
+                                 'http://169.254.169.254/latest', 'http://[::1]/hook', 'http://localhost/hook'])
+def test_private_webhook_targets_are_refused(url):
+    store = SubscriptionStore()
+    with pytest.raises(ValueError):
+        store.add('washer', 'webhook', url)
+
+def test_delivery_refuses_private_addresses():
+    # e.g. a public hostname re-pointed at the LAN after subscribing
+    with pytest.raises(ValueError):
+        asyncio.run(http_post('http://127.0.0.1:9/hook', b'{}', {}))
+
+def test_subscriptions_are_capped_per_client_and_expire(stand_in, monkeypatch):
+    store = SubscriptionStore(allow_private=True)
+    for _ in range(notifications.MAX_SUBSCRIPTIONS_PER_CLIENT):
+        store.add('washer', 'webhook', stand_in.url + '/hook', client='203.0.113.7')
+    with pytest.raises(ValueError):
+        store.add('washer', 'webhook', stand_in.url + '/hook', client='203.0.113.7')
+    store.add('washer', 'webhook', stand_in.url + '/hook', client='203.0.113.8')
+
+    later = time.time() + (notifications.SUBSCRIPTION_DAYS + 1) * 86400
+    monkeypatch.setattr(notifications.time, 'time', lambda: later)
+    assert store.for_device('washer') == []
+    store.add('washer', 'webhook', stand_in.url + '/hook', client='203.0.113.7')
+    assert len(store.for_device('washer')) == 1
@@ -0,0 +1,40 @@
+import random
+
+from laundry_config import AMPLITUDE_THRESHOLD, IDLE_ENERGY
+from process_audio import MAX_INTERVAL, MIN_INTERVAL, next_capture
+
+def simulate(energies_at, seconds):
+    """Run the schedule for `seconds`; returns the (time, interval, publish) of every capture"""
+    state = {}
+    now = 0.0
+    captures = []
+    while now < seconds:
+        interval, publish, state = next_capture(state, energies_at(now), now)
+        captures.append((now, interval, publish))
+        now += interval
+    return captures
+
+def test_idle_backs_off_to_max_interval():
+    # Idle readings at the level the README shows, just under the threshold
+    random.seed(37)
+    captures = simulate(lambda now: random.gauss(IDLE_ENERGY, 0.05), 3600)
+    intervals = [interval for _, interval, _ in captures]
+    assert max(intervals) == MAX_INTERVAL
+    # After the first few readings it stays backed off
+    assert sum(interval == MAX_INTERVAL for interval in intervals[10:]) >= 0.8 * len(intervals[10:])
+    # Far fewer captures and transmissions than the old fixed 10 s + 1 s loop (~330 an hour)
+    assert len(captures) < 120
+    assert sum(publish for _, _, publish in captures) < 120
+
+def test_crossing_the_threshold_captures_quickly():
+    random.seed(38)
+    captures = simulate(lambda now: random.gauss(IDLE_ENERGY if now < 1800 else 16.2, 0.05), 1900)
+    after = [(now, interval, publish) for now, interval, publish in captures if now >= 1800]
+    assert after[0][1] == MIN_INTERVAL
+    assert after[0][2]
+
+def test_near_threshold_uses_min_interval():
+    state = {'energy': AMPLITUDE_THRESHOLD - 0.02, 'interval': MAX_INTERVAL, 'last_publish': 0.0}
+    interval, publish, _ = next_capture(state, AMPLITUDE_THRESHOLD - 0.02, 10.0)
+    assert interval == MIN_INTERVAL
+    assert publish
@@ -0,0 +1,45 @@
+import numpy as np
+
+import replay_thresholds
+from replay_thresholds import SANE_BAND, current_intervals, parse_grid, rank_settings, replay
+
+def synthetic_history(days=20, seed=1):
+    """10 s readings: idle at 15.0, three 35-60 minute cycles a day at 16.2, noise on both"""
+    rng = np.random.default_rng(seed)
+    times = np.arange(0, days * 86400, 10.0) + 1.7e9
+    running = np.zeros(len(times), bool)
+    for day in range(days):
+        for hour in rng.choice(np.arange(7, 22), size=3, replace=False):
+            start = (day * 86400 + hour * 3600 + int(rng.integers(0, 3000))) // 10
+            running[start:start + int(rng.integers(35, 60)) * 6] = True
+    amplitude = np.where(running, 16.2, 15.0) + rng.normal(0, 0.1, len(times))
+    harmonic = amplitude * np.where(running, 0.3, 0.1)
+    return times, amplitude, harmonic
+
+def test_top_recommendation_detects_the_cycles():
+    times, amplitude, harmonic = synthetic_history()
+    reference = current_intervals(times, amplitude)
+    current = replay(times, amplitude, harmonic, [replay_thresholds.AMPLITUDE_THRESHOLD], [0.0], [60], [300], [0.2],
+                     reference=reference)[0]
+    assert current['current_disagreement_percent'] == 0
+    results = replay(times, amplitude, harmonic, parse_grid('14.5:16.5:0.05'), [0, 0.2], [0, 60, 120], [0, 300, 600],
+                     [0.2], reference=reference)
+
+    ranked = rank_settings(results, current)
+    best = ranked[0]
+    # Thresholds that hardly ever trigger (or never let go) flip least, but must not be recommended
+    assert 15.05 <= best['threshold'] <= 16.0
+    assert current['sessions'] / SANE_BAND <= best['sessions'] <= current['sessions'] * SANE_BAND
+    assert best['disagreement_percent'] <= current['disagreement_percent']
+    assert all(row['sessions'] >= current['sessions'] / SANE_BAND for row in ranked)
+    assert rank_settings(results, current, 'current_disagreement_percent')[0]['current_disagreement_percent'] == 0
+
+def test_flips_only_break_ties():
+    current = {'sessions': 100, 'on_percent': 10.0}
+    rows = [
+        {'name': 'quiet but blind', 'sessions': 1, 'on_percent': 0.01, 'flips': 2, 'disagreement_percent': 9.0},
+        {'name': 'agrees, flappy', 'sessions': 110, 'on_percent': 11.0, 'flips': 400, 'disagreement_percent': 0.5},
+        {'name': 'agrees, calm', 'sessions': 95, 'on_percent': 9.5, 'flips': 190, 'disagreement_percent': 0.5},
+        {'name': 'disagrees', 'sessions': 90, 'on_percent': 12.0, 'flips': 180, 'disagreement_percent': 3.0},
+    ]
+    assert [row['name'] for row in rank_settings(rows, current)] == ['agrees, calm', 'agrees, flappy', 'disagrees']
@@ -0,0 +1,37 @@
+import re
+
+from flask import Flask
+
+import laundry_webserver
+import wind_webserver
+from static_assets import IMMUTABLE_CACHE_CONTROL, StaticAssets
+
+def test_laundry_page_links_only_assets_it_serves():
+    client = laundry_webserver.app.test_client()
+    page = client.get('/').get_data(as_text=True)
+    local_urls = re.findall(r'(?:href|src)="(/[^"]*)"', page)
+    assert any(url.startswith('/assets/favicon-32x32.') for url in local_urls)
+    assert any(url.startswith('/assets/chart.') for url in local_urls)
+    assert 'https://' not in ''.join(re.findall(r'<script[^>]*src="([^"]*)"', page))
+    for url in local_urls + ['/favicon.ico']:
+        assert client.get(url).status_code == 200, url
+
+def test_wind_page_serves_bundled_chart_js():
+    client = wind_webserver.app.test_client()
+    page = client.get('/').get_data(as_text=True)
+    chart_url = re.search(r'<script async src="(/assets/chart\.[0-9a-f]{12}\.js)"', page).group(1)
+    response = client.get(chart_url)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+
+def test_missing_file_is_reported_and_falls_back(tmp_path):
+    (tmp_path / 'chart.js').write_text('// chart')
+    app = Flask(__name__)
+    assets = StaticAssets(app, str(tmp_path))
+    assert assets.has('chart.js')
+    assert not assets.has('favicon-32x32.png')
+    assert assets.url('missing.js', 'https://cdn.example/missing.js') == 'https://cdn.example/missing.js'
+
+    client = app.test_client()
+    assert client.get(assets.url('chart.js')).status_code == 200
+    assert client.get('/assets/chart.000000000000.js').status_code == 404
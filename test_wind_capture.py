@@ -0,0 +1,150 @@
+import csv
+import itertools
+
+import pytest
+
+import wind_capture
+import wind_logger
+from wind_capture import STOPPED_AFTER_MICROS, PulseCounter, local_samples, pulse_samples, tick_diff
+
+# pigpio ticks wrap 2.5 s into every replay
+TICK_START = 0xFFFFFFFF - 2_500_000
+
+def tick_at(seconds):
+    return (TICK_START + round(seconds * 1_000_000)) & 0xFFFFFFFF
+
+def recorded_train():
+    """Pulse times in seconds: 4 Hz, then 10 Hz, then the cups stop"""
+    return [i * 0.25 + 0.013 for i in range(12)] + [3 + i * 0.1 + 0.013 for i in range(30)]
+
+class ReplayPi:
+    """pigpio.pi stand-in that fires the callback for each recorded pulse as the fake clock passes it"""
+
+    connected = True
+
+    def __init__(self, clock, pulses, end=None):
+        self.clock = clock
+        self.pending = list(pulses)
+        self.end = end
+        self.callback_fn = None
+        self.cancelled = self.stopped = False
+        clock.pi = self
+
+    def set_mode(self, pin, mode):
+        assert (pin, mode) == (wind_capture.PIN, wind_capture.GPIO_INPUT)
+
+    def callback(self, pin, edge, fn):
+        self.callback_fn = fn
+        return self
+
+    def cancel(self):
+        self.cancelled = True
+
+    def stop(self):
+        self.stopped = True
+
+    def get_current_tick(self):
+        return tick_at(self.clock.now)
+
+    def deliver(self):
+        if self.end is not None and self.clock.now > self.end:
+            raise KeyboardInterrupt
+        while self.callback_fn and self.pending and self.pending[0] <= self.clock.now:
+            self.callback_fn(wind_capture.PIN, 1, tick_at(self.pending.pop(0)))
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.pi = None
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
+        if self.pi:
+            self.pi.deliver()
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(wind_capture.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(wind_capture.time, 'sleep', clock.sleep)
+    return clock
+
+def expected_sample(pulses, second):
+    """Pulse count over (second - 1, second] and the period PulseCounter should report at `second`"""
+    count = sum(1 for t in pulses if second - 1 < t <= second)
+    seen = [t for t in pulses if t <= second]
+    if len(seen) < 2:
+        return count, None
+    period = tick_diff(tick_at(seen[-2]), tick_at(seen[-1]))
+    gap = tick_diff(tick_at(seen[-1]), tick_at(second))
+    return count, None if gap > STOPPED_AFTER_MICROS else max(period, gap)
+
+def test_period_across_tick_wrap():
+    counter = PulseCounter()
+    counter.count_pulse(17, 1, 0xFFFFFFFF - 400)
+    counter.count_pulse(17, 2, 0xFFFFFFFF - 200)  # watchdog timeout, not a pulse
+    counter.count_pulse(17, 1, 599)
+    assert counter.take() == 2
+    assert counter.take() == 0
+    assert counter.pulse_period(700) == 1000
+    # Slowing: the gap since the last pulse outgrows the last period
+    assert counter.pulse_period(599 + 4000) == 4000
+    assert counter.pulse_period((599 + STOPPED_AFTER_MICROS + 1) & 0xFFFFFFFF) is None
+
+def test_replayed_train_matches_recorded_pulses(clock):
+    pulses = recorded_train()
+    pi = ReplayPi(clock, pulses)
+    samples = local_samples(pi)
+    replayed = [(s['pulses'], s['period']) for s in itertools.islice(samples, 12)]
+    samples.close()
+
+    assert replayed == [expected_sample(pulses, second) for second in range(1, 13)]
+    assert sum(count for count, _ in replayed) == len(pulses)
+    # 10 Hz across the tick wrap, the gap once the cups slow, then stopped
+    assert replayed[4][1] == 100_000
+    assert replayed[6][1] > 1_000_000
+    assert replayed[11][1] is None
+    assert pi.cancelled and pi.stopped
+
+def test_deadlines_do_not_drift(clock):
+    counter = PulseCounter()
+    pi = ReplayPi(clock, [])
+    times = []
+    for _ in pulse_samples(pi, counter, max_samples=10):
+        times.append(clock.now)
+        clock.advance(0.3)  # time spent handling each sample
+    assert times == pytest.approx(range(1, 11))
+
+def test_stall_restarts_schedule(clock):
+    counter = PulseCounter()
+    pi = ReplayPi(clock, [])
+    times = []
+    for _ in pulse_samples(pi, counter, max_samples=4):
+        times.append(clock.now)
+        if len(times) == 1:
+            clock.advance(10.2)
+    # One late sample, then one per interval again rather than a burst catching up
+    assert times == pytest.approx([1, 11.2, 12.2, 13.2])
+
+def test_logger_replay_writes_recorded_speeds(clock, tmp_path, monkeypatch):
+    log_file = tmp_path / 'wind_log.csv'
+    monkeypatch.setattr(wind_logger, 'LOG_FILE', str(log_file))
+    pulses = recorded_train()
+    pi = ReplayPi(clock, pulses, end=12.5)
+
+    wind_logger.main(pi=pi, argv=['--journal', '', '--notify-socket', ''])
+
+    with open(log_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 12
+    for second, row in enumerate(rows, start=1):
+        count, period = expected_sample(pulses, second)
+        assert float(row['1']) == wind_logger.calculate_wind_speed_from_pulses(count, 1)
+        assert float(row['inst']) == round(wind_logger.calculate_instantaneous_speed(period), 2)
+    assert pi.cancelled and pi.stopped
@@ -0,0 +1,12 @@
+import argparse
+
+import stress_wind_history
+
+# Short runs of the stress script; `python3 stress_wind_history.py --seconds 60` for a long one
+SHORT_RUN = argparse.Namespace(seconds=1.5, readers=3, capacity=500, max_batch=50)
+
+def test_shared_ring_readers_never_see_torn_or_reordered_rows():
+    assert stress_wind_history.stress_shared_ring(SHORT_RUN) == []
+
+def test_api_readers_never_see_torn_or_reordered_rows():
+    assert stress_wind_history.stress_snapshots(SHORT_RUN) == []
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Single owner of the anemometer GPIO.
+
+Registers the one pigpio RISING_EDGE callback on the anemometer pin and
+publishes a per-second sample to every local subscriber over a Unix socket,
+one JSON object per line:
+
+    {"time": "2025-06-01 12:00:00", "pulses": 14, "period": 71234}
+
+`pulses` were counted in the last second and `period` is the effective
+microseconds between the latest pulses (None once the cups have stopped);
+converting either to a speed is left to the consumer's calibration.
+
+wind_logger.py, monitor.py and wind_webserver.py read these samples through
+open_samples() instead of each registering their own GPIO callback.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+
+# pigpio is imported only where the GPIO is used, so the logger, monitor and
+# web server can be imported (and tested) on machines without it
+
+PIN = 17
+# pigpio.INPUT and pigpio.RISING_EDGE, so a pigpio-like replay object works without the library
+GPIO_INPUT = 0
+RISING_EDGE = 0
+CAPTURE_SOCKET = "/tmp/wind_capture.sock"
+
+# Seconds between samples
+SAMPLE_INTERVAL = 1.0
+
+# With no pulse for this long the cups are treated as stopped
+STOPPED_AFTER_MICROS = 5_000_000
+
+# Seconds before the first reconnection attempt when the capture daemon is
+# down, doubling per failed attempt up to the maximum
+RECONNECT_SECONDS = 5
+MAX_RECONNECT_SECONDS = 60
+
+def tick_diff(earlier, later):
+    """Microseconds between two pigpio ticks, allowing for the 32-bit wrap every ~72 minutes"""
+    return (later - earlier) & 0xFFFFFFFF
+
+class PulseCounter:
+    """Pulse accumulator fed by the pigpio callback thread.
+
+    The callback and take() share a lock, so pulses that land while the main
+    loop reads the count are carried into the next interval instead of lost.
+    The hardware tick of each pulse is kept to measure the period between the
+    last two pulses, which resolves low wind speeds far better than counts
+    per second.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._last_tick = None
+        self._last_period = None
+
+    def count_pulse(self, gpio, level, tick):
+        """pigpio callback for each rising edge"""
+        if level != 1:
+            # 2 is a watchdog timeout, not a pulse
+            return
+        with self._lock:
+            if self._last_tick is not None:
+                self._last_period = tick_diff(self._last_tick, tick)
+            self._last_tick = tick
+            self._count += 1
+
+    def take(self):
+        """Return the pulses counted since the last call and reset the count"""
+        with self._lock:
+            count = self._count
+            self._count = 0
+        return count
+
+    def pulse_period(self, now_tick):
+        """Microseconds per pulse from the most recent inter-pulse period.
+
+        If the current gap since the last pulse is already longer than that
+        period the cups are slowing, so the gap is used instead; after
+        STOPPED_AFTER_MICROS without a pulse the result is None.
+        """
+        with self._lock:
+            last_tick, period = self._last_tick, self._last_period
+        if last_tick is None or period is None:
+            return None
+
+        gap = tick_diff(last_tick, now_tick)
+        if gap > STOPPED_AFTER_MICROS:
+            return None
+        return max(period, gap)
+
+def pulse_samples(pi, counter, max_samples=None):
+    """Yield one sample per SAMPLE_INTERVAL, scheduled against a monotonic deadline.
+
+    Each deadline is the previous one plus the interval, so processing time
+    does not accumulate into drift. After a long stall (e.g. the Pi was
+    suspended) the schedule restarts from now instead of catching up.
+    """
+    samples = 0
+    next_deadline = time.monotonic() + SAMPLE_INTERVAL
+
+    while max_samples is None or samples < max_samples:
+        delay = next_deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        # Get pulse count for this interval and reset counter
+        pulses = counter.take()
+        period = counter.pulse_period(pi.get_current_tick())
+
+        next_deadline += SAMPLE_INTERVAL
+        if time.monotonic() - next_deadline > SAMPLE_INTERVAL:
+            next_deadline = time.monotonic() + SAMPLE_INTERVAL
+
+        samples += 1
+        yield {'time': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'pulses': pulses, 'period': period}
+
+def local_samples(pi=None):
+    """Samples straight from the GPIO pin, for running without the capture daemon"""
+    if pi is None:
+        import pigpio
+        pi = pigpio.pi()
+    if not pi.connected:
+        raise RuntimeError("Cannot connect to pigpio daemon")
+
+    counter = PulseCounter()
+    pi.set_mode(PIN, GPIO_INPUT)
+    cb = pi.callback(PIN, RISING_EDGE, counter.count_pulse)
+    try:
+        yield from pulse_samples(pi, counter)
+    finally:
+        cb.cancel()
+        pi.stop()
+
+class CapturePublisher:
+    """Unix stream socket that fans each sample out to all connected subscribers"""
+
+    def __init__(self, path=CAPTURE_SOCKET):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        self._server.setblocking(False)
+        self._clients = []
+
+    def _accept_new_clients(self):
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except BlockingIOError:
+                return
+            client.setblocking(False)
+            self._clients.append(client)
+
+    def publish(self, sample):
+        """Send one sample; subscribers that can't keep up are disconnected"""
+        self._accept_new_clients()
+        line = (json.dumps(sample, separators=(',', ':')) + '\n').encode('utf-8')
+
+        for client in list(self._clients):
+            try:
+                if client.send(line) == len(line):
+                    continue
+            except (BlockingIOError, OSError):
+                pass
+            # Partial or failed write: drop it rather than stall everyone else
+            self._clients.remove(client)
+            client.close()
+
+    def subscriber_count(self):
+        return len(self._clients)
+
+    def close(self):
+        for client in self._clients:
+            client.close()
+        self._server.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+def subscribe(path=CAPTURE_SOCKET, reconnect=True):
+    """Yield samples from the capture daemon, waiting for it to start and reconnecting if it restarts"""
+    delay = RECONNECT_SECONDS
+    while True:
+        connected = False
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+            connected = True
+            delay = RECONNECT_SECONDS
+            with sock, sock.makefile('r', encoding='utf-8') as lines:
+                for line in lines:
+                    yield json.loads(line)
+        except (OSError, ValueError) as e:
+            if not reconnect:
+                raise
+            # Report a lost connection, and only the first of a run of failed attempts
+            if connected or delay == RECONNECT_SECONDS:
+                print(f"Wind capture at {path} unavailable, retrying with backoff: {e}")
+        if not reconnect:
+            return
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_SECONDS)
+
+def capture_available(path=CAPTURE_SOCKET):
+    """True if a capture daemon is accepting subscribers (a stale socket file doesn't count)"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+        return True
+    except OSError:
+        return False
+
+def open_samples(source='auto', path=CAPTURE_SOCKET, pi=None):
+    """Per-second samples from the capture daemon ('capture'), the GPIO pin ('local'),
+    or the daemon when its socket exists and the pin otherwise ('auto')"""
+    if pi is not None or source == 'local' or (source == 'auto' and not capture_available(path)):
+        print("Reading anemometer pulses directly from GPIO")
+        return local_samples(pi)
+    print(f"Reading anemometer pulses from capture daemon at {path}")
+    return subscribe(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish anemometer pulse counts to local subscribers.")
+    parser.add_argument('--socket', default=CAPTURE_SOCKET, help="Unix socket to publish on")
+    args = parser.parse_args()
+
+    samples = local_samples()
+    publisher = CapturePublisher(args.socket)
+
+    print(f"Publishing anemometer samples on {args.socket}")
+    try:
+        for sample in samples:
+            publisher.publish(sample)
+    except KeyboardInterrupt:
+        print("Stopped by user.")
+    finally:
+        publisher.close()
+        samples.close()
+
+if __name__ == "__main__":
+    main()
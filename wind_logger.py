@@ -1,11 +1,13 @@
-import pigpio
+import argparse
 import time
 import csv
-import datetime
 import os
-from collections import deque
+from sliding_window import SlidingWindowSums
+from wind_stats import WindStatistics
+from csv_batch_writer import BatchedCsvWriter, datagram_notifier, recover_journal
+from wind_capture import CAPTURE_SOCKET, open_samples
+from metrics import STAGE_SECONDS, EVENTS, PeriodicSaver
 
-PIN = 17
 LOG_FILE = "/home/garges/WindMonitor/wind_log.csv"
 
 PULSES_PER_ROTATION = 20
@@ -13,19 +15,32 @@ MPS_PER_ROTATION = 1.75
 PULSE_TO_MPS = MPS_PER_ROTATION / PULSES_PER_ROTATION
 MPS_TO_MPH = 2.23694
 
-# Time windows in seconds
-TIME_WINDOWS = [1, 5, 10, 30, 60]
+# Time windows in seconds (any length; each costs O(1) per second)
+TIME_WINDOWS = [1, 5, 10, 30, 60, 600, 3600]
 
-# Keep track of pulse counts for each second (need 60 seconds max)
-pulse_history = deque(maxlen=60)
+# Rows are buffered and written to the SD card once per batch
+FLUSH_INTERVAL = 10
+# Rows not yet flushed are also journalled to RAM, so a crash of this process loses nothing
+JOURNAL_FILE = "/dev/shm/wind_log.journal"
+# The web server listens here to learn about new batches instead of polling the file size
+NOTIFY_SOCKET = "/tmp/wind_log.sock"
+# Seconds between printed write counters
+STATS_INTERVAL = 3600
 
-# Counter for pulses in current second
-pulse_count = 0
+# Running pulse totals for every time window
+pulse_history = SlidingWindowSums(TIME_WINDOWS)
 
-def count_pulse(gpio, level, tick):
-    """Callback for each pulse - increment counter"""
-    global pulse_count
-    pulse_count += 1
+# Meteorological statistics (peak 3 second gust, standard deviation, turbulence
+# intensity and percentiles) over the last STATS_WINDOW seconds
+STATS_WINDOW = 600
+STATS_COLUMNS = ['gust', 'stddev', 'turbulence', 'p50', 'p90']
+wind_statistics = WindStatistics(STATS_WINDOW, gust_seconds=3, percentiles=(0.5, 0.9))
+
+def calculate_instantaneous_speed(period_micros):
+    """Wind speed (mph) from the microseconds between the latest pulses; 0 once the cups have stopped"""
+    if not period_micros:
+        return 0.0
+    return calculate_wind_speed_from_pulses(1, period_micros / 1_000_000)
 
 def calculate_wind_speed_from_pulses(total_pulses, time_seconds):
     """Calculate wind speed from total pulses over time period"""
@@ -42,16 +57,44 @@ def calculate_window_speeds():
     speeds = {}
     
     for window in TIME_WINDOWS:
-        if len(pulse_history) >= window:
-            # Sum pulses from the last 'window' seconds
-            total_pulses = sum(list(pulse_history)[-window:])
+        # Sum pulses from the last 'window' seconds (None until there is enough data)
+        total_pulses = pulse_history.sum(window)
+        if total_pulses is not None:
             speeds[window] = calculate_wind_speed_from_pulses(total_pulses, window)
         else:
-            # Not enough data yet
             speeds[window] = None
     
     return speeds
 
+def calculate_statistics():
+    """Wind statistics in mph (turbulence intensity stays a ratio), None until the window fills"""
+    results = wind_statistics.results()
+    stats = {}
+    for column in STATS_COLUMNS:
+        value = results[column]
+        if value is None:
+            stats[column] = None
+        elif column == 'turbulence':
+            stats[column] = round(value, 3)
+        else:
+            stats[column] = calculate_wind_speed_from_pulses(value, 1)
+    return stats
+
+def csv_headers():
+    """Column names of the wind log"""
+    return ['time'] + [str(w) for w in TIME_WINDOWS] + ['inst'] + STATS_COLUMNS
+
+def rewrite_csv_header(headers):
+    """Rewrite an existing log under a new header, moving every value to its column by name"""
+    temp_name = LOG_FILE + '.tmp'
+    with open(LOG_FILE, 'r', newline='') as src, open(temp_name, 'w', newline='') as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=headers, restval='', extrasaction='ignore')
+        writer.writeheader()
+        for row in reader:
+            writer.writerow(row)
+    os.replace(temp_name, LOG_FILE)
+
 def initialize_csv():
     """Create CSV file with headers if it doesn't exist"""
     try:
@@ -61,7 +104,12 @@ def initialize_csv():
                 first_line = f.readline().strip()
                 # Check if first line looks like headers (contains 'time')
                 if first_line and 'time' in first_line:
-                    print(f"CSV file already exists with headers: {LOG_FILE}")
+                    if first_line.split(',') != csv_headers():
+                        # Columns are matched by name, so older rows just get blanks for new ones
+                        print(f"CSV header changed, updating it in place: {LOG_FILE}")
+                        rewrite_csv_header(csv_headers())
+                    else:
+                        print(f"CSV file already exists with headers: {LOG_FILE}")
                     return
                 else:
                     print(f"CSV file exists but missing headers, backing up and recreating: {LOG_FILE}")
@@ -72,71 +120,109 @@ def initialize_csv():
         # Create new file with headers
         with open(LOG_FILE, 'w', newline='') as f:
             writer = csv.writer(f)
-            headers = ['time'] + [str(w) for w in TIME_WINDOWS]
-            writer.writerow(headers)
+            writer.writerow(csv_headers())
         print(f"Created new CSV file with headers: {LOG_FILE}")
         
     except Exception as e:
         print(f"Error initializing CSV file: {e}")
         raise
 
-def main():
-    global pulse_count
+def log_wind(samples, writer, max_rows=None):
+    """Write one row per per-second sample (see wind_capture.open_samples)"""
+    rows = 0
+    next_stats = time.monotonic() + STATS_INTERVAL
+    save_metrics = PeriodicSaver('wind_logger')
     
-    pi = pigpio.pi()
-    if not pi.connected:
-        raise RuntimeError("Cannot connect to pigpio daemon")
+    for sample in samples:
+        started = time.perf_counter()
+        current_pulses = sample['pulses']
+        inst_speed = calculate_instantaneous_speed(sample['period'])
+        
+        # Add to history
+        pulse_history.add(current_pulses)
+        wind_statistics.add(current_pulses)
+        
+        # Calculate wind speeds for all windows
+        window_speeds = calculate_window_speeds()
+        stats = calculate_statistics()
+        
+        # Prepare CSV row
+        timestamp = sample['time']
+        row = [timestamp]
+        
+        for window in TIME_WINDOWS:
+            speed = window_speeds[window]
+            row.append(speed if speed is not None else '')
+        row.append(round(inst_speed, 2))
+        for column in STATS_COLUMNS:
+            row.append(stats[column] if stats[column] is not None else '')
+        
+        # Queue for the CSV (written out per batch)
+        writer.writerow(row)
+        rows += 1
+        STAGE_SECONDS.observe(time.perf_counter() - started, process='wind_logger', stage='row')
+        EVENTS.inc(process='wind_logger', stage='row', outcome='written')
+        save_metrics()
+        
+        if time.monotonic() >= next_stats:
+            next_stats += STATS_INTERVAL
+            print(f"{timestamp} - CSV writer: {writer.stats}")
+        
+        # Print current status (optional - remove if too verbose)
+        valid_speeds = {k: v for k, v in window_speeds.items() if v is not None}
+        if valid_speeds:
+            speed_str = ", ".join([f"{k}s: {v}mph" for k, v in valid_speeds.items()])
+            print(f"{timestamp} - {speed_str}, inst: {inst_speed:.2f}mph")
+        
+        if max_rows is not None and rows >= max_rows:
+            break
+
+def main(pi=None, argv=None):
+    """Run the logger; pass a pigpio-like object to replay recorded ticks instead of GPIO or the capture daemon"""
+    parser = argparse.ArgumentParser(description="Log anemometer wind speeds to CSV.")
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL, help="Seconds between CSV writes")
+    parser.add_argument('--batch-size', type=int, default=None, help="Also write once this many rows are pending")
+    parser.add_argument('--journal', default=JOURNAL_FILE, help="RAM journal of unflushed rows ('' to disable)")
+    parser.add_argument('--notify-socket', default=NOTIFY_SOCKET, help="Unix socket to ping after each batch ('' to disable)")
+    parser.add_argument('--fsync', action='store_true', help="fsync the CSV after every batch")
+    parser.add_argument('--source', choices=['auto', 'local', 'capture'], default='auto',
+                        help="Pulses from wind_capture.py, the GPIO pin, or the daemon if it is running")
+    parser.add_argument('--capture-socket', default=CAPTURE_SOCKET, help="Socket wind_capture.py publishes on")
+    args = parser.parse_args(argv)
 
-    pi.set_mode(PIN, pigpio.INPUT)
-    cb = pi.callback(PIN, pigpio.RISING_EDGE, count_pulse)
+    samples = open_samples(args.source, args.capture_socket, pi)
 
     # Initialize CSV file
     initialize_csv()
+    
+    replayed = recover_journal(LOG_FILE, args.journal)
+    if replayed:
+        print(f"Recovered {replayed} unflushed rows from {args.journal}")
+
+    hooks = [datagram_notifier(args.notify_socket)] if args.notify_socket else []
+    writer = None
 
     try:
         with open(LOG_FILE, "a", newline='') as f:
-            writer = csv.writer(f)
+            writer = BatchedCsvWriter(f, flush_interval=args.flush_interval, batch_size=args.batch_size,
+                                      journal_path=args.journal or None, fsync=args.fsync, on_flush=hooks,
+                                      name='wind_logger')
             
             print("Starting wind monitoring...")
             print(f"Time windows: {TIME_WINDOWS} seconds")
-            print(f"Logging to: {LOG_FILE}")
+            print(f"Logging to: {LOG_FILE} (every {args.flush_interval}s)")
             
-            while True:
-                time.sleep(1)
-                
-                # Get pulse count for this second and reset counter
-                current_pulses = pulse_count
-                pulse_count = 0
-                
-                # Add to history
-                pulse_history.append(current_pulses)
-                
-                # Calculate wind speeds for all windows
-                window_speeds = calculate_window_speeds()
-                
-                # Prepare CSV row
-                timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                row = [timestamp]
-                
-                for window in TIME_WINDOWS:
-                    speed = window_speeds[window]
-                    row.append(speed if speed is not None else '')
-                
-                # Write to CSV
-                writer.writerow(row)
-                f.flush()
-                
-                # Print current status (optional - remove if too verbose)
-                valid_speeds = {k: v for k, v in window_speeds.items() if v is not None}
-                if valid_speeds:
-                    speed_str = ", ".join([f"{k}s: {v}mph" for k, v in valid_speeds.items()])
-                    print(f"{timestamp} - {speed_str}")
+            try:
+                log_wind(samples, writer)
+            finally:
+                writer.close()
                 
     except KeyboardInterrupt:
         print("\nStopping wind monitor...")
     finally:
-        cb.cancel()
-        pi.stop()
+        if writer:
+            print(f"CSV writer: {writer.stats}")
+        samples.close()
 
 if __name__ == "__main__":
     main()
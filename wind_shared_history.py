@@ -0,0 +1,202 @@
+import calendar
+import math
+import mmap
+import os
+import struct
+import time
+
+# A single ingest process appends wind history rows to a memory-mapped ring
+# (normally under /dev/shm) and any number of read-only web workers serve from
+# it, so the CSV is parsed once and the history is held in memory once.
+#
+# Layout:
+#   header  (64 bytes)   magic, version, sequence, count, capacity, record size, field count
+#   fields  (192 bytes)  comma-separated field names, e.g. "1s,5s,10s,30s,60s"
+#   records (capacity * record size)  uint32 time + one float32 per field (NaN = missing)
+#
+# The sequence number is a seqlock: the writer makes it odd before touching the
+# ring and even again afterwards. Readers copy what they need and retry if the
+# sequence was odd or changed underneath them, so they never block the writer.
+# Record times are logged wall-clock seconds encoded as if they were UTC.
+
+MAGIC = b'WNDH'
+VERSION = 1
+HEADER_FORMAT = '<4sIQQIII'
+HEADER_SIZE = 64
+FIELDS_SIZE = 192
+DATA_OFFSET = HEADER_SIZE + FIELDS_SIZE
+SEQUENCE_OFFSET = 8
+COUNT_OFFSET = 16
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Attempts before a reader gives up on a ring that keeps changing
+MAX_READ_RETRIES = 100
+
+def record_format(n_fields):
+    return '<I' + 'f' * n_fields
+
+def time_to_seconds(time_string):
+    return calendar.timegm(time.strptime(time_string, TIME_FORMAT))
+
+def seconds_to_time(seconds):
+    return time.strftime(TIME_FORMAT, time.gmtime(seconds))
+
+class SharedHistoryWriter:
+    """Owner of the shared ring; only the ingest process creates one"""
+
+    def __init__(self, path, fields, capacity):
+        self.fields = list(fields)
+        self.capacity = capacity
+        self._format = record_format(len(self.fields))
+        self._record_size = struct.calcsize(self._format)
+        self._sequence = 0
+        self._count = 0
+
+        field_names = ','.join(self.fields).encode('ascii')
+        if len(field_names) > FIELDS_SIZE:
+            raise ValueError(f"Too many fields for the shared history header: {self.fields}")
+
+        # Build the new segment beside the old one and rename it into place, so
+        # readers holding the previous mapping keep a consistent (if stale) view
+        size = DATA_OFFSET + capacity * self._record_size
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.truncate(size)
+        self._file = open(temp_path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        struct.pack_into(HEADER_FORMAT, self._mm, 0, MAGIC, VERSION, 0, 0,
+                         capacity, self._record_size, len(self.fields))
+        self._mm[HEADER_SIZE:HEADER_SIZE + len(field_names)] = field_names
+        os.replace(temp_path, path)
+
+    def append(self, entries):
+        """Append web-server style entry dicts ({'time': ..., '1s': ...}) to the ring"""
+        if not entries:
+            return
+
+        # Only the newest `capacity` entries can survive the write anyway
+        entries = entries[-self.capacity:]
+
+        self._sequence += 1
+        struct.pack_into('<Q', self._mm, SEQUENCE_OFFSET, self._sequence)
+        for entry in entries:
+            try:
+                seconds = time_to_seconds(entry['time'])
+            except ValueError:
+                continue
+            values = [math.nan if entry.get(field) is None else entry[field] for field in self.fields]
+            offset = DATA_OFFSET + (self._count % self.capacity) * self._record_size
+            struct.pack_into(self._format, self._mm, offset, seconds, *values)
+            self._count += 1
+        struct.pack_into('<Q', self._mm, COUNT_OFFSET, self._count)
+        self._sequence += 1
+        struct.pack_into('<Q', self._mm, SEQUENCE_OFFSET, self._sequence)
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+class SharedHistoryReader:
+    """Read-only view of the shared ring for web workers"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._inode = os.stat(path).st_ino
+
+        magic, version, _, _, capacity, record_size, n_fields = struct.unpack_from(HEADER_FORMAT, self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} wind history segment")
+
+        self.capacity = capacity
+        self.fields = self._mm[HEADER_SIZE:HEADER_SIZE + FIELDS_SIZE].rstrip(b'\0').decode('ascii').split(',')
+        self._format = record_format(n_fields)
+        self._record_size = record_size
+
+    def is_replaced(self):
+        """True once the ingest process has restarted and published a new segment"""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return False
+
+    def sequence(self):
+        return struct.unpack_from('<Q', self._mm, SEQUENCE_OFFSET)[0]
+
+    def count(self):
+        """Total number of records ever appended (monotonic, used as a cursor)"""
+        return self._consistent(lambda: struct.unpack_from('<Q', self._mm, COUNT_OFFSET)[0])
+
+    def _consistent(self, read):
+        for _ in range(MAX_READ_RETRIES):
+            before = self.sequence()
+            if before & 1:
+                time.sleep(0.001)
+                continue
+            result = read()
+            if self.sequence() == before:
+                return result
+        raise RuntimeError("Shared wind history kept changing while being read")
+
+    def _time_at(self, index):
+        offset = DATA_OFFSET + (index % self.capacity) * self._record_size
+        return struct.unpack_from('<I', self._mm, offset)[0]
+
+    def _copy_range(self, start, end):
+        """Copy the raw bytes of logical records [start, end), handling ring wrap-around"""
+        chunks = []
+        index = start
+        while index < end:
+            slot = index % self.capacity
+            n = min(end - index, self.capacity - slot)
+            offset = DATA_OFFSET + slot * self._record_size
+            chunks.append(self._mm[offset:offset + n * self._record_size])
+            index += n
+        return b''.join(chunks)
+
+    def _decode(self, data):
+        entries = []
+        for record in struct.iter_unpack(self._format, data):
+            entry = {'time': seconds_to_time(record[0])}
+            for field, value in zip(self.fields, record[1:]):
+                entry[field] = None if math.isnan(value) else round(value, 2)
+            entries.append(entry)
+        return entries
+
+    def read_since(self, cursor, limit=None):
+        """Return (entries appended after cursor, new cursor); skipped if overwritten"""
+        def read():
+            count = struct.unpack_from('<Q', self._mm, COUNT_OFFSET)[0]
+            start = max(cursor, count - self.capacity)
+            if limit is not None:
+                start = max(start, count - limit)
+            return self._copy_range(start, count), count
+        data, count = self._consistent(read)
+        return self._decode(data), count
+
+    def read_last_minutes(self, minutes):
+        """Return entries no older than N minutes before the newest one"""
+        def read():
+            count = struct.unpack_from('<Q', self._mm, COUNT_OFFSET)[0]
+            lo = max(0, count - self.capacity)
+            if count == lo:
+                return b''
+            cutoff = self._time_at(count - 1) - minutes * 60
+
+            # Records are in time order, so binary search for the first one in range
+            hi = count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._time_at(mid) < cutoff:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            return self._copy_range(lo, count)
+        return self._decode(self._consistent(read))
+
+    def latest(self):
+        """Return the newest entry, or None if nothing has been published yet"""
+        entries, _ = self.read_since(0, limit=1)
+        return entries[-1] if entries else None
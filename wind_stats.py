@@ -0,0 +1,157 @@
+import math
+from collections import deque
+
+# Incremental wind statistics over a rolling window of per-second pulse counts.
+# Every structure is updated in O(1) or O(log n) per second and none of them
+# rescans the window, so the logger can publish them every row.
+
+class RollingMax:
+    """Maximum of the last N values using a monotonic deque (amortised O(1))"""
+
+    def __init__(self, size):
+        self.size = size
+        self._index = 0
+        self._candidates = deque()  # (index, value) with strictly decreasing values
+
+    def add(self, value):
+        while self._candidates and self._candidates[-1][1] <= value:
+            self._candidates.pop()
+        self._candidates.append((self._index, value))
+        if self._candidates[0][0] <= self._index - self.size:
+            self._candidates.popleft()
+        self._index += 1
+
+    def max(self):
+        return self._candidates[0][1] if self._candidates else None
+
+class RollingMoments:
+    """Mean and variance of the last N values with Welford's update and its inverse for removal"""
+
+    def __init__(self, size):
+        self.size = size
+        self._values = deque()
+        self._mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        if len(self._values) == self.size:
+            self._remove(self._values.popleft())
+        self._values.append(value)
+        n = len(self._values)
+        delta = value - self._mean
+        self._mean += delta / n
+        self._m2 += delta * (value - self._mean)
+
+    def _remove(self, value):
+        n = len(self._values)
+        if n == 0:
+            self._mean, self._m2 = 0.0, 0.0
+            return
+        old_mean = self._mean
+        self._mean = (old_mean * (n + 1) - value) / n
+        self._m2 -= (value - old_mean) * (value - self._mean)
+        # Guard against tiny negative values from rounding
+        self._m2 = max(self._m2, 0.0)
+
+    def count(self):
+        return len(self._values)
+
+    def mean(self):
+        return self._mean if self._values else None
+
+    def stddev(self):
+        n = len(self._values)
+        if n < 2:
+            return None
+        return math.sqrt(self._m2 / (n - 1))
+
+class RollingQuantiles:
+    """Rolling percentiles of small non-negative integers (pulses per second).
+
+    A Fenwick tree over value bins holds the window's histogram: one counter
+    per possible value, with anything above max_value sharing the top bin, so
+    memory is fixed regardless of the window length. Adding, expiring and
+    querying a quantile are all O(log max_value).
+    """
+
+    def __init__(self, size, max_value=1023):
+        self.size = size
+        self._bins = max_value + 1
+        self._tree = [0] * (self._bins + 1)
+        self._values = deque()
+        self._top_bit = 1 << (self._bins.bit_length() - 1)
+
+    def _update(self, value, delta):
+        i = min(max(int(value), 0), self._bins - 1) + 1
+        while i <= self._bins:
+            self._tree[i] += delta
+            i += i & -i
+
+    def add(self, value):
+        if len(self._values) == self.size:
+            self._update(self._values.popleft(), -1)
+        self._values.append(value)
+        self._update(value, 1)
+
+    def quantile(self, q):
+        """Smallest value v such that at least q of the window is <= v"""
+        n = len(self._values)
+        if n == 0:
+            return None
+        target = max(1, math.ceil(q * n))
+
+        # Binary lifting down the tree to the first bin whose cumulative count reaches target
+        position = 0
+        step = self._top_bit
+        while step:
+            nxt = position + step
+            if nxt <= self._bins and self._tree[nxt] < target:
+                position = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return position
+
+class WindStatistics:
+    """Gust, variability and percentile statistics over a rolling window of pulse counts.
+
+    Results are in pulses per second (turbulence intensity is a ratio) and are
+    None until the window has filled, like the long averaging windows.
+    """
+
+    def __init__(self, window=600, gust_seconds=3, percentiles=(0.5, 0.9)):
+        self.window = window
+        self.gust_seconds = gust_seconds
+        self.percentiles = percentiles
+        self._gust_sum = 0
+        self._gust_values = deque()
+        self._gusts = RollingMax(window)
+        self._moments = RollingMoments(window)
+        self._quantiles = RollingQuantiles(window)
+
+    def add(self, pulses):
+        """Feed the pulse count of the latest second"""
+        self._gust_values.append(pulses)
+        self._gust_sum += pulses
+        if len(self._gust_values) > self.gust_seconds:
+            self._gust_sum -= self._gust_values.popleft()
+        if len(self._gust_values) == self.gust_seconds:
+            self._gusts.add(self._gust_sum / self.gust_seconds)
+
+        self._moments.add(pulses)
+        self._quantiles.add(pulses)
+
+    def results(self):
+        """Current statistics, keyed gust, stddev, turbulence and p50/p90..."""
+        results = {'gust': None, 'stddev': None, 'turbulence': None}
+        results.update({f"p{round(q * 100)}": None for q in self.percentiles})
+        if self._moments.count() < self.window:
+            return results
+
+        mean = self._moments.mean()
+        stddev = self._moments.stddev()
+        results['gust'] = self._gusts.max()
+        results['stddev'] = stddev
+        results['turbulence'] = stddev / mean if mean else None
+        for q in self.percentiles:
+            results[f"p{round(q * 100)}"] = self._quantiles.quantile(q)
+        return results
@@ -1,30 +1,104 @@
+import argparse
 import csv
+import json
 import time
 import os
-from collections import deque
-from flask import Flask, render_template_string, jsonify, send_from_directory, url_for, request
+import calendar
+import bisect
+import itertools
+from collections import namedtuple
+from flask import Flask, render_template_string, jsonify, send_from_directory, url_for, request, Response
 import threading
 import datetime
+from event_stream import EventBroadcaster, SSE_HEADERS
+from http_compression import compressed_response, streamed_response, PrecompressedBody
+from log_export import EXPORT_FORMATS, chunked, iter_records, ndjson_line, parse_time_bound
+from static_assets import StaticAssets, CHART_JS
+from wind_shared_history import SharedHistoryReader, SharedHistoryWriter
+from csv_batch_writer import bind_notify_socket, wait_for_notification
+from sliding_window import SlidingWindowSums
+from wind_capture import CAPTURE_SOCKET as DEFAULT_CAPTURE_SOCKET, subscribe
+from wind_logger import calculate_wind_speed_from_pulses, calculate_instantaneous_speed
+from downsample import DEFAULT_POINTS, downsample_indices, parse_points
+from metrics import STAGE_SECONDS, EVENTS, PeriodicSaver, instrument_app
 
 app = Flask(__name__, 
             static_folder='/home/garges/WindMonitor/static',
             static_url_path='/static')
+# Per-endpoint request timing and the /metrics endpoint
+instrument_app(app, 'wind_webserver')
 
 # Create static directory if needed
 os.makedirs('/home/garges/WindMonitor/static', exist_ok=True)
+# Favicon, roof GIF and Chart.js under content-hashed immutable URLs
+assets = StaticAssets(app, app.static_folder)
 
 # Configuration
 LOG_FILE = "/home/garges/WindMonitor/wind_log.csv"
-TIME_WINDOWS = [1, 5, 10, 30, 60]
+TIME_WINDOWS = [1, 5, 10, 30, 60, 600, 3600]
 GRAPH_HISTORY_MINUTES = 60
 
+# 10 minute statistics written by wind_logger.py (gust, standard deviation,
+# turbulence intensity and percentiles); mph except turbulence, a ratio
+STATS_FIELDS = ['gust', 'stddev', 'turbulence', 'p50', 'p90']
+
+# Every numeric value kept per entry, as (entry key, CSV column)
+DATA_FIELDS = [(f"{w}s", str(w)) for w in TIME_WINDOWS] + [(field, field) for field in STATS_FIELDS]
+
 # Keep up to 3 days of data in memory (4320 minutes = 259200 seconds)
 MAX_HISTORY_SECONDS = 259200
 
-# Global data storage
-log_entries = deque(maxlen=MAX_HISTORY_SECONDS)  # Each entry is a dict with time and wind speeds
-current_data = {f"{w}s": 0.0 for w in TIME_WINDOWS}
-current_data["last_updated"] = ""
+# History is kept in chunks of this many entries so a new snapshot only copies the last chunk
+HISTORY_CHUNK_SIZE = 3600
+
+# Window whose shape decides which rows a downsampled columnar history keeps
+DOWNSAMPLE_KEY = f"{TIME_WINDOWS[0]}s"
+
+# Immutable view of everything the request handlers serve. The ingest thread
+# builds a new one per batch and publishes it with a single reference swap, so
+# readers never take a lock and never see a half-applied update. Entry dicts
+# and `current` are never modified once published.
+WindSnapshot = namedtuple('WindSnapshot', ['version', 'chunks', 'size', 'current'])
+
+# Entries retained in memory (may overshoot by up to one chunk)
+history_retention = MAX_HISTORY_SECONDS
+
+initial_current = {f"{w}s": 0.0 for w in TIME_WINDOWS}
+initial_current.update({field: None for field in STATS_FIELDS})
+initial_current["last_updated"] = ""
+snapshot = WindSnapshot(0, (), 0, initial_current)
+
+# Pushes newly ingested rows to every open dashboard
+wind_events = EventBroadcaster()
+
+# Larger batches (e.g. the initial file load) tell clients to refetch instead
+MAX_STREAMED_ENTRIES = 60
+
+# wind_logger.py pings this socket after each CSV batch, so the ingest thread
+# sleeps until there is new data instead of checking the file size every second
+NOTIFY_SOCKET = os.environ.get('WIND_NOTIFY_SOCKET', "/tmp/wind_log.sock")
+# Check the file anyway this often, in case a notification was missed
+NOTIFY_FALLBACK_SECONDS = 30
+
+# Production mode: a single `--ingest-only` process parses the CSV and publishes
+# history into this shared-memory segment, and any number of WSGI workers
+# (e.g. gunicorn -w 4 wind_webserver:app) serve read-only from it
+SHARED_HISTORY_PATH = os.environ.get('WIND_SHARED_HISTORY')
+shared_writer = None
+shared_reader = None
+
+# Live readings straight from wind_capture.py, which are up to a CSV batch ahead
+# of the log. Published by reference swap as (monotonic time, readings) and
+# overlaid on the current readings while fresh.
+CAPTURE_SOCKET = os.environ.get('WIND_CAPTURE_SOCKET', DEFAULT_CAPTURE_SOCKET)
+LIVE_MAX_AGE_SECONDS = 5
+live_current = None
+
+# Set in --ingest-only mode, which serves no /metrics of its own
+ingest_metrics_saver = None
+
+_threads_started = False
+_threads_lock = threading.Lock()
 
 def read_csv_file():
     """Read the CSV file and return new entries since last read"""
@@ -33,20 +107,21 @@ def read_csv_file():
             return []
         
         new_entries = []
-        last_known_time = log_entries[-1]['time'] if log_entries else ""
+        latest_entry = get_latest_entry(snapshot)
+        last_known_time = latest_entry['time'] if latest_entry else ""
         
         with open(LOG_FILE, 'r', newline='') as f:
             reader = csv.DictReader(f)
             for row in reader:
                 # Only add if we haven't seen this timestamp before
                 if row['time'] > last_known_time:
-                    # Convert wind speeds to float, handling empty values
+                    # Convert wind speeds and statistics to float, handling empty values
                     entry = {'time': row['time']}
-                    for window in TIME_WINDOWS:
+                    for key, column in DATA_FIELDS:
                         try:
-                            entry[f"{window}s"] = float(row[str(window)]) if row[str(window)] else None
-                        except (ValueError, KeyError):
-                            entry[f"{window}s"] = None
+                            entry[key] = float(row[column]) if row[column] else None
+                        except (ValueError, KeyError, TypeError):
+                            entry[key] = None
                     new_entries.append(entry)
         
         return new_entries
@@ -54,9 +129,54 @@ def read_csv_file():
         print(f"Error reading CSV file: {e}")
         return []
 
+def get_latest_entry(snap):
+    """Newest entry of a snapshot, or None if it is empty"""
+    return snap.chunks[-1][-1] if snap.chunks else None
+
+def build_snapshot(old, new_entries):
+    """Return a new snapshot with new_entries appended, sharing all full chunks with old"""
+    chunks = list(old.chunks)
+    size = old.size
+    
+    # Only the partially filled last chunk is copied
+    pending = list(new_entries)
+    if chunks and len(chunks[-1]) < HISTORY_CHUNK_SIZE:
+        tail = chunks.pop()
+        size -= len(tail)
+        pending = list(tail) + pending
+    for start in range(0, len(pending), HISTORY_CHUNK_SIZE):
+        chunk = tuple(pending[start:start + HISTORY_CHUNK_SIZE])
+        chunks.append(chunk)
+        size += len(chunk)
+    
+    # Drop whole chunks once the rest still covers the retention period
+    drop = 0
+    while drop < len(chunks) - 1 and size - len(chunks[drop]) >= history_retention:
+        size -= len(chunks[drop])
+        drop += 1
+    chunks = chunks[drop:]
+    
+    # Update current data with most recent valid values
+    current = dict(old.current)
+    if chunks:
+        latest_entry = chunks[-1][-1]
+        for key, _ in DATA_FIELDS:
+            if latest_entry[key] is not None:
+                current[key] = latest_entry[key]
+        current["last_updated"] = latest_entry['time']
+    
+    return WindSnapshot(old.version + 1, tuple(chunks), size, current)
+
+def publish_entries(new_entries):
+    """Publish a new snapshot; only the ingest thread calls this"""
+    global snapshot
+    snapshot = build_snapshot(snapshot, new_entries)
+    return snapshot
+
 def update_data_from_csv():
     """Continuously read CSV file and update current data"""
     last_file_size = 0
+    notify_socket = bind_notify_socket(NOTIFY_SOCKET) if NOTIFY_SOCKET else None
     
     while True:
         try:
@@ -65,47 +185,177 @@ def update_data_from_csv():
                 current_size = os.path.getsize(LOG_FILE)
                 if current_size != last_file_size:
                     # Read new entries
-                    new_entries = read_csv_file()
+                    with STAGE_SECONDS.time(process='wind_webserver', stage='csv_ingest'):
+                        new_entries = read_csv_file()
                     
-                    # Add new entries to our deque
-                    for entry in new_entries:
-                        log_entries.append(entry)
-                    
-                    # Update current data with most recent valid values
-                    if log_entries:
-                        latest_entry = log_entries[-1]
-                        for window in TIME_WINDOWS:
-                            window_key = f"{window}s"
-                            if latest_entry[window_key] is not None:
-                                current_data[window_key] = latest_entry[window_key]
+                    if new_entries:
+                        with STAGE_SECONDS.time(process='wind_webserver', stage='publish_snapshot'):
+                            snap = publish_entries(new_entries)
+                        EVENTS.inc(len(new_entries), process='wind_webserver', stage='csv_ingest', outcome='rows')
+                        
+                        if shared_writer:
+                            with STAGE_SECONDS.time(process='wind_webserver', stage='shared_append'):
+                                shared_writer.append(new_entries)
                         
-                        current_data["last_updated"] = latest_entry['time']
+                        # Publish once from here; every subscriber gets the same encoded event
+                        if len(new_entries) <= MAX_STREAMED_ENTRIES:
+                            wind_events.publish('update', {'current': with_live_readings(snap.current), 'entries': new_entries})
+                        else:
+                            wind_events.publish('reload', {'current': with_live_readings(snap.current)})
                     
                     last_file_size = current_size
             
         except Exception as e:
             print(f"Error updating data from CSV: {e}")
         
-        time.sleep(1)  # Check for updates every second
+        if ingest_metrics_saver:
+            ingest_metrics_saver()
+        
+        if notify_socket:
+            wait_for_notification(notify_socket, NOTIFY_FALLBACK_SECONDS)
+        else:
+            time.sleep(1)  # Check for updates every second
 
-def get_history_data_for_minutes(minutes):
-    """Get history data for the specified number of minutes"""
-    if not log_entries:
-        return {f"{w}s": [] for w in TIME_WINDOWS}
+def get_shared_reader():
+    """Open the shared history segment, reopening it if the ingest process restarted"""
+    global shared_reader
+    if shared_reader is None or shared_reader.is_replaced():
+        try:
+            shared_reader = SharedHistoryReader(SHARED_HISTORY_PATH)
+        except (OSError, ValueError) as e:
+            print(f"Shared history not available yet: {e}")
+            return None
+    return shared_reader
+
+def current_from_entry(entry):
+    """Build an /api/current payload from a single history entry"""
+    data = dict(initial_current)
+    if entry:
+        for key, _ in DATA_FIELDS:
+            if entry.get(key) is not None:
+                data[key] = entry[key]
+        data["last_updated"] = entry['time']
+    return data
+
+def get_current_snapshot():
+    """Current readings from this process or, in worker mode, from the shared segment"""
+    if SHARED_HISTORY_PATH:
+        reader = get_shared_reader()
+        return with_live_readings(current_from_entry(reader.latest() if reader else None))
+    return with_live_readings(snapshot.current)
+
+def with_live_readings(current):
+    """Overlay the capture daemon's readings while they are fresh"""
+    live = live_current
+    if live and time.monotonic() - live[0] < LIVE_MAX_AGE_SECONDS:
+        return dict(current, **live[1])
+    return current
+
+def watch_live_capture():
+    """Keep per-window speeds from the capture daemon's per-second pulse counts"""
+    global live_current
+    pulse_sums = SlidingWindowSums(TIME_WINDOWS)
+    
+    for sample in subscribe(CAPTURE_SOCKET):
+        try:
+            pulse_sums.add(sample['pulses'])
+            live = {'inst': round(calculate_instantaneous_speed(sample['period']), 2),
+                    'last_updated': sample['time']}
+            # Windows that haven't filled since this process started keep the logged value
+            for window, pulses in pulse_sums.sums().items():
+                if pulses is not None:
+                    live[f"{window}s"] = calculate_wind_speed_from_pulses(pulses, window)
+            
+            live_current = (time.monotonic(), live)
+            wind_events.publish('live', live)
+        except Exception as e:
+            print(f"Error reading live capture sample: {e}")
+
+def watch_shared_history():
+    """Worker-mode event producer: publish rows the ingest process appended"""
+    cursor = None
+    
+    while True:
+        try:
+            reader = get_shared_reader()
+            if reader:
+                count = reader.count()
+                if cursor is None:
+                    cursor = count
+                elif count < cursor:
+                    # Ingest restarted with a fresh segment
+                    cursor = count
+                    wind_events.publish('reload', {'current': get_current_snapshot()})
+                elif count > cursor:
+                    if count - cursor <= MAX_STREAMED_ENTRIES:
+                        new_entries, cursor = reader.read_since(cursor)
+                        wind_events.publish('update', {'current': get_current_snapshot(), 'entries': new_entries})
+                    else:
+                        cursor = count
+                        wind_events.publish('reload', {'current': get_current_snapshot()})
+        except Exception as e:
+            print(f"Error watching shared history: {e}")
+        
+        time.sleep(1)
+
+def start_background_threads():
+    """Start this process's data thread once (also under a WSGI server, on first request)"""
+    global _threads_started
+    with _threads_lock:
+        if _threads_started:
+            return
+        _threads_started = True
+    
+    target = watch_shared_history if SHARED_HISTORY_PATH else update_data_from_csv
+    threading.Thread(target=target, daemon=True).start()
+    
+    # Always watch: the capture daemon may start after the web server, and
+    # subscribe() keeps retrying with a backoff until it does
+    threading.Thread(target=watch_live_capture, daemon=True).start()
+
+@app.before_request
+def ensure_background_threads():
+    if not _threads_started:
+        start_background_threads()
+
+def get_entries_for_minutes(minutes):
+    """Return the log entries from the last N minutes of data"""
+    if SHARED_HISTORY_PATH:
+        reader = get_shared_reader()
+        return reader.read_last_minutes(minutes) if reader else []
+    
+    # Work from one snapshot for the whole request
+    snap = snapshot
+    latest_entry = get_latest_entry(snap)
+    if not latest_entry:
+        return []
     
     # Calculate cutoff time
     try:
-        latest_time = datetime.datetime.strptime(log_entries[-1]['time'], "%Y-%m-%d %H:%M:%S")
+        latest_time = datetime.datetime.strptime(latest_entry['time'], "%Y-%m-%d %H:%M:%S")
         cutoff_time = latest_time - datetime.timedelta(minutes=minutes)
         cutoff_str = cutoff_time.strftime("%Y-%m-%d %H:%M:%S")
-    except:
+    except ValueError:
         # Fallback: just use the last N entries
         max_entries = minutes * 60
-        relevant_entries = list(log_entries)[-max_entries:] if len(log_entries) > max_entries else list(log_entries)
-        cutoff_str = relevant_entries[0]['time'] if relevant_entries else ""
+        return list(itertools.chain.from_iterable(snap.chunks))[-max_entries:]
     
-    # Filter entries
-    filtered_entries = [entry for entry in log_entries if entry['time'] >= cutoff_str]
+    # Entries are in time order: skip whole chunks, then bisect inside the first one needed
+    first_chunk = bisect.bisect_left([chunk[-1]['time'] for chunk in snap.chunks], cutoff_str)
+    filtered_entries = []
+    for chunk in snap.chunks[first_chunk:]:
+        if not filtered_entries:
+            start = bisect.bisect_left(chunk, cutoff_str, key=lambda entry: entry['time'])
+            filtered_entries.extend(chunk[start:])
+        else:
+            filtered_entries.extend(chunk)
+    return filtered_entries
+
+def get_history_data_for_minutes(minutes, points=DEFAULT_POINTS):
+    """Get history data for the specified number of minutes"""
+    filtered_entries = get_entries_for_minutes(minutes)
+    if not filtered_entries:
+        return {f"{w}s": [] for w in TIME_WINDOWS}
     
     # Organize by time window
     history_data = {}
@@ -123,24 +373,56 @@ def get_history_data_for_minutes(minutes):
                     "mph": entry[window_key]
                 })
         
-        # Thin out data if too many points (for performance)
-        if len(window_history) > 500:
-            step = len(window_history) // 500
-            window_history = window_history[::step]
+        # Reduce to at most `points` points, keeping the chart's shape (peaks included)
+        if len(window_history) > points:
+            keep = downsample_indices([p['time'] for p in window_history], [p['mph'] for p in window_history], points)
+            window_history = [window_history[i] for i in keep]
         
         history_data[window_key] = window_history
     
     return history_data
 
+def get_columnar_history_for_minutes(minutes, points=DEFAULT_POINTS):
+    """Get history data as one shared, delta-encoded time column plus one value column per window.
+
+    Times are wall-clock seconds as logged (local time encoded as if it were
+    UTC), so the browser can show them with getUTC* without timezone shifts.
+    """
+    filtered_entries = get_entries_for_minutes(minutes)
+    
+    # Reduce to at most `points` rows, keeping windows aligned. Rows are chosen by
+    # LTTB on the most detailed window, which carries the gusts; the smoother
+    # windows read the same at any sampling of the same times.
+    if len(filtered_entries) > points:
+        keep = downsample_indices([entry['time'] for entry in filtered_entries],
+                                  [entry[DOWNSAMPLE_KEY] for entry in filtered_entries], points)
+        filtered_entries = [filtered_entries[i] for i in keep]
+    
+    times = []
+    for entry in filtered_entries:
+        try:
+            times.append(calendar.timegm(time.strptime(entry['time'], "%Y-%m-%d %H:%M:%S")))
+        except ValueError:
+            times.append(times[-1] if times else 0)
+    
+    return {
+        'format': 'columnar',
+        't0': times[0] if times else None,
+        'dt': [t - p for t, p in zip(times, times[:1] + times)],
+        'windows': {f"{w}s": [entry[f"{w}s"] for entry in filtered_entries] for w in TIME_WINDOWS}
+    }
+
 HTML_TEMPLATE = '''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>1135 Wind Monitor</title>
-    <link rel="icon" type="image/png" sizes="32x32" href="{{ url_for('static', filename='wind_favicon-32x32_V2.png') }}">
-    <link rel="shortcut icon" href="{{ url_for('static', filename='wind_favicon-32x32_V2.png') }}">
-    <link rel="apple-touch-icon" sizes="32x32" href="{{ url_for('static', filename='wind_favicon-32x32_V2.png') }}">
+    {% if assets.has('wind_favicon-32x32_V2.png') %}
+    <link rel="icon" type="image/png" sizes="32x32" href="{{ assets.url('wind_favicon-32x32_V2.png') }}">
+    <link rel="shortcut icon" href="{{ assets.url('wind_favicon-32x32_V2.png') }}">
+    <link rel="apple-touch-icon" sizes="32x32" href="{{ assets.url('wind_favicon-32x32_V2.png') }}">
+    {% endif %}
     <style>
         body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
         .container { max-width: 800px; margin: 0 auto; background-color: white; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
@@ -162,8 +444,18 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
         .settings button:hover { background-color: #3498db; }
         .roof-gif { text-align: center; margin: 20px 0; }
         .roof-gif img { max-width: 100%; border-radius: 4px; }
+        .chart-unavailable { text-align: center; color: #7f8c8d; padding-top: 120px; }
     </style>
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/Chart.js/3.7.0/chart.min.js"></script>
+    <script>
+        // Chart.js (served from static/) loads without blocking the page, so the
+        // readings still show if it fails; the chart is drawn once it arrives
+        let chartState = 'loading';
+        function chartScriptDone(loaded) {
+            chartState = loaded ? 'ready' : 'failed';
+            if (window.onChartScript) onChartScript();
+        }
+    </script>
+    <script async src="{{ assets.url(chart_js) }}" onload="chartScriptDone(true)" onerror="chartScriptDone(false)"></script>
 </head>
 <body>
     <div class="container">
@@ -183,6 +475,14 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             </table>
         </div>
         
+        <div class="card">
+            <h2>10 Minute Statistics</h2>
+            <table>
+                <thead><tr><th>Statistic</th><th>Value</th></tr></thead>
+                <tbody id="stats-table"><tr><td>Loading...</td><td></td></tr></tbody>
+            </table>
+        </div>
+        
         <div class="card">
             <h2>Wind Speed History</h2>
             <div class="settings">
@@ -193,66 +493,115 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             <div class="chart-container"><canvas id="windChart"></canvas></div>
         </div>
         
-        <div class="roof-gif"><img src="{{ url_for('static', filename='roof_gif.gif') }}" alt="Roof with anemometer"></div>
+        {% if assets.has('roof_gif.gif') %}
+        <div class="roof-gif"><img src="{{ assets.url('roof_gif.gif') }}" alt="Roof with anemometer"></div>
+        {% endif %}
     </div>
 
     <script>
         let windChart;
         let graphHistoryMinutes = {{ graph_history_minutes }};
+        let lastPlottedTime = null;
+        let pollTimers = [];
+        let lastCurrent = {};
         
         const colors = ['#2980b9', '#27ae60', '#f39c12', '#8e44ad', '#e74c3c'];
         
+        // Logged wall-clock times are handled as UTC so they display exactly as logged
+        function parseTime(timeString) {
+            return Date.parse(timeString.replace(' ', 'T') + 'Z');
+        }
+        
+        function formatTime(ms) {
+            return new Date(ms).toISOString().substr(11, 8);
+        }
+        
+        function renderCurrentData(data) {
+            lastCurrent = data;
+            // Use 10 second window for main display, fallback to any available
+            const mainSpeed = data['10s'] || data['5s'] || data['1s'] || 0;
+            document.getElementById('current-wind').textContent = mainSpeed.toFixed(2);
+            
+            document.getElementById('last-updated').textContent = data.last_updated || 'Never';
+            
+            // Update readings table
+            const windows = {{ window_keys|tojson }};
+            const tableHtml = windows.map(w => 
+                `<tr><td>${w}</td><td>${(data[w] || 0).toFixed(2)}</td></tr>`
+            ).join('');
+            document.getElementById('readings-table').innerHTML = tableHtml;
+            
+            // Statistics stay blank until the logger has a full 10 minutes of data
+            const stats = [
+                ['Peak 3 second gust', 'gust', ' mph'],
+                ['Standard deviation', 'stddev', ' mph'],
+                ['Turbulence intensity', 'turbulence', ''],
+                ['Median (p50)', 'p50', ' mph'],
+                ['90th percentile (p90)', 'p90', ' mph']
+            ];
+            document.getElementById('stats-table').innerHTML = stats.map(([label, key, unit]) =>
+                `<tr><td>${label}</td><td>${data[key] === null || data[key] === undefined ? '-' : data[key].toFixed(2) + unit}</td></tr>`
+            ).join('');
+        }
+        
         function updateCurrentData() {
             fetch('/api/current')
                 .then(r => r.json())
-                .then(data => {
-                    // Use 10 second window for main display, fallback to any available
-                    const mainSpeed = data['10s'] || data['5s'] || data['1s'] || 0;
-                    document.getElementById('current-wind').textContent = mainSpeed.toFixed(2);
-                    
-                    document.getElementById('last-updated').textContent = data.last_updated || 'Never';
-                    
-                    // Update readings table
-                    const windows = ['1s', '5s', '10s', '30s', '60s'];
-                    const tableHtml = windows.map(w => 
-                        `<tr><td>${w}</td><td>${(data[w] || 0).toFixed(2)}</td></tr>`
-                    ).join('');
-                    document.getElementById('readings-table').innerHTML = tableHtml;
-                })
+                .then(renderCurrentData)
                 .catch(console.error);
         }
         
+        function sortedChartLabels(datasets) {
+            // Get all unique time labels and sort them
+            const allLabels = new Set();
+            datasets.forEach(dataset => {
+                dataset.data.forEach(point => allLabels.add(point.x));
+            });
+            return Array.from(allLabels).sort();
+        }
+        
+        function chartPoints() {
+            // About one point per horizontal pixel; the server keeps peaks when reducing (LTTB)
+            const canvas = document.getElementById('windChart');
+            return Math.max(100, Math.min(2000, canvas.clientWidth || 500));
+        }
+        
         function updateHistoryChart() {
-            fetch(`/api/history?minutes=${graphHistoryMinutes}`)
+            // onChartScript calls this again once Chart.js has loaded
+            if (chartState !== 'ready') return;
+            fetch(`/api/history?minutes=${graphHistoryMinutes}&format=columnar&points=${chartPoints()}`)
                 .then(r => r.json())
                 .then(data => {
                     const windowsToPlot = ['1s', '10s', '30s'];
                     
+                    // Undo the delta encoding of the shared time column
+                    let seconds = data.t0;
+                    const times = data.dt.map(delta => (seconds += delta) * 1000);
+                    const labels = times.map(formatTime);
+                    
                     const datasets = windowsToPlot.map((windowKey, i) => {
-                        const windowData = data[windowKey] || [];
+                        const values = data.windows[windowKey] || [];
+                        const points = [];
+                        values.forEach((mph, j) => {
+                            if (mph !== null) points.push({ x: labels[j], y: mph, t: times[j] });
+                        });
                         
                         return {
                             label: `${windowKey.replace('s', ' second')} average`,
-                            data: windowData.map(item => ({ 
-                                x: item.time_str,
-                                y: item.mph 
-                            })),
+                            windowKey: windowKey,
+                            data: points,
                             borderColor: colors[i],
                             backgroundColor: `${colors[i]}33`,
                             tension: 0.1,
                             fill: false,
-                            pointRadius: windowData.length > 100 ? 0 : 2
+                            pointRadius: points.length > 100 ? 0 : 2
                         };
                     }).filter(d => d.data.length > 0);
                     
                     if (!datasets.length) return;
                     
-                    // Get all unique time labels and sort them
-                    const allLabels = new Set();
-                    datasets.forEach(dataset => {
-                        dataset.data.forEach(point => allLabels.add(point.x));
-                    });
-                    const sortedLabels = Array.from(allLabels).sort();
+                    const sortedLabels = sortedChartLabels(datasets);
+                    lastPlottedTime = Math.max(...datasets.map(d => d.data[d.data.length - 1].t));
                     
                     if (windChart) {
                         windChart.data.labels = sortedLabels;
@@ -280,8 +629,9 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                                         ticks: {
                                             maxTicksLimit: 10,
                                             callback: function(value, index) {
-                                                const step = Math.ceil(sortedLabels.length / 8);
-                                                return index % step === 0 ? sortedLabels[index] : '';
+                                                const labels = this.chart.data.labels;
+                                                const step = Math.ceil(labels.length / 8);
+                                                return index % step === 0 ? labels[index] : '';
                                             }
                                         }
                                     }
@@ -293,6 +643,95 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
                 .catch(console.error);
         }
         
+        function appendHistory(entries) {
+            if (!windChart || !entries.length) return;
+            
+            // Keep roughly the same point density the server downsamples the history to
+            const stepMs = Math.max(1, Math.floor(graphHistoryMinutes * 60 / chartPoints())) * 1000;
+            let changed = false;
+            
+            entries.forEach(entry => {
+                const t = parseTime(entry.time);
+                if (lastPlottedTime !== null && t - lastPlottedTime < stepMs) return;
+                lastPlottedTime = t;
+                
+                const timeStr = entry.time.split(' ')[1] || entry.time;
+                windChart.data.datasets.forEach(dataset => {
+                    const mph = entry[dataset.windowKey];
+                    if (mph !== null && mph !== undefined) {
+                        dataset.data.push({ x: timeStr, y: mph, t: t });
+                    }
+                });
+                changed = true;
+            });
+            
+            if (!changed) return;
+            
+            // Drop points that have scrolled out of the selected history window
+            const cutoff = lastPlottedTime - graphHistoryMinutes * 60 * 1000;
+            windChart.data.datasets.forEach(dataset => {
+                dataset.data = dataset.data.filter(point => point.t >= cutoff);
+            });
+            windChart.data.labels = sortedChartLabels(windChart.data.datasets);
+            windChart.update('none');
+        }
+        
+        function onChartScript() {
+            const canvas = document.getElementById('windChart');
+            if (chartState === 'failed') {
+                if (canvas) canvas.parentNode.innerHTML = '<p class="chart-unavailable">Chart unavailable: Chart.js could not be loaded. The readings above still update.</p>';
+            } else if (chartState === 'ready') {
+                updateHistoryChart();
+            }
+        }
+        
+        function startPolling() {
+            if (pollTimers.length) return;
+            updateCurrentData();
+            updateHistoryChart();
+            pollTimers = [
+                setInterval(updateCurrentData, 1000),
+                setInterval(updateHistoryChart, 10000)
+            ];
+        }
+        
+        function stopPolling() {
+            pollTimers.forEach(clearInterval);
+            pollTimers = [];
+        }
+        
+        function startStream() {
+            // Fall back to polling on browsers without Server-Sent Events
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            
+            const source = new EventSource('/api/stream');
+            source.addEventListener('update', e => {
+                const update = JSON.parse(e.data);
+                renderCurrentData(update.current);
+                appendHistory(update.entries);
+            });
+            source.addEventListener('live', e => {
+                // Per-second readings from the capture daemon, ahead of the logged rows
+                renderCurrentData(Object.assign({}, lastCurrent, JSON.parse(e.data)));
+            });
+            source.addEventListener('reload', e => {
+                renderCurrentData(JSON.parse(e.data).current);
+                updateHistoryChart();
+            });
+            source.onopen = () => {
+                // (Re)connected: resync the chart once, then rely on pushed rows
+                stopPolling();
+                updateHistoryChart();
+            };
+            source.onerror = () => {
+                // Poll while the stream is down; EventSource keeps retrying in the background
+                startPolling();
+            };
+        }
+        
         document.getElementById('updateHistory').addEventListener('click', function() {
             const value = parseInt(document.getElementById('historyMinutes').value);
             if (value >= 1 && value <= 4320) {
@@ -304,38 +743,135 @@ HTML_TEMPLATE = '''<!DOCTYPE html>
             }
         });
         
-        updateCurrentData();
-        updateHistoryChart();
-        setInterval(updateCurrentData, 1000);
-        setInterval(updateHistoryChart, 10000);
+        startStream();
+        // Chart.js may already have loaded or failed while the page was parsed
+        onChartScript();
     </script>
 </body>
 </html>'''
 
+def render_index_page():
+    """The dashboard, rendered and compressed once at startup; data arrives through the APIs"""
+    with app.test_request_context():
+        return PrecompressedBody(render_template_string(HTML_TEMPLATE, 
+                                graph_history_minutes=GRAPH_HISTORY_MINUTES,
+                                window_keys=[f"{w}s" for w in TIME_WINDOWS],
+                                assets=assets, chart_js=CHART_JS), 'text/html')
+
+index_page = render_index_page()
+
 @app.route('/favicon.ico')
 def favicon():
-    return send_from_directory(app.static_folder, 'wind_favicon-32x32_V2.png', mimetype='image/png')
+    return assets.response('wind_favicon-32x32_V2.png', cache_control='public, max-age=86400')
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE, 
-                                graph_history_minutes=GRAPH_HISTORY_MINUTES)
+    # Same bytes on every visit: repeat loads revalidate by ETag and get a 304
+    return index_page.response(request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match'))
 
 @app.route('/api/current')
 def get_current_data():
-    return jsonify(current_data)
+    return jsonify(get_current_snapshot())
 
 @app.route('/api/history')
 def get_history_data():
     minutes = int(request.args.get('minutes', GRAPH_HISTORY_MINUTES))
-    history_data = get_history_data_for_minutes(minutes)
-    return jsonify(history_data)
+    points = parse_points(request.args.get('points'))
+    if request.args.get('format') == 'columnar':
+        history_data = get_columnar_history_for_minutes(minutes, points)
+    else:
+        history_data = get_history_data_for_minutes(minutes, points)
+    
+    body = json.dumps(history_data, separators=(',', ':'))
+    return compressed_response(body, 'application/json', request.headers.get('Accept-Encoding'))
+
+def export_value(column, value):
+    """A wind_log.csv field for NDJSON: time as written, numbers as numbers, blanks as null"""
+    if column == 'time':
+        return value
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+@app.route('/api/export')
+def export():
+    """Rows from ?start= up to ?end= as CSV or NDJSON (?format=), streamed from wind_log.csv.
+
+    Rows are read and sent a chunk at a time instead of being collected like
+    the history APIs do, so even a months-long range uses constant memory.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format {export_format}", 'formats': list(EXPORT_FORMATS)}), 400
+    try:
+        start = parse_time_bound(request.args.get('start'))
+        end = parse_time_bound(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not os.path.exists(LOG_FILE):
+        return jsonify({'error': "No wind log yet"}), 404
+    
+    with open(LOG_FILE, 'rb') as f:
+        header = f.readline()
+    columns = next(csv.reader([header.decode('utf-8', errors='replace')]), [])
+    
+    def rows():
+        if export_format == 'csv':
+            # The log's own lines, untouched
+            yield header
+            for _, line in iter_records(LOG_FILE, start, end):
+                yield line
+            return
+        lines = (line.decode('utf-8', errors='replace') for _, line in iter_records(LOG_FILE, start, end))
+        for values in csv.reader(lines):
+            yield ndjson_line({column: export_value(column, value) for column, value in zip(columns, values)})
+    
+    return streamed_response(chunked(rows()), EXPORT_FORMATS[export_format], request.headers.get('Accept-Encoding'),
+                             {'Content-Disposition': f'attachment; filename="wind_log.{export_format}"'})
+
+@app.route('/api/stream')
+def stream():
+    """Server-Sent Events feed of new rows, replacing the 1s/10s polling loops"""
+    initial_events = [('update', {'current': get_current_snapshot(), 'entries': []})]
+    return Response(wind_events.stream(initial_events), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+def run_ingest_only():
+    """Parse the CSV once and publish it to the shared segment for the WSGI workers"""
+    global shared_writer, history_retention, ingest_metrics_saver
+    
+    if not SHARED_HISTORY_PATH:
+        raise SystemExit("--ingest-only needs WIND_SHARED_HISTORY set to the shared segment path")
+    
+    fields = [key for key, _ in DATA_FIELDS]
+    shared_writer = SharedHistoryWriter(SHARED_HISTORY_PATH, fields, MAX_HISTORY_SECONDS)
+    
+    # The history lives in shared memory; this process only needs the newest row
+    # to know where the CSV left off
+    history_retention = 1
+    ingest_metrics_saver = PeriodicSaver('wind_ingest')
+    
+    print(f"Publishing {LOG_FILE} to shared history {SHARED_HISTORY_PATH}")
+    try:
+        update_data_from_csv()
+    except KeyboardInterrupt:
+        print("Stopped by user.")
+    finally:
+        shared_writer.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Wind monitor web server.")
+    parser.add_argument('--ingest-only', action='store_true',
+                        help="Only publish CSV history to the WIND_SHARED_HISTORY segment (no HTTP)")
+    args = parser.parse_args()
+    
+    if args.ingest_only:
+        run_ingest_only()
+        return
+    
     try:
         # Start background CSV reading thread
-        csv_thread = threading.Thread(target=update_data_from_csv, daemon=True)
-        csv_thread.start()
+        start_background_threads()
         
         # Check favicon file
         favicon_path = os.path.join(app.static_folder, 'wind_favicon-32x32_V2.png')
@@ -345,7 +881,7 @@ def main():
         print(f"CSV file: {'✓ Found' if os.path.exists(LOG_FILE) else '✗ Missing'} - {LOG_FILE}")
         
         print("Starting Flask server on port 5001...")
-        app.run(host='0.0.0.0', port=5001, debug=False)
+        app.run(host='0.0.0.0', port=5001, debug=False, threaded=True)
         
     except KeyboardInterrupt:
         print("Stopped by user.")